@@ -0,0 +1,305 @@
+import os
+import shutil
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from analytics.partitions import add_months, get_month_bounds
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+# Archived months of a domain are stored as one .npy file per column in
+# PAGE_VIEW_ARCHIVE_PATH/<domain id>/<YYYY-MM>/, rows ordered by timestamp.
+# Timestamps are stored as seconds since the start of the month and ids in the
+# smallest integer type that fits them, empty ids are -1.
+TIMESTAMP_COLUMN = "second"
+ID_COLUMNS = ["browser", "os", "device", "country", "page_url"]
+ARCHIVE_COLUMNS = [TIMESTAMP_COLUMN, "is_robot", *ID_COLUMNS]
+# Columns which have to be set for a page view to be counted by the dimension
+# rollup, see RollupManager.get_page_views
+DIMENSION_COLUMNS = ["browser", "os", "device", "country"]
+
+
+def get_archive_path(domain_id, month: Optional[date] = None) -> str:
+    path = os.path.join(settings.PAGE_VIEW_ARCHIVE_PATH, str(domain_id))
+    if month:
+        path = os.path.join(path, f"{month:%Y-%m}")
+    return path
+
+
+def get_archived_months(
+    domain_id,
+    archived_until: date,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+) -> List[date]:
+    """
+    Return the archived months of the domain before archived_until which
+    contain days between start_day (inclusive) and end_day (exclusive).
+    """
+    try:
+        names = os.listdir(get_archive_path(domain_id))
+    except FileNotFoundError:
+        return []
+    months = []
+    for name in names:
+        try:
+            month = datetime.strptime(name, "%Y-%m").date()
+        except ValueError:
+            # Like months which are still being written
+            continue
+        if month >= archived_until:
+            continue
+        if start_day and add_months(month, 1) <= start_day:
+            continue
+        if end_day and month >= end_day:
+            continue
+        months.append(month)
+    return sorted(months)
+
+
+def get_next_month(
+    archived_until: Optional[date], downsampled_until: Optional[date]
+) -> Optional[date]:
+    """
+    Return the month of a domain which has to be archived next, None if any
+    month can be archived first. Months with downsampled days can not be
+    archived and are skipped, their rollups are kept.
+    """
+    months = []
+    if archived_until:
+        months.append(archived_until)
+    if downsampled_until:
+        month = downsampled_until.replace(day=1)
+        months.append(month if month == downsampled_until else add_months(month, 1))
+    return max(months) if months else None
+
+
+def get_id_dtype(ids: np.ndarray) -> np.dtype:
+    if not len(ids):
+        return np.dtype(np.int8)
+    # The smallest signed type of -(max + 1) also fits max and -1
+    return np.min_scalar_type(-int(ids.max()) - 1)
+
+
+def get_day_starts(month: date) -> np.ndarray:
+    """
+    Return the seconds from the start of the month to the start of each of its
+    days (and of the next month), in local time.
+    """
+    # Aware datetimes of the same time zone are subtracted without their UTC
+    # offsets, so the differences are computed from POSIX timestamps
+    month_start, month_end = get_month_bounds(month)
+    starts = []
+    day = month
+    while day < add_months(month, 1):
+        day_start = timezone.make_aware(datetime.combine(day, time.min))
+        starts.append(day_start.timestamp() - month_start.timestamp())
+        day += timedelta(days=1)
+    starts.append(month_end.timestamp() - month_start.timestamp())
+    return np.array(starts, dtype=np.int64)
+
+
+def build_month(domain_id, month: date, chunk_size: int = 10000) -> Dict:
+    """
+    Return the columns of the page views of the domain in the month.
+    """
+    from analytics.models import PageView
+
+    month_start, month_end = get_month_bounds(month)
+    rows = (
+        PageView.objects.filter(
+            domain_id=domain_id, timestamp__gte=month_start, timestamp__lt=month_end
+        )
+        .order_by("timestamp")
+        .values_list("timestamp", "is_robot", *(f"{name}_id" for name in ID_COLUMNS))
+    )
+    start = month_start.timestamp()
+    chunks = {name: [] for name in ARCHIVE_COLUMNS}
+    batch = []
+
+    def add_chunk():
+        timestamps, is_robot, *ids = zip(*batch)
+        chunks[TIMESTAMP_COLUMN].append(
+            np.array(
+                [timestamp.timestamp() - start for timestamp in timestamps],
+                dtype=np.uint32,
+            )
+        )
+        chunks["is_robot"].append(np.array(is_robot, dtype=bool))
+        for name, values in zip(ID_COLUMNS, ids):
+            chunks[name].append(
+                np.array([-1 if value is None else value for value in values])
+            )
+        batch.clear()
+
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) == chunk_size:
+            add_chunk()
+    if batch:
+        add_chunk()
+
+    columns = {
+        TIMESTAMP_COLUMN: np.concatenate(
+            chunks[TIMESTAMP_COLUMN] or [np.empty(0, dtype=np.uint32)]
+        ),
+        "is_robot": np.concatenate(chunks["is_robot"] or [np.empty(0, dtype=bool)]),
+    }
+    for name in ID_COLUMNS:
+        ids = np.concatenate(chunks[name] or [np.empty(0, dtype=np.int64)])
+        columns[name] = ids.astype(get_id_dtype(ids))
+    return columns
+
+
+def write_month(domain_id, month: date, columns: Dict[str, np.ndarray]) -> None:
+    """
+    Write the columns of the archived month, replacing existing files.
+    """
+    path = get_archive_path(domain_id, month)
+    temporary_path = f"{path}.tmp"
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    os.makedirs(temporary_path)
+    for name in ARCHIVE_COLUMNS:
+        np.save(os.path.join(temporary_path, f"{name}.npy"), columns[name])
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(temporary_path, path)
+
+
+def read_month(domain_id, month: date) -> Dict[str, np.ndarray]:
+    """
+    Return the memory-mapped columns of the archived month.
+    """
+    path = get_archive_path(domain_id, month)
+    return {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in ARCHIVE_COLUMNS
+    }
+
+
+def count_page_views(
+    domain_id,
+    archived_until: date,
+    group_by: Iterable[str] = (),
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    with_robots: bool = False,
+    required: Iterable[str] = (),
+    page_url_ids: Optional[Iterable[int]] = None,
+) -> Counter:
+    """
+    Return the amount of archived page views of the domain between start_day
+    (inclusive) and end_day (exclusive) per tuple of group_by values, which are
+    archive columns or "day".
+
+    Page views without a value of a group_by or required column are not
+    counted, like page views without key fields are not counted by rollups.
+    """
+    group_by = list(group_by)
+    required = set(required) | {name for name in group_by if name in ID_COLUMNS}
+    if page_url_ids is not None:
+        page_url_ids = np.array(list(page_url_ids), dtype=np.int64)
+
+    counts = Counter()
+    for month in get_archived_months(domain_id, archived_until, start_day, end_day):
+        columns = read_month(domain_id, month)
+        day_starts = get_day_starts(month)
+        # Rows are ordered by timestamp, so a range of days is a slice
+        first_day = (start_day - month).days if start_day else 0
+        last_day = (end_day - month).days if end_day else len(day_starts) - 1
+        first_day = max(first_day, 0)
+        last_day = min(last_day, len(day_starts) - 1)
+        seconds = columns[TIMESTAMP_COLUMN]
+        start, end = np.searchsorted(
+            seconds, day_starts[[first_day, last_day]], side="left"
+        )
+        columns = {name: values[start:end] for name, values in columns.items()}
+
+        mask = np.ones(end - start, dtype=bool)
+        if not with_robots:
+            mask &= ~columns["is_robot"]
+        for name in required:
+            mask &= columns[name] >= 0
+        if page_url_ids is not None:
+            mask &= np.isin(columns["page_url"], page_url_ids)
+
+        keys = []
+        for name in group_by:
+            if name == "day":
+                days = np.searchsorted(day_starts, columns[TIMESTAMP_COLUMN], "right")
+                keys.append(days[mask] - 1)
+            else:
+                keys.append(columns[name][mask].astype(np.int64))
+        if not keys:
+            amount = int(np.count_nonzero(mask))
+            if amount:
+                counts[()] += amount
+            continue
+
+        values, amounts = np.unique(np.stack(keys, axis=1), axis=0, return_counts=True)
+        for key, amount in zip(values.tolist(), amounts.tolist()):
+            key = tuple(
+                month + timedelta(days=value) if name == "day" else value
+                for name, value in zip(group_by, key)
+            )
+            counts[key] += amount
+    return counts
+
+
+def archive_month(
+    domain_id,
+    month: date,
+    chunk_size: int = 10000,
+    batch_size: int = 1000,
+    pause: float = 0.0,
+) -> int:
+    """
+    Move the page views of the domain in the month and the rollups of its days
+    to the archive, return the amount of archived page views.
+
+    Months have to be closed and are archived in order (see get_next_month),
+    their stored monthly totals and visitor sketches are kept. The rollups are
+    swapped for the archive in one transaction, the page views are deleted
+    afterwards in batches (see PageViewManager.delete_in_batches).
+    """
+    from analytics.models import (
+        Domain,
+        PageView,
+        PageViewDimensionRollup,
+        PageViewMonthlyTotal,
+        PageViewUrlRollup,
+    )
+
+    if month >= PageViewMonthlyTotal.objects.freeze([domain_id]):
+        raise ValueError(f"{month:%Y-%m} is not closed yet")
+    next_month = get_next_month(
+        *Domain.objects.filter(pk=domain_id)
+        .values_list("archived_until", "downsampled_until")
+        .get()
+    )
+    if next_month and month != next_month:
+        raise ValueError(f"{next_month:%Y-%m} has to be archived next")
+
+    columns = build_month(domain_id, month, chunk_size)
+    write_month(domain_id, month, columns)
+
+    next_month = add_months(month, 1)
+    _, month_end = get_month_bounds(month)
+    with transaction.atomic():
+        for rollups in [PageViewDimensionRollup.objects, PageViewUrlRollup.objects]:
+            rollups.filter(
+                domain_id=domain_id, day__gte=month, day__lt=next_month
+            ).delete()
+        # From now on reads, rebuilds and checks skip the page views of the month
+        Domain.objects.filter(pk=domain_id).update(archived_until=next_month)
+        Domain.objects.bump_data_generation([domain_id], force=True)
+
+    # Including the page views an interrupted earlier call left behind
+    PageView.objects.delete_in_batches(
+        PageView.objects.filter(domain_id=domain_id, timestamp__lt=month_end),
+        batch_size,
+        pause,
+    )
+    return len(columns[TIMESTAMP_COLUMN])
@@ -0,0 +1,172 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class PageViewBuffer:
+    """
+    Bounded in-process buffer for tracked page views.
+
+    Page views are queued by the tracking endpoint and written with
+    ``bulk_create`` by a background thread as soon as a batch is full or the
+    flush interval has passed. When the buffer is full new page views are
+    dropped and counted instead of blocking the request.
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._counter_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def get_stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "max_size": self._queue.maxsize,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    def put(self, page_view) -> bool:
+        """
+        Queue an unsaved page view. Return False if it was dropped.
+        """
+        try:
+            self._queue.put_nowait(page_view)
+        except queue.Full:
+            with self._counter_lock:
+                self.dropped += 1
+            return False
+        return True
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="page-view-buffer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop the background thread and write everything still buffered.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        logger.info("Page view buffer stopped: %s", self.get_stats())
+
+    def flush(self) -> int:
+        """
+        Write all buffered page views in batches and return how many were written.
+        """
+        written = 0
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            written += self._write(batch)
+        return written
+
+    def _drain(self) -> list:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _collect(self) -> list:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopped.is_set():
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List) -> int:
+        from analytics.models import PageView
+
+        try:
+            with transaction.atomic():
+                PageView.objects.bulk_create(batch)
+                PageView.objects.update_aggregates(batch)
+        except DatabaseError:
+            logger.exception("Could not write %s buffered page views", len(batch))
+            with self._counter_lock:
+                self.failed += len(batch)
+            return 0
+
+        with self._counter_lock:
+            self.written += len(batch)
+        return len(batch)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception:
+                # A dead flusher would drop every page view once the buffer is full
+                logger.exception("Could not write %s buffered page views", len(batch))
+                with self._counter_lock:
+                    self.failed += len(batch)
+            finally:
+                close_old_connections()
+
+
+_buffer: Optional[PageViewBuffer] = None
+_buffer_pid: Optional[int] = None
+_buffer_lock = threading.Lock()
+
+
+def get_page_view_buffer() -> PageViewBuffer:
+    """
+    Return the started buffer of the current process.
+
+    The buffer is created lazily so that every (forked) worker gets its own
+    queue and flusher thread.
+    """
+    global _buffer, _buffer_pid
+
+    with _buffer_lock:
+        if _buffer is None or _buffer_pid != os.getpid():
+            _buffer = PageViewBuffer(
+                max_size=settings.PAGE_VIEW_BUFFER_MAX_SIZE,
+                batch_size=settings.PAGE_VIEW_BUFFER_BATCH_SIZE,
+                flush_interval=settings.PAGE_VIEW_BUFFER_FLUSH_INTERVAL,
+            )
+            _buffer_pid = os.getpid()
+            _buffer.start()
+    return _buffer
@@ -0,0 +1,134 @@
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+_missing = object()
+
+
+class LRUCache:
+    """
+    Thread safe, size bounded least recently used cache with hit/miss statistics.
+
+    A ``maxsize`` of 0 disables the cache, every lookup is a miss. With a
+    ``ttl`` entries additionally expire that many seconds after being set.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value, expires_at = self._data.get(key, (_missing, None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                value = _missing
+            if value is _missing:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_set(self, key: Hashable, default_func: Callable[[], Any]) -> Any:
+        """
+        Return the cached value for key or compute, cache and return it.
+
+        The value is computed outside of the lock, so concurrent misses for the
+        same key may compute it more than once.
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = default_func()
+            self.set(key, value)
+        return value
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+        }
+
+
+def get_dashboard_cache():
+    return caches[settings.DASHBOARD_CACHE]
+
+
+def cached_analytics(method: Callable) -> Callable:
+    """
+    Cache the results of a Domain analytics method in the dashboard cache.
+
+    The key contains the method arguments and the current data generation of
+    the domain, which is bumped when page views of the domain are tracked, so
+    a result is recomputed once new data arrived.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(domain, *args, **kwargs):
+        if not settings.DASHBOARD_CACHE_ENABLED:
+            return method(domain, *args, **kwargs)
+
+        arguments = signature.bind(domain, *args, **kwargs)
+        arguments.apply_defaults()
+        data_generation = (
+            type(domain)
+            .objects.filter(pk=domain.pk)
+            .values_list("data_generation", flat=True)
+            .first()
+        )
+        key = ":".join(
+            [
+                "analytics",
+                str(domain.pk),
+                str(data_generation),
+                method.__name__,
+                *(
+                    f"{name}={value}"
+                    for name, value in list(arguments.arguments.items())[1:]
+                ),
+            ]
+        )
+        cache = get_dashboard_cache()
+        result = cache.get(key, _missing)
+        if result is _missing:
+            result = method(domain, *args, **kwargs)
+            cache.set(key, result)
+        return result
+
+    return wrapper
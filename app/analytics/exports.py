@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Iterator, Optional
+
+from analytics.models import DIMENSIONS, PageView
+from django.conf import settings
+from django.db import models
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+EXPORT_COLUMNS = ["id", "timestamp", "url", "ip", "is_robot", *DIMENSIONS]
+# Amount of rows serialized into one chunk of the response
+ROWS_PER_CHUNK = 500
+
+
+def get_export_rows(
+    domain_id,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    chunk_size: Optional[int] = None,
+) -> Iterator[list]:
+    """
+    Yield the page views of the domain between start_day and end_day
+    (inclusive) as lists of EXPORT_COLUMNS values, ordered by timestamp.
+
+    Rows are fetched chunk_size rows at a time, every chunk by its own query
+    starting after the (timestamp, id) of the last row of the previous one. So
+    the memory usage does not depend on the amount of exported page views, also
+    without server-side cursors (POSTGRES_DISABLE_SERVER_SIDE_CURSORS).
+    """
+    page_views = PageView.objects.filter(domain_id=domain_id)
+    if start_day:
+        start = timezone.make_aware(datetime.combine(start_day, time.min))
+        page_views = page_views.filter(timestamp__gte=start)
+    if end_day:
+        end = timezone.make_aware(
+            datetime.combine(end_day + timedelta(days=1), time.min)
+        )
+        page_views = page_views.filter(timestamp__lt=end)
+
+    names = {
+        dimension: model.objects.get_names() for dimension, model in DIMENSIONS.items()
+    }
+    rows = page_views.order_by("timestamp", "id").values_list(
+        "id",
+        "timestamp",
+        "url",
+        "ip",
+        "is_robot",
+        *(f"{dimension}_id" for dimension in DIMENSIONS),
+    )
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    after = None
+    while True:
+        chunk = rows
+        if after:
+            # The timestamp condition starts the index scan at the last row
+            chunk = chunk.filter(
+                RawSQL(
+                    "(timestamp, id) > (%s, %s)",
+                    after,
+                    output_field=models.BooleanField(),
+                ),
+                timestamp__gte=after[0],
+            )
+        chunk = list(chunk[:chunk_size])
+        for page_view_id, timestamp, url, ip, is_robot, *dimension_ids in chunk:
+            yield [
+                str(page_view_id),
+                timestamp.isoformat(),
+                url,
+                ip,
+                is_robot,
+                *(
+                    names[dimension].get(value_id)
+                    for dimension, value_id in zip(DIMENSIONS, dimension_ids)
+                ),
+            ]
+        if len(chunk) < chunk_size:
+            return
+        after = (chunk[-1][1], chunk[-1][0])
+
+
+def iter_chunks(rows: Iterable[list]) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == ROWS_PER_CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(rows: Iterable[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for chunk in iter_chunks(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def iter_ndjson(rows: Iterable[list]) -> Iterator[bytes]:
+    for chunk in iter_chunks(rows):
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in chunk
+        ).encode()
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Compress the chunks on the fly into a gzip stream.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_page_views(
+    domain_id,
+    export_format: str = "csv",
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+    compress: bool = False,
+    chunk_size: Optional[int] = None,
+) -> Iterator[bytes]:
+    """
+    Return the page views of the domain as a stream of CSV or NDJSON chunks,
+    gzip compressed if compress is set.
+    """
+    rows = get_export_rows(domain_id, start_day, end_day, chunk_size)
+    serialize = iter_csv if export_format == "csv" else iter_ndjson
+    chunks = serialize(rows)
+    if compress:
+        chunks = iter_gzip(chunks)
+    return chunks
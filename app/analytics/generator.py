@@ -0,0 +1,274 @@
+import urllib.parse
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, List
+
+import numpy as np
+from analytics.helpers import classify_robot, get_url_hash
+from django.db import connection
+from django.utils import timezone
+
+# Synthetic page views are spread over these user agents (weight, browser, os,
+# device) and countries (weight, code), roughly like the traffic of a small
+# European website. Page views of robots are classified with classify_robot.
+USER_AGENTS = [
+    (24, "Chrome", "Windows", "Other"),
+    (14, "Mobile Safari", "iOS", "iPhone"),
+    (11, "Chrome Mobile", "Android", "Generic Smartphone"),
+    (8, "Safari", "Mac OS X", "Mac"),
+    (6, "Chrome", "Mac OS X", "Mac"),
+    (6, "Firefox", "Windows", "Other"),
+    (5, "Edge", "Windows", "Other"),
+    (3, "Samsung Internet", "Android", "Samsung SM-S911B"),
+    (2, "Firefox", "Linux", "Other"),
+    (1, "Mobile Safari", "iOS", "iPad"),
+    (8, "Googlebot", "Other", "Spider"),
+    (5, "bingbot", "Other", "Spider"),
+    (4, "AhrefsBot", "Other", "Spider"),
+    (3, "UptimeRobot", "Other", "Spider"),
+]
+# Country names as the GeoIP lookup of tracked page views returns them
+COUNTRIES = [
+    (22, "Germany"),
+    (14, "United States"),
+    (12, "Austria"),
+    (7, "United Kingdom"),
+    (6, "France"),
+    (6, "Switzerland"),
+    (5, "Netherlands"),
+    (4, "India"),
+    (4, "Poland"),
+    (3, "Italy"),
+    (3, "Spain"),
+    (3, "Sweden"),
+    (2, "Brazil"),
+    (2, "China"),
+    (7, "Unknown"),
+]
+# Relative page views per local hour of the day, robots crawl around the clock
+HOUR_WEIGHTS = [2, 1, 1, 1, 1, 2, 4, 7, 9, 10, 10, 10]
+HOUR_WEIGHTS += [11, 10, 10, 10, 10, 11, 12, 13, 12, 9, 6, 4]
+# Exponent of the Zipf distributions of the urls of a domain and of the page
+# views of the domains
+URL_ZIPF_EXPONENT = 1.1
+DOMAIN_ZIPF_EXPONENT = 1.0
+
+COPY_COLUMNS = [
+    "id",
+    "domain_id",
+    "ip",
+    "is_robot",
+    "browser_id",
+    "os_id",
+    "device_id",
+    "country_id",
+    "timestamp",
+    "url",
+    "page_url_id",
+]
+
+
+@dataclass
+class GeneratedDomain:
+    index: int
+    domain_id: str
+    urls: List[str]
+    page_url_ids: List[int]
+
+
+def get_zipf_weights(amount: int, exponent: float) -> np.ndarray:
+    weights = 1 / np.arange(1, amount + 1) ** exponent
+    return weights / weights.sum()
+
+
+def get_domain_page_views(amount_domains: int, page_views: int) -> List[int]:
+    """
+    Split the page views between the domains, a few domains get most of them.
+    """
+    weights = get_zipf_weights(amount_domains, DOMAIN_ZIPF_EXPONENT)
+    amounts = np.floor(weights * page_views).astype(np.int64)
+    amounts[0] += page_views - amounts.sum()
+    return amounts.tolist()
+
+
+def get_domain_id(seed: int, index: int) -> str:
+    rng = np.random.default_rng([seed, index])
+    return str(uuid.UUID(bytes=rng.bytes(16), version=4))
+
+
+def get_urls(base_url: str, amount: int) -> List[str]:
+    sections = ["blog", "docs", "products", "news", "about"]
+    urls = [f"{base_url}/"]
+    for index in range(1, amount):
+        urls.append(f"{base_url}/{sections[index % len(sections)]}/page-{index}/")
+    return urls
+
+
+def create_page_urls(domain_id, urls: List[str]) -> List[int]:
+    from analytics.models import PageUrl
+
+    page_urls = PageUrl.objects.bulk_create(
+        PageUrl(
+            domain_id=domain_id,
+            url=url,
+            path=urllib.parse.urlsplit(url).path,
+            url_hash=get_url_hash(url),
+        )
+        for url in urls
+    )
+    return [page_url.pk for page_url in page_urls]
+
+
+def get_day_weights(start_day: date, days: int) -> np.ndarray:
+    """
+    Return the share of page views of every day: weekends are quieter, the
+    traffic peaks in winter and grows slowly over time.
+    """
+    weights = []
+    for offset in range(days):
+        day = start_day + timedelta(days=offset)
+        weight = 0.75 if day.weekday() >= 5 else 1.0
+        weight *= 1 + 0.25 * np.cos(2 * np.pi * (day.timetuple().tm_yday - 15) / 365)
+        weight *= 1 + 0.5 * offset / max(days, 1)
+        weights.append(weight)
+    weights = np.array(weights)
+    return weights / weights.sum()
+
+
+class PageViewGenerator:
+    """
+    Deterministic synthetic page views of one domain: the rows of a chunk only
+    depend on the seed, the domain and the chunk index, so chunks can be
+    generated in any order and by any amount of processes.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        domain: GeneratedDomain,
+        start_day: date,
+        days: int,
+        dimension_ids: dict,
+    ):
+        self.seed = seed
+        self.domain = domain
+        self.url_weights = get_zipf_weights(len(domain.urls), URL_ZIPF_EXPONENT)
+        self.day_weights = get_day_weights(start_day, days)
+        self.day_starts = np.array(
+            [
+                timezone.make_aware(
+                    datetime.combine(start_day + timedelta(days=offset), time.min)
+                ).timestamp()
+                for offset in range(days)
+            ],
+            dtype=np.int64,
+        )
+        self.hour_weights = np.array(HOUR_WEIGHTS) / sum(HOUR_WEIGHTS)
+
+        user_agent_weights = np.array([weight for weight, *_ in USER_AGENTS])
+        self.user_agent_weights = user_agent_weights / user_agent_weights.sum()
+        country_weights = np.array([weight for weight, _ in COUNTRIES])
+        self.country_weights = country_weights / country_weights.sum()
+        self.robots = np.array(
+            [
+                classify_robot({"browser": browser, "device": device})
+                for _, browser, _, device in USER_AGENTS
+            ]
+        )
+        # Text of the robot flag and dimension ids per user agent and country
+        self.user_agent_columns = []
+        for (_, browser, os, device), is_robot in zip(USER_AGENTS, self.robots):
+            columns = []
+            for _, country in COUNTRIES:
+                columns.append(
+                    "\t".join(
+                        [
+                            "t" if is_robot else "f",
+                            str(dimension_ids["browser"][browser]),
+                            str(dimension_ids["os"][os]),
+                            str(dimension_ids["device"][device]),
+                            str(dimension_ids["country"][country]),
+                        ]
+                    )
+                )
+            self.user_agent_columns.append(columns)
+
+    def get_rows(self, chunk_index: int, amount: int) -> Iterator[str]:
+        """
+        Return the lines of a COPY in text format of the page views of the chunk.
+        """
+        rng = np.random.default_rng([self.seed, self.domain.index, chunk_index])
+        ids = rng.bytes(16 * amount)
+        user_agents = rng.choice(len(USER_AGENTS), amount, p=self.user_agent_weights)
+        countries = rng.choice(len(COUNTRIES), amount, p=self.country_weights)
+        urls = rng.choice(len(self.domain.urls), amount, p=self.url_weights)
+        # Returning visitors, about five page views per visitor
+        visitors = rng.integers(0, max(amount // 5, 1), amount) + chunk_index * amount
+        days = rng.choice(len(self.day_starts), amount, p=self.day_weights)
+        hours = np.where(
+            self.robots[user_agents],
+            rng.integers(0, 24, amount),
+            rng.choice(24, amount, p=self.hour_weights),
+        )
+        microseconds = (
+            self.day_starts[days] * 1_000_000
+            + hours * 3_600_000_000
+            + rng.integers(0, 3_600_000_000, amount)
+        )
+        timestamps = np.datetime_as_string(
+            microseconds.astype("datetime64[us]"), unit="us"
+        )
+
+        domain_id = self.domain.domain_id
+        for index in range(amount):
+            visitor = int(visitors[index])
+            url_index = urls[index]
+            yield (
+                f"{uuid.UUID(bytes=ids[index * 16 : index * 16 + 16], version=4)}\t"
+                f"{domain_id}\t"
+                f"10.{visitor >> 16 & 255}.{visitor >> 8 & 255}.{visitor & 255}\t"
+                f"{self.user_agent_columns[user_agents[index]][countries[index]]}\t"
+                f"{timestamps[index]}+00\t"
+                f"{self.domain.urls[url_index]}\t"
+                f"{self.domain.page_url_ids[url_index]}\n"
+            )
+
+
+class RowStream:
+    """
+    File-like object for COPY FROM STDIN that reads the rows from an iterator,
+    so that the rows of a chunk are never all in memory.
+    """
+
+    def __init__(self, rows: Iterator[str]):
+        self.rows = rows
+        self.buffer = b""
+
+    def read(self, size: int = -1) -> bytes:
+        parts = [self.buffer]
+        length = len(self.buffer)
+        for row in self.rows:
+            part = row.encode()
+            parts.append(part)
+            length += len(part)
+            if 0 <= size <= length:
+                break
+        data = b"".join(parts)
+        if size < 0:
+            size = len(data)
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def copy_page_views(rows: Iterator[str]) -> None:
+    from analytics.models import PageView
+
+    quote_name = connection.ops.quote_name
+    columns = ", ".join(quote_name(column) for column in COPY_COLUMNS)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {quote_name(PageView._meta.db_table)} ({columns}) FROM STDIN",
+            RowStream(rows),
+            size=65536,
+        )
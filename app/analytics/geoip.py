@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from analytics.caches import LRUCache
+from django.conf import settings
+from django.contrib.gis.geoip2 import GeoIP2
+from geoip2.errors import AddressNotFoundError
+
+
+class CachedGeoIP:
+    """
+    Shared GeoIP2 country reader with an LRU cache of ip -> country name.
+
+    The database is opened on the first lookup and reopened (and the cache
+    cleared) when the .mmdb file on disk has been replaced.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        cache_size: int,
+        mmap: bool = False,
+        reload_check_interval: float = 60,
+    ):
+        self.path = path
+        self.mode = GeoIP2.MODE_MMAP if mmap else GeoIP2.MODE_AUTO
+        self.reload_check_interval = reload_check_interval
+        self.cache = LRUCache(maxsize=cache_size)
+        self.reloads = 0
+        self._reader: Optional[GeoIP2] = None
+        self._file_signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _get_file_signature(self) -> tuple:
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _open(self) -> None:
+        signature = self._get_file_signature()
+        if self._reader is not None:
+            # The old reader is closed when the last request using it is done.
+            self.reloads += 1
+        self._reader = GeoIP2(path=self.path, cache=self.mode)
+        self._file_signature = signature
+        self.cache.clear()
+
+    def _get_reader(self) -> GeoIP2:
+        now = time.monotonic()
+        is_fresh = now - self._last_check < self.reload_check_interval
+        if self._reader is not None and is_fresh:
+            return self._reader
+
+        with self._lock:
+            if self._reader is None:
+                self._open()
+            elif now - self._last_check >= self.reload_check_interval:
+                try:
+                    changed = self._get_file_signature() != self._file_signature
+                except FileNotFoundError:
+                    # The file is being replaced, keep the current reader.
+                    changed = False
+                if changed:
+                    self._open()
+            self._last_check = now
+        return self._reader
+
+    def _lookup_country_name(self, ip: str) -> Optional[str]:
+        try:
+            return self._get_reader().country_name(ip)
+        except AddressNotFoundError:
+            return None
+
+    def country_name(self, ip: str) -> Optional[str]:
+        # Check for a replaced database first so that a reload clears the cache.
+        self._get_reader()
+        return self.cache.get_or_set(ip, lambda: self._lookup_country_name(ip))
+
+    def get_stats(self) -> dict:
+        return {"reloads": self.reloads, **self.cache.get_stats()}
+
+
+_geoip: Optional[CachedGeoIP] = None
+_geoip_lock = threading.Lock()
+
+
+def get_geoip() -> CachedGeoIP:
+    """
+    Return the GeoIP reader shared by the whole process.
+    """
+    global _geoip
+
+    if _geoip is None:
+        with _geoip_lock:
+            if _geoip is None:
+                _geoip = CachedGeoIP(
+                    path=os.path.join(
+                        settings.GEOIP_PATH,
+                        getattr(settings, "GEOIP_COUNTRY", "GeoLite2-Country.mmdb"),
+                    ),
+                    cache_size=settings.GEOIP_CACHE_SIZE,
+                    mmap=settings.GEOIP_MMAP,
+                    reload_check_interval=settings.GEOIP_RELOAD_CHECK_INTERVAL,
+                )
+    return _geoip
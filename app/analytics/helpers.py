@@ -1,42 +1,126 @@
-from typing import Optional
+import hashlib
+import threading
+import urllib.parse
+from datetime import date, timedelta
+from typing import Iterable, List, Optional, Tuple
 
-from django.contrib.gis.geoip2 import GeoIP2
+from analytics.caches import LRUCache
+from analytics.geoip import get_geoip
+from django.conf import settings
 from django.utils import timezone
-from geoip2.errors import AddressNotFoundError
 from user_agents import parse
 
+_user_agent_cache: Optional[LRUCache] = None
+_user_agent_cache_lock = threading.Lock()
+
+_page_url_cache: Optional[LRUCache] = None
+_page_url_cache_lock = threading.Lock()
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Periods of the dashboard besides all time, in months
+PERIODS = ["1", "3", "6", "12"]
+
 
 def get_client_ip_from_request_meta(request_meta: dict) -> str:
     x_forwarded_for = request_meta.get("HTTP_X_FORWARDED_FOR")
     if x_forwarded_for:
-        ip = x_forwarded_for.split(",")[0]
+        ip = x_forwarded_for.split(",")[0].strip()
     else:
         ip = request_meta.get("REMOTE_ADDR")
     return ip
 
 
 def get_country_from_request_meta(request_meta: dict) -> str:
-    geo_ip = GeoIP2()
     ip = get_client_ip_from_request_meta(request_meta)
-    try:
-        country = geo_ip.country_name(ip)
-    except AddressNotFoundError:
-        country = None
+    country = get_geoip().country_name(ip)
     return country or "Unknown"
 
 
+def get_user_agent_cache() -> LRUCache:
+    global _user_agent_cache
+
+    if _user_agent_cache is None:
+        with _user_agent_cache_lock:
+            if _user_agent_cache is None:
+                _user_agent_cache = LRUCache(
+                    maxsize=settings.USER_AGENT_CACHE_SIZE,
+                    ttl=settings.USER_AGENT_CACHE_TTL,
+                )
+    return _user_agent_cache
+
+
+def parse_user_agent(user_agent_string: str) -> Tuple[str, str, str]:
+    """
+    Return the browser, os and device families of a user agent string.
+    """
+    user_agent = parse(user_agent_string)
+    return user_agent.browser.family, user_agent.os.family, user_agent.device.family
+
+
+def get_user_agent_families(user_agent_string: str) -> Tuple[str, str, str]:
+    """
+    Cached version of parse_user_agent.
+    """
+    return get_user_agent_cache().get_or_set(
+        user_agent_string, lambda: parse_user_agent(user_agent_string)
+    )
+
+
+def normalize_url(url: str) -> str:
+    """
+    Return the url with lower case scheme and host, without default port and
+    fragment and with "/" as path instead of an empty one, so that different
+    spellings of the same page are counted together.
+    """
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if parts.port and parts.port == DEFAULT_PORTS.get(scheme):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parts.path or "/"
+    return urllib.parse.urlunsplit((scheme, netloc, path, parts.query, ""))
+
+
+def get_url_hash(normalized_url: str) -> int:
+    """
+    Return a 64 bit hash of the normalized url that fits into a bigint column.
+    """
+    digest = hashlib.blake2b(normalized_url.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def get_page_url_cache() -> LRUCache:
+    global _page_url_cache
+
+    if _page_url_cache is None:
+        with _page_url_cache_lock:
+            if _page_url_cache is None:
+                _page_url_cache = LRUCache(maxsize=settings.PAGE_URL_CACHE_SIZE)
+    return _page_url_cache
+
+
 def get_page_view_metadata_from_request_meta(request_meta: dict) -> dict:
     metadata = {}
     user_agent_string = request_meta.get("HTTP_USER_AGENT")
-    user_agent = parse(user_agent_string)
-    if user_agent:
-        metadata["browser"] = user_agent.browser.family
-        metadata["os"] = user_agent.os.family
-        metadata["device"] = user_agent.device.family
-        metadata["country"] = get_country_from_request_meta(request_meta)
+    browser, os_family, device = get_user_agent_families(user_agent_string)
+    metadata["browser"] = browser
+    metadata["os"] = os_family
+    metadata["device"] = device
+    metadata["country"] = get_country_from_request_meta(request_meta)
     return metadata
 
 
+def classify_robot(metadata: dict) -> bool:
+    """
+    Return if the page view with the given metadata was made by a robot.
+    """
+    if metadata.get("device") in settings.EXCLUDED_DEVICES:
+        return True
+    browser = (metadata.get("browser") or "").lower()
+    return any(keyword in browser for keyword in settings.EXCLUDED_BROWSER_KEYWORDS)
+
+
 def transform_period_string_to_timedelta(period: str) -> Optional[timezone.timedelta]:
     result = None
 
@@ -50,3 +134,16 @@ def transform_period_string_to_timedelta(period: str) -> Optional[timezone.timed
         result = timezone.timedelta(days=365)
 
     return result
+
+
+def get_day_ranges(days: Iterable[date]) -> List[Tuple[date, date]]:
+    """
+    Return the days as sorted (first day, last day) ranges of consecutive days.
+    """
+    ranges = []
+    for day in sorted(set(days)):
+        if ranges and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
@@ -0,0 +1,254 @@
+import json
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+from analytics.helpers import normalize_url
+from django.conf import settings
+
+# Datagrams of tracked page views are split at this size, the default maximum
+# of Unix datagram sockets is about 200 KiB
+MAX_MESSAGE_SIZE = 60000
+PAGE_VIEWS_MESSAGE = "P"
+WINDOW_MESSAGE = "W"
+
+
+class LiveWindow:
+    """
+    Ring buffer of the page views of one domain per second during the last
+    ``seconds`` seconds, with the amount of page views per url.
+    """
+
+    def __init__(self, seconds: int):
+        self.seconds = seconds
+        self.slot_seconds: List[Optional[int]] = [None] * seconds
+        self.page_views = [0] * seconds
+        self.robot_page_views = [0] * seconds
+        self.urls = [Counter() for _ in range(seconds)]
+        self.last_second = 0
+
+    def add(self, second: int, url: str, is_robot: bool, now: int) -> None:
+        if not now - self.seconds < second <= now:
+            return
+        index = second % self.seconds
+        if self.slot_seconds[index] != second:
+            self.slot_seconds[index] = second
+            self.page_views[index] = 0
+            self.robot_page_views[index] = 0
+            self.urls[index] = Counter()
+        if is_robot:
+            self.robot_page_views[index] += 1
+        else:
+            self.page_views[index] += 1
+            self.urls[index][url] += 1
+        self.last_second = max(self.last_second, second)
+
+    def get_data(self, now: int, top_urls: int) -> dict:
+        """
+        Return the page views per second of the window ending at now (oldest
+        first) and the urls with the most page views, without robots.
+        """
+        page_views = []
+        robot_page_views = []
+        urls = Counter()
+        for second in range(now - self.seconds + 1, now + 1):
+            index = second % self.seconds
+            if self.slot_seconds[index] == second:
+                page_views.append(self.page_views[index])
+                robot_page_views.append(self.robot_page_views[index])
+                urls.update(self.urls[index])
+            else:
+                page_views.append(0)
+                robot_page_views.append(0)
+        return {
+            "now": now,
+            "total": sum(page_views),
+            "robots": sum(robot_page_views),
+            "page_views": page_views,
+            "robot_page_views": robot_page_views,
+            "top_urls": urls.most_common(top_urls),
+        }
+
+
+class LiveTraffic:
+    """
+    Live windows of all domains, kept by the aggregator process.
+    """
+
+    def __init__(self, seconds: int, top_urls: int):
+        self.seconds = seconds
+        self.top_urls = top_urls
+        self.windows: Dict[str, LiveWindow] = {}
+
+    def add(
+        self, domain_id: str, second: int, url: str, is_robot: bool, now: int
+    ) -> None:
+        window = self.windows.get(domain_id)
+        if window is None:
+            window = self.windows[domain_id] = LiveWindow(self.seconds)
+        window.add(second, url, is_robot, now)
+
+    def get_data(self, domain_id: str, now: int) -> dict:
+        window = self.windows.get(domain_id) or LiveWindow(self.seconds)
+        return window.get_data(now, self.top_urls)
+
+    def prune(self, now: int) -> None:
+        """
+        Forget the windows of domains without page views in their window.
+        """
+        for domain_id, window in list(self.windows.items()):
+            if window.last_second <= now - self.seconds:
+                del self.windows[domain_id]
+
+
+class LiveAggregator:
+    """
+    Unix datagram socket server that keeps the live windows for all worker
+    processes, see run_live_aggregator.
+
+    Workers send the page views they tracked as lines of tab separated domain
+    id, timestamp, robot flag and url, prefixed by a line with PAGE_VIEWS_MESSAGE.
+    A WINDOW_MESSAGE line followed by a domain id is answered with the JSON of
+    the current window of the domain.
+    """
+
+    def __init__(self, path: str, traffic: LiveTraffic):
+        self.path = path
+        self.traffic = traffic
+        self.socket: Optional[socket.socket] = None
+
+    def bind(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.path)
+
+    def handle(self, message: bytes, address) -> None:
+        now = int(time.time())
+        kind, _, body = message.decode().partition("\n")
+        if kind == PAGE_VIEWS_MESSAGE:
+            for line in body.splitlines():
+                try:
+                    domain_id, timestamp, is_robot, url = line.split("\t", 3)
+                    second = int(float(timestamp))
+                except ValueError:
+                    continue
+                self.traffic.add(domain_id, second, url, is_robot == "1", now)
+        elif kind == WINDOW_MESSAGE and address:
+            data = self.traffic.get_data(body.strip(), now)
+            try:
+                self.socket.sendto(json.dumps(data).encode(), address)
+            except OSError:
+                # The client gave up waiting
+                pass
+
+    def serve_forever(self, prune_interval: float = 60.0) -> None:
+        self.bind()
+        last_prune = time.monotonic()
+        try:
+            while True:
+                message, address = self.socket.recvfrom(MAX_MESSAGE_SIZE * 2)
+                self.handle(message, address)
+                if time.monotonic() - last_prune >= prune_interval:
+                    self.traffic.prune(int(time.time()))
+                    last_prune = time.monotonic()
+        finally:
+            self.socket.close()
+            os.unlink(self.path)
+
+
+class LiveTrafficClient:
+    """
+    Sends tracked page views to the aggregator and reads the live windows.
+
+    Sending never blocks: page views are dropped and counted if the aggregator
+    is not running or can not keep up.
+    """
+
+    def __init__(self, path: str, timeout: float):
+        self.path = path
+        self.timeout = timeout
+        self.sent = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def get_stats(self) -> dict:
+        return {"sent": self.sent, "dropped": self.dropped}
+
+    def get_messages(self, page_views: Iterable) -> Iterable[List[str]]:
+        lines = []
+        size = 0
+        for page_view in page_views:
+            timestamp = page_view.timestamp.timestamp() if page_view.timestamp else 0
+            line = "\t".join(
+                [
+                    str(page_view.domain_id),
+                    str(int(timestamp)),
+                    "1" if page_view.is_robot else "0",
+                    # Tabs and newlines are not valid in urls
+                    normalize_url(page_view.url).replace("\t", "").replace("\n", ""),
+                ]
+            )
+            if lines and size + len(line) > MAX_MESSAGE_SIZE:
+                yield lines
+                lines = []
+                size = 0
+            lines.append(line)
+            size += len(line) + 1
+        if lines:
+            yield lines
+
+    def send_page_views(self, page_views: Iterable) -> None:
+        for lines in self.get_messages(page_views):
+            message = "\n".join([PAGE_VIEWS_MESSAGE, *lines]).encode()
+            try:
+                self._socket.sendto(message, self.path)
+            except OSError:
+                with self._lock:
+                    self.dropped += len(lines)
+            else:
+                with self._lock:
+                    self.sent += len(lines)
+
+    def get_window(self, domain_id) -> Optional[dict]:
+        """
+        Return the current window of the domain, None if the aggregator does not
+        answer.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as client:
+            # An empty address binds to a unique abstract address (Linux only)
+            # the aggregator can answer to
+            client.bind("")
+            client.settimeout(self.timeout)
+            try:
+                client.sendto(f"{WINDOW_MESSAGE}\n{domain_id}".encode(), self.path)
+                return json.loads(client.recv(MAX_MESSAGE_SIZE * 2))
+            except (OSError, ValueError):
+                return None
+
+
+_client: Optional[LiveTrafficClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_live_traffic_client() -> LiveTrafficClient:
+    """
+    Return the client of the current process, every (forked) worker gets its
+    own socket.
+    """
+    global _client, _client_pid
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = LiveTrafficClient(
+                path=settings.LIVE_TRAFFIC_SOCKET,
+                timeout=settings.LIVE_TRAFFIC_TIMEOUT,
+            )
+            _client_pid = os.getpid()
+    return _client
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from analytics.archives import archive_month, get_next_month
+from analytics.models import Domain, PageViewDimensionRollup, PageViewMonthlyTotal
+from analytics.partitions import add_months
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the page views and rollups of old months to the columnar archive, "
+        "the analytics read them from there. Run it monthly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domain",
+            help="Only archive the page views of the domain with this id.",
+        )
+        parser.add_argument(
+            "--until",
+            help=(
+                "Archive the months before this month (YYYY-MM), by default the "
+                "months that ended more than PAGE_VIEW_ARCHIVE_AFTER_MONTHS ago."
+            ),
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=10000,
+            help="Amount of page views fetched per round trip.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.PAGE_VIEW_DOWNSAMPLE_BATCH_SIZE,
+            help="Amount of archived page views deleted per transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=settings.PAGE_VIEW_DOWNSAMPLE_PAUSE,
+            help="Seconds to wait between two batches.",
+        )
+
+    def handle(self, *args, **options):
+        if options["until"]:
+            try:
+                until = datetime.strptime(options["until"], "%Y-%m").date()
+            except ValueError:
+                raise CommandError("--until has to be formatted as YYYY-MM")
+        else:
+            current_month = timezone.localdate().replace(day=1)
+            until = add_months(current_month, -settings.PAGE_VIEW_ARCHIVE_AFTER_MONTHS)
+        until = min(until, PageViewMonthlyTotal.objects.get_closed_until())
+
+        domains = Domain.objects.all()
+        if options["domain"]:
+            domains = domains.filter(pk=options["domain"])
+        for domain in domains:
+            # Months are archived in order, starting with the first month
+            month = get_next_month(domain.archived_until, domain.downsampled_until)
+            if domain.archived_until is None:
+                first_days = [
+                    domain.page_views.aggregate(day=Min("timestamp__date"))["day"],
+                    PageViewDimensionRollup.objects.filter(domain=domain).aggregate(
+                        day=Min("day")
+                    )["day"],
+                ]
+                first_days = [day for day in first_days if day]
+                if not first_days:
+                    continue
+                first_month = min(first_days).replace(day=1)
+                month = max(month, first_month) if month else first_month
+
+            while month < until:
+                amount = archive_month(
+                    domain.pk,
+                    month,
+                    options["chunk_size"],
+                    batch_size=options["batch_size"],
+                    pause=options["pause"],
+                )
+                self.stdout.write(
+                    f"Archived {amount} page views of {domain} in {month:%Y-%m}"
+                )
+                month = add_months(month, 1)
@@ -0,0 +1,61 @@
+import resource
+import time
+
+from analytics.exports import EXPORT_CONTENT_TYPES, export_page_views
+from analytics.models import Domain
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the throughput (rows/s) of the raw page view exports of a domain "
+        "and the peak memory of the process, which stays flat with the export size"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domain",
+            help="Exported domain, by default the one with the most page views.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            action="append",
+            help="Rows fetched per round trip, can be passed multiple times.",
+        )
+
+    def handle(self, *args, **options):
+        domains = Domain.objects.all()
+        if options["domain"]:
+            domains = domains.filter(pk=options["domain"])
+        domain = (
+            domains.annotate(amount=Count("page_views")).order_by("-amount").first()
+        )
+        if domain is None or not domain.amount:
+            raise CommandError("There are no page views to export")
+
+        self.stdout.write(f"Exporting {domain.amount:,} page views of {domain}")
+        for chunk_size in options["chunk_size"] or [None]:
+            for export_format in EXPORT_CONTENT_TYPES:
+                for compress in [False, True]:
+                    start = time.perf_counter()
+                    size = 0
+                    for chunk in export_page_views(
+                        domain.pk,
+                        export_format=export_format,
+                        compress=compress,
+                        chunk_size=chunk_size,
+                    ):
+                        size += len(chunk)
+                    duration = time.perf_counter() - start
+                    # Kilobytes on Linux
+                    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+                    name = f"{export_format}{'.gz' if compress else ''}"
+                    self.stdout.write(
+                        f"{name:<10} chunk size {chunk_size or 'default':<8} "
+                        f"{domain.amount / duration:>10,.0f} rows/s "
+                        f"{size / duration / 2**20:>7.1f} MiB/s "
+                        f"peak memory {peak / 2**10:.1f} MiB"
+                    )
@@ -0,0 +1,88 @@
+import json
+import time
+
+from analytics.models import Domain
+from analytics.views import TrackView
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+REQUEST_META = {
+    "HTTP_USER_AGENT": (
+        "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 "
+        "(KHTML, like Gecko) Version/16.1 Safari/605.1.15"
+    ),
+    "REMOTE_ADDR": "127.0.0.1",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the requests/s and latency percentiles of the tracking endpoint "
+        "with a request transaction (like ATOMIC_REQUESTS) and without it. The "
+        "page views are tracked for a temporary domain which is deleted again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=1000,
+            help="Amount of tracked page views per mode.",
+        )
+        parser.add_argument(
+            "--urls",
+            type=int,
+            default=100,
+            help="Amount of different urls the page views are spread over.",
+        )
+
+    def track(self, view, domain: Domain, index: int, amount_urls: int) -> None:
+        data = {
+            "domain_id": str(domain.pk),
+            "url": f"{domain.base_url}/page-{index % amount_urls}/",
+            "request_meta": REQUEST_META,
+        }
+        request = RequestFactory().post(
+            "/api/track/", data=json.dumps(data), content_type="application/json"
+        )
+        response = view(request)
+        if response.status_code != 201:
+            raise RuntimeError(f"Tracking failed: {response.data}")
+
+    def handle(self, *args, **options):
+        view = TrackView.as_view()
+        domain = Domain.objects.create(base_url="https://benchmark.example.com")
+        try:
+            for mode in ["atomic request", "non-atomic"]:
+                # Warm up the caches of the domain, urls and user agent
+                for index in range(options["urls"]):
+                    self.track(view, domain, index, options["urls"])
+
+                durations = []
+                start = time.perf_counter()
+                for index in range(options["requests"]):
+                    request_start = time.perf_counter()
+                    if mode == "atomic request":
+                        with transaction.atomic():
+                            self.track(view, domain, index, options["urls"])
+                    else:
+                        self.track(view, domain, index, options["urls"])
+                    durations.append(time.perf_counter() - request_start)
+                total = time.perf_counter() - start
+
+                durations.sort()
+
+                def get_percentile(percentile: int) -> float:
+                    index = min(len(durations) - 1, len(durations) * percentile // 100)
+                    return durations[index] * 1000
+
+                self.stdout.write(
+                    f"{mode:<15} {len(durations) / total:>8,.0f} requests/s "
+                    f"p50 {get_percentile(50):.2f} ms "
+                    f"p99 {get_percentile(99):.2f} ms"
+                )
+        finally:
+            # Page views protect their urls from being deleted with the domain
+            domain.page_views.all().delete()
+            domain.delete()
@@ -0,0 +1,94 @@
+import random
+import time
+
+from analytics.caches import LRUCache
+from analytics.helpers import parse_user_agent
+from django.core.management.base import BaseCommand
+
+# User agent templates of common browsers and robots, "{version}" is replaced by
+# a version number to get the variety of user agent strings of real traffic.
+USER_AGENT_TEMPLATES = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{version}.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_{version} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{version}.1 Safari/605.1.15",
+    "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{version}.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:{version}.0) Gecko/20100101 Firefox/{version}.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{version}.0.0.0 Safari/537.36 Edg/{version}.0.0.0",
+    "Mozilla/5.0 (compatible; Googlebot/2.{version}; +http://www.google.com/bot.html)",
+    "Mozilla/5.0 (compatible; AhrefsBot/7.{version}; +http://ahrefs.com/robot/)",
+    "Mozilla/5.0+(compatible; UptimeRobot/2.{version}; http://www.uptimerobot.com/)",
+    "Mozilla/5.0 (compatible; bingbot/2.{version}; +http://www.bing.com/bingbot.htm)",
+]
+
+
+def get_user_agent_sample(distinct: int, amount: int, seed: int) -> list:
+    """
+    Return amount user agent strings out of distinct ones, Zipf distributed like
+    real traffic where a few browsers cause most of the page views.
+    """
+    rng = random.Random(seed)
+    user_agents = []
+    version = 1
+    while len(user_agents) < distinct:
+        for template in USER_AGENT_TEMPLATES:
+            user_agents.append(template.format(version=version))
+        version += 1
+    user_agents = user_agents[:distinct]
+    rng.shuffle(user_agents)
+    weights = [1 / rank for rank in range(1, len(user_agents) + 1)]
+    return rng.choices(user_agents, weights=weights, k=amount)
+
+
+class Command(BaseCommand):
+    help = "Compare the throughput of cached and uncached user agent parsing"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200000,
+            help="Amount of user agent strings parsed with the cache.",
+        )
+        parser.add_argument(
+            "--uncached-requests",
+            type=int,
+            default=5000,
+            help="Amount of user agent strings parsed without the cache.",
+        )
+        parser.add_argument(
+            "--distinct",
+            type=int,
+            default=2000,
+            help="Amount of distinct user agent strings.",
+        )
+        parser.add_argument("--cache-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        sample = get_user_agent_sample(
+            distinct=options["distinct"],
+            amount=options["requests"],
+            seed=options["seed"],
+        )
+
+        uncached_sample = sample[: options["uncached_requests"]]
+        start = time.perf_counter()
+        for user_agent_string in uncached_sample:
+            parse_user_agent(user_agent_string)
+        uncached_rate = len(uncached_sample) / (time.perf_counter() - start)
+
+        cache = LRUCache(maxsize=options["cache_size"])
+        start = time.perf_counter()
+        for user_agent_string in sample:
+            cache.get_or_set(
+                user_agent_string, lambda: parse_user_agent(user_agent_string)
+            )
+        cached_rate = len(sample) / (time.perf_counter() - start)
+
+        stats = cache.get_stats()
+        self.stdout.write(f"uncached: {uncached_rate:,.0f} user agents/s")
+        self.stdout.write(
+            f"cached:   {cached_rate:,.0f} user agents/s "
+            f"(hit rate {stats['hit_rate']:.2%}, {stats['size']} cached entries)"
+        )
+        self.stdout.write(f"speedup:  {cached_rate / uncached_rate:.1f}x")
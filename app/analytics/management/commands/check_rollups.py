@@ -0,0 +1,47 @@
+from analytics.models import Domain, PageViewDimensionRollup, PageViewUrlRollup
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the daily page view totals of the rollups with the page views "
+        "and optionally rebuild the days that differ"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domain",
+            help="Only check the rollups of the domain with this id.",
+        )
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Rebuild the rollups of the days that differ from the page views.",
+        )
+
+    def handle(self, *args, **options):
+        domains = Domain.objects.order_by("base_url")
+        if options["domain"]:
+            domains = domains.filter(pk=options["domain"])
+
+        amount_differences = 0
+        for domain in domains:
+            for rollup_model in (PageViewUrlRollup, PageViewDimensionRollup):
+                days = rollup_model.objects.get_differing_days(domain.pk)
+                for day in days:
+                    self.stdout.write(
+                        f"{domain} {day}: {rollup_model.__name__} differs from the "
+                        f"page views"
+                    )
+                if options["repair"]:
+                    rollup_model.objects.rebuild_days(domain.pk, days)
+                amount_differences += len(days)
+
+        if options["repair"]:
+            self.stdout.write(f"The rollups of {amount_differences} days were rebuilt")
+        elif amount_differences:
+            raise CommandError(
+                f"The rollups of {amount_differences} days differ from the page views"
+            )
+        else:
+            self.stdout.write("The rollups are consistent with the page views")
@@ -0,0 +1,114 @@
+from analytics.helpers import classify_robot
+from analytics.models import Browser, Device, PageView
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Classify existing page views as robots with the current EXCLUDED_DEVICES "
+        "and EXCLUDED_BROWSER_KEYWORDS rules"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Amount of page views classified per query.",
+        )
+        parser.add_argument(
+            "--domain",
+            help="Only classify the page views of the domain with this id.",
+        )
+        parser.add_argument(
+            "--start-after",
+            help="Resume after the page view with this id.",
+        )
+
+    def get_metadata(self, browser_id, device_id, metadata) -> dict:
+        """
+        Return the browser and device of a page view, from its metadata if it was
+        not converted by migrate_page_view_dimensions yet.
+        """
+        if browser_id is None:
+            return metadata or {}
+        return {
+            "browser": self.browsers.get(browser_id),
+            "device": self.devices.get(device_id),
+        }
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        page_views = PageView.objects.order_by("pk")
+        if options["domain"]:
+            page_views = page_views.filter(domain_id=options["domain"])
+
+        # The rollups are adjusted by the previous classification of the page
+        # views, which pending page views are not counted with yet
+        PageView.objects.merge_pending()
+
+        self.browsers = Browser.objects.get_names()
+        self.devices = Device.objects.get_names()
+
+        last_pk = options["start_after"]
+        amount_classified = 0
+        amount_changed = 0
+        while True:
+            batch = page_views
+            if last_pk:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(
+                batch.values(
+                    "pk",
+                    "is_robot",
+                    "domain_id",
+                    "timestamp",
+                    "page_url_id",
+                    "ip",
+                    "browser_id",
+                    "os_id",
+                    "device_id",
+                    "country_id",
+                    "metadata",
+                )[:batch_size]
+            )
+            if not batch:
+                break
+
+            changed = []
+            for row in batch:
+                metadata = row.pop("metadata")
+                robot = classify_robot(
+                    self.get_metadata(row["browser_id"], row["device_id"], metadata)
+                )
+                if robot != row["is_robot"]:
+                    changed.append(PageView(**{**row, "is_robot": robot}))
+            if changed:
+                # The aggregates are adjusted with every batch, a run that is
+                # interrupted would not find its changed page views again
+                with transaction.atomic():
+                    for is_robot in [True, False]:
+                        pks = [
+                            page_view.pk
+                            for page_view in changed
+                            if page_view.is_robot == is_robot
+                        ]
+                        if pks:
+                            PageView.objects.filter(pk__in=pks).update(
+                                is_robot=is_robot
+                            )
+                    PageView.objects.reclassify_aggregates(changed)
+
+            last_pk = batch[-1]["pk"]
+            amount_classified += len(batch)
+            amount_changed += len(changed)
+            self.stdout.write(
+                f"{amount_classified} page views classified, {amount_changed} "
+                f"changed (last id {last_pk})"
+            )
+
+        self.stdout.write(
+            f"{amount_classified} page views were classified, "
+            f"{amount_changed} of them changed."
+        )
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from analytics.models import Domain, PageView
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the page views older than PAGE_VIEW_DOWNSAMPLE_AFTER_DAYS days, "
+        "the analytics read their daily rollups. Run it daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domain",
+            help="Only downsample the page views of the domain with this id.",
+        )
+        parser.add_argument(
+            "--after-days",
+            type=int,
+            default=settings.PAGE_VIEW_DOWNSAMPLE_AFTER_DAYS,
+            help="Delete the page views of the days that ended this many days ago.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.PAGE_VIEW_DOWNSAMPLE_BATCH_SIZE,
+            help="Amount of page views deleted per transaction.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=settings.PAGE_VIEW_DOWNSAMPLE_PAUSE,
+            help="Seconds to wait between two batches.",
+        )
+
+    def handle(self, *args, **options):
+        if options["after_days"] <= 0:
+            raise CommandError(
+                "Set --after-days or PAGE_VIEW_DOWNSAMPLE_AFTER_DAYS to downsample"
+            )
+        until_day = timezone.localdate() - timedelta(days=options["after_days"])
+
+        domains = Domain.objects.order_by("base_url")
+        if options["domain"]:
+            domains = domains.filter(pk=options["domain"])
+        for domain in domains:
+            amount = PageView.objects.downsample(
+                domain.pk,
+                until_day,
+                batch_size=options["batch_size"],
+                pause=options["pause"],
+            )
+            self.stdout.write(
+                f"Deleted {amount} page views of {domain} before {until_day}"
+            )
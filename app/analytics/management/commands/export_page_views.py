@@ -0,0 +1,65 @@
+import sys
+
+from analytics.exports import EXPORT_CONTENT_TYPES, export_page_views
+from analytics.models import Domain
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+
+def parse_day(value: str, option: str):
+    try:
+        day = parse_date(value) if value else None
+    except ValueError:
+        day = None
+    if value and day is None:
+        raise CommandError(f"{option} has to be formatted as YYYY-MM-DD")
+    return day
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the raw page views of a domain as CSV or NDJSON into a file or "
+        "to stdout, with constant memory usage"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("domain", help="Id of the exported domain.")
+        parser.add_argument(
+            "--format", choices=list(EXPORT_CONTENT_TYPES), default="csv"
+        )
+        parser.add_argument("--start", help="First exported day (YYYY-MM-DD).")
+        parser.add_argument("--end", help="Last exported day (YYYY-MM-DD).")
+        parser.add_argument(
+            "--gzip", action="store_true", help="Compress the export with gzip."
+        )
+        parser.add_argument(
+            "--output", default="-", help="Path of the export file, - for stdout."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            help="Amount of rows fetched per round trip (EXPORT_CHUNK_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        if not Domain.objects.filter(pk=options["domain"]).exists():
+            raise CommandError(f"Domain {options['domain']} does not exist")
+
+        chunks = export_page_views(
+            options["domain"],
+            export_format=options["format"],
+            start_day=parse_day(options["start"], "--start"),
+            end_day=parse_day(options["end"], "--end"),
+            compress=options["gzip"],
+            chunk_size=options["chunk_size"],
+        )
+        if options["output"] == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(options["output"], "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        self.stderr.write(f"Exported the page views to {options['output']}")
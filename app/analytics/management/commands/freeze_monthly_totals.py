@@ -0,0 +1,27 @@
+from analytics.models import Domain, PageViewMonthlyTotal
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the page view totals of the months closed since the last run. "
+        "Run it daily, months that are not stored are read from the rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domain",
+            help="Only store the totals of the domain with this id.",
+        )
+
+    def handle(self, *args, **options):
+        domain_ids = None
+        if options["domain"]:
+            domain_ids = [options["domain"]]
+        closed_until = PageViewMonthlyTotal.objects.freeze(domain_ids)
+
+        amount_domains = len(domain_ids) if domain_ids else Domain.objects.count()
+        self.stdout.write(
+            f"The monthly totals of {amount_domains} domains were stored until "
+            f"{closed_until:%Y-%m}"
+        )
@@ -0,0 +1,229 @@
+import multiprocessing
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from analytics.generator import (
+    COUNTRIES,
+    USER_AGENTS,
+    GeneratedDomain,
+    PageViewGenerator,
+    copy_page_views,
+    create_page_urls,
+    get_domain_id,
+    get_domain_page_views,
+    get_urls,
+)
+from analytics.models import DIMENSIONS, Domain, PageView
+from analytics.partitions import add_months, create_partition
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+# Set in every process by init_worker
+_plan: Optional[dict] = None
+_generators: Dict[int, PageViewGenerator] = {}
+
+
+def init_worker(plan: dict) -> None:
+    global _plan
+    _plan = plan
+    _generators.clear()
+
+
+def copy_chunk(unit: Tuple[int, int, int]) -> int:
+    domain_index, chunk_index, amount = unit
+    generator = _generators.get(domain_index)
+    if generator is None:
+        generator = _generators[domain_index] = PageViewGenerator(
+            seed=_plan["seed"],
+            domain=_plan["domains"][domain_index],
+            start_day=_plan["start_day"],
+            days=_plan["days"],
+            dimension_ids=_plan["dimension_ids"],
+        )
+    copy_page_views(generator.get_rows(chunk_index, amount))
+    return amount
+
+
+def rebuild_aggregates(domain_id: str) -> str:
+    PageView.objects.rebuild_aggregates(domain_id, _plan["start_day"], _plan["end_day"])
+    return domain_id
+
+
+class Command(BaseCommand):
+    help = (
+        "Load a synthetic dataset of page views of many domains with COPY, for "
+        "load and scale testing. The same seed always generates the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domains",
+            type=int,
+            default=10,
+            help="Amount of domains, a few of them get most of the page views.",
+        )
+        parser.add_argument(
+            "--page-views",
+            type=int,
+            default=1000000,
+            help="Amount of page views of all domains.",
+        )
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Amount of days the page views are spread over.",
+        )
+        parser.add_argument(
+            "--start",
+            help="First day of the page views (YYYY-MM-DD), by default --days ago.",
+        )
+        parser.add_argument(
+            "--urls",
+            type=int,
+            default=1000,
+            help="Amount of urls per domain.",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            help="Seed of the generated domains and page views.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Amount of processes that generate and copy the page views.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100000,
+            help="Amount of page views per COPY.",
+        )
+        parser.add_argument(
+            "--skip-aggregates",
+            action="store_true",
+            help="Do not rebuild the rollups, visitor sketches and url totals.",
+        )
+
+    def create_domains(self, options) -> List[GeneratedDomain]:
+        domain_ids = [
+            get_domain_id(options["seed"], index) for index in range(options["domains"])
+        ]
+        if Domain.objects.filter(pk__in=domain_ids).exists():
+            raise CommandError(
+                f"The domains of seed {options['seed']} were already generated"
+            )
+
+        domains = []
+        for index, domain_id in enumerate(domain_ids):
+            base_url = f"https://site-{index}.example.com"
+            Domain.objects.create(pk=domain_id, base_url=base_url)
+            urls = get_urls(base_url, options["urls"])
+            domains.append(
+                GeneratedDomain(
+                    index=index,
+                    domain_id=domain_id,
+                    urls=urls,
+                    page_url_ids=create_page_urls(domain_id, urls),
+                )
+            )
+        return domains
+
+    def run(self, function, items: list, workers: int, plan: dict) -> int:
+        """
+        Call the function with every item, in a pool of processes if there is
+        more than one worker. Return the amount of processed items.
+        """
+        if workers <= 1:
+            init_worker(plan)
+            for item in items:
+                function(item)
+            return len(items)
+
+        # Forked processes must not share the connections of this process
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(workers, initializer=init_worker, initargs=(plan,)) as pool:
+            return sum(1 for _ in pool.imap_unordered(function, items))
+
+    def handle(self, *args, **options):
+        for name in ["domains", "page_views", "days", "urls", "chunk_size"]:
+            if options[name] <= 0:
+                raise CommandError(f"--{name.replace('_', '-')} has to be positive")
+
+        if options["start"]:
+            try:
+                start_day = datetime.strptime(options["start"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--start has to be formatted as YYYY-MM-DD")
+        else:
+            start_day = timezone.localdate() - timedelta(days=options["days"])
+        end_day = start_day + timedelta(days=options["days"] - 1)
+
+        domains = self.create_domains(options)
+        dimension_ids = {
+            dimension: {
+                name: DIMENSIONS[dimension].objects.get_id(name) for name in names
+            }
+            for dimension, names in [
+                ("browser", {browser for _, browser, _, _ in USER_AGENTS}),
+                ("os", {os for _, _, os, _ in USER_AGENTS}),
+                ("device", {device for _, _, _, device in USER_AGENTS}),
+                ("country", {country for _, country in COUNTRIES}),
+            ]
+        }
+        month = start_day.replace(day=1)
+        while month <= end_day:
+            create_partition(month)
+            month = add_months(month, 1)
+
+        units = []
+        for domain, amount in zip(
+            domains, get_domain_page_views(len(domains), options["page_views"])
+        ):
+            for chunk_index, offset in enumerate(
+                range(0, amount, options["chunk_size"])
+            ):
+                units.append(
+                    (
+                        domain.index,
+                        chunk_index,
+                        min(options["chunk_size"], amount - offset),
+                    )
+                )
+        plan = {
+            "seed": options["seed"],
+            "domains": domains,
+            "start_day": start_day,
+            "end_day": end_day,
+            "days": options["days"],
+            "dimension_ids": dimension_ids,
+        }
+
+        start = time.perf_counter()
+        self.run(copy_chunk, units, options["workers"], plan)
+        duration = time.perf_counter() - start
+        self.stdout.write(
+            f"Copied {options['page_views']:,} page views of {len(domains)} domains "
+            f"in {duration:.1f} s ({options['page_views'] / duration:,.0f} rows/s)"
+        )
+
+        if not options["skip_aggregates"]:
+            # COPY bypasses the ingest path, so the aggregates are built afterwards
+            start = time.perf_counter()
+            self.run(
+                rebuild_aggregates,
+                [domain.domain_id for domain in domains],
+                options["workers"],
+                plan,
+            )
+            duration = time.perf_counter() - start
+            self.stdout.write(
+                f"Rebuilt the aggregates in {duration:.1f} s "
+                f"({options['page_views'] / duration:,.0f} rows/s)"
+            )
@@ -0,0 +1,67 @@
+from analytics.models import Domain
+from analytics.partitions import (
+    add_months,
+    create_partition,
+    get_partition_name,
+    get_partitions,
+    remove_partition,
+)
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly page view partitions ahead of time and drop (or "
+        "detach) the partitions older than the retention period. Run it daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.PAGE_VIEW_PARTITIONS_AHEAD,
+            help="Amount of future months to create partitions for.",
+        )
+        parser.add_argument(
+            "--retention-months",
+            type=int,
+            default=settings.PAGE_VIEW_RETENTION_MONTHS,
+            help=(
+                "Remove the partitions of months that ended more than this many "
+                "months ago, 0 keeps all partitions."
+            ),
+        )
+        parser.add_argument(
+            "--detach",
+            action="store_true",
+            help="Only detach old partitions instead of dropping them.",
+        )
+
+    def handle(self, *args, **options):
+        current_month = timezone.localdate().replace(day=1)
+
+        for amount in range(options["months_ahead"] + 1):
+            month = add_months(current_month, amount)
+            if create_partition(month):
+                self.stdout.write(f"Created {get_partition_name(month)}")
+
+        if options["retention_months"] > 0:
+            first_kept_month = add_months(current_month, -options["retention_months"])
+            removed = False
+            for partition in get_partitions():
+                if partition.month >= first_kept_month:
+                    break
+                remove_partition(partition, detach=options["detach"])
+                removed = True
+                action = "Detached" if options["detach"] else "Dropped"
+                self.stdout.write(f"{action} {partition.name}")
+            if removed:
+                # The rollups of the removed months are all that is left, like
+                # of downsampled days
+                Domain.objects.filter(
+                    Q(downsampled_until__isnull=True)
+                    | Q(downsampled_until__lt=first_kept_month)
+                ).update(downsampled_until=first_kept_month)
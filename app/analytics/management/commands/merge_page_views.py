@@ -0,0 +1,51 @@
+import logging
+import time
+
+from analytics.models import PageView
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Add the tracked page views to the rollups and url totals every "
+        "PAGE_VIEW_MERGE_INTERVAL seconds. Start it next to the workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Merge the pending page views once and exit, e.g. from cron.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.PAGE_VIEW_MERGE_BATCH_SIZE,
+            help="Amount of page views merged per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            amount = PageView.objects.merge_pending(options["batch_size"])
+            self.stdout.write(f"{amount} page views were merged")
+            return
+
+        self.stdout.write(
+            f"Merging the page views every {settings.PAGE_VIEW_MERGE_INTERVAL} s"
+        )
+        try:
+            while True:
+                try:
+                    PageView.objects.merge_pending(options["batch_size"])
+                except Exception:
+                    # The page views stay pending until the next merge
+                    logger.exception("Could not merge the pending page views")
+                finally:
+                    close_old_connections()
+                time.sleep(settings.PAGE_VIEW_MERGE_INTERVAL)
+        except KeyboardInterrupt:
+            pass
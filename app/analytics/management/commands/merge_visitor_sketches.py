@@ -0,0 +1,51 @@
+import logging
+import time
+
+from analytics.models import VisitorSketch
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge the tracked visitors into the unique visitor sketches every "
+        "VISITOR_SKETCH_MERGE_INTERVAL seconds. Start it next to the workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Merge the pending visitors once and exit, e.g. from cron.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.VISITOR_SKETCH_MERGE_BATCH_SIZE,
+            help="Amount of visitors merged per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            amount = VisitorSketch.objects.merge_pending(options["batch_size"])
+            self.stdout.write(f"{amount} visitors were merged")
+            return
+
+        self.stdout.write(
+            f"Merging the visitors every {settings.VISITOR_SKETCH_MERGE_INTERVAL} s"
+        )
+        try:
+            while True:
+                try:
+                    VisitorSketch.objects.merge_pending(options["batch_size"])
+                except Exception:
+                    # The visitors stay pending until the next merge
+                    logger.exception("Could not merge the pending visitors")
+                finally:
+                    close_old_connections()
+                time.sleep(settings.VISITOR_SKETCH_MERGE_INTERVAL)
+        except KeyboardInterrupt:
+            pass
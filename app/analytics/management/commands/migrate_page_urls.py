@@ -0,0 +1,83 @@
+from collections import defaultdict
+
+from analytics.models import (
+    Domain,
+    PageUrl,
+    PageUrlPeriodTotal,
+    PageView,
+    PageViewUrlRollup,
+)
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the normalized page url references of existing page views from "
+        "their url and rebuild the url rollups. Can be interrupted and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Amount of page views converted per transaction.",
+        )
+        parser.add_argument(
+            "--start-after",
+            help="Resume after the page view with this id.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        page_views = PageView.objects.filter(page_url__isnull=True).order_by("pk")
+        last_pk = options["start_after"]
+        amount_converted = 0
+
+        while True:
+            batch = page_views
+            if last_pk:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(
+                batch.values_list("pk", "url", "domain_id", "timestamp", "is_robot")[
+                    :batch_size
+                ]
+            )
+            if not batch:
+                break
+
+            pks_by_page_url_id = defaultdict(list)
+            converted = []
+            for pk, url, domain_id, timestamp, is_robot in batch:
+                page_url_id = PageUrl.objects.get_id(domain_id, url)
+                pks_by_page_url_id[page_url_id].append(pk)
+                converted.append(
+                    PageView(
+                        domain_id=domain_id,
+                        page_url_id=page_url_id,
+                        timestamp=timestamp,
+                        is_robot=is_robot,
+                    )
+                )
+            with transaction.atomic():
+                for page_url_id, pks in pks_by_page_url_id.items():
+                    PageView.objects.filter(pk__in=pks).update(page_url_id=page_url_id)
+                # Page views without page url are not counted by the url rollup
+                # and the url totals. They are added with the conversion, a run
+                # that is interrupted would not find them again. Only the counts
+                # of the batch are added, the batches are spread over all days.
+                PageViewUrlRollup.objects.add_page_views(converted)
+                PageUrl.objects.add_page_views(converted)
+                PageUrlPeriodTotal.objects.add_page_views(converted)
+                Domain.objects.bump_data_generation(
+                    {page_view.domain_id for page_view in converted}, force=True
+                )
+
+            last_pk = batch[-1][0]
+            amount_converted += len(batch)
+            self.stdout.write(
+                f"{amount_converted} page views converted (last id {last_pk})"
+            )
+
+        self.stdout.write(f"{amount_converted} page views were converted")
@@ -0,0 +1,87 @@
+from collections import defaultdict
+
+from analytics.models import (
+    Domain,
+    PageView,
+    PageViewDimensionRollup,
+    PageViewMonthlyTotal,
+)
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the browser, os, device and country references of existing page "
+        "views from their metadata and clear it. Can be interrupted and run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Amount of page views converted per transaction.",
+        )
+        parser.add_argument(
+            "--start-after",
+            help="Resume after the page view with this id.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        page_views = PageView.objects.filter(browser__isnull=True).order_by("pk")
+        last_pk = options["start_after"]
+        amount_converted = 0
+
+        while True:
+            batch = page_views
+            if last_pk:
+                batch = batch.filter(pk__gt=last_pk)
+            batch = list(
+                batch.values_list(
+                    "pk", "metadata", "domain_id", "timestamp", "is_robot"
+                )[:batch_size]
+            )
+            if not batch:
+                break
+
+            pks_by_dimension_ids = defaultdict(list)
+            converted = []
+            first_days = {}
+            for pk, metadata, domain_id, timestamp, is_robot in batch:
+                dimension_ids = PageView.objects.get_dimension_ids(metadata or {})
+                pks_by_dimension_ids[tuple(dimension_ids.items())].append(pk)
+                converted.append(
+                    PageView(
+                        domain_id=domain_id,
+                        timestamp=timestamp,
+                        is_robot=is_robot,
+                        **dimension_ids,
+                    )
+                )
+                day = timezone.localdate(timestamp)
+                first_days[domain_id] = min(day, first_days.get(domain_id, day))
+            with transaction.atomic():
+                for dimension_ids, pks in pks_by_dimension_ids.items():
+                    # The metadata is not needed any more once it is converted
+                    PageView.objects.filter(pk__in=pks).update(
+                        metadata=None, **dict(dimension_ids)
+                    )
+                # Page views without dimensions are not counted by the dimension
+                # rollup. They are added with the conversion, a run that is
+                # interrupted would not find them again. Only the counts of the
+                # batch are added, the batches are spread over all days.
+                PageViewDimensionRollup.objects.add_page_views(converted)
+                for domain_id, day in first_days.items():
+                    PageViewMonthlyTotal.objects.unfreeze(domain_id, day)
+                Domain.objects.bump_data_generation(first_days, force=True)
+
+            last_pk = batch[-1][0]
+            amount_converted += len(batch)
+            self.stdout.write(
+                f"{amount_converted} page views converted (last id {last_pk})"
+            )
+
+        self.stdout.write(f"{amount_converted} page views were converted")
@@ -0,0 +1,41 @@
+from datetime import datetime
+
+from analytics.models import Domain, PageViewMonthlyTotal
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored page view totals of closed months from the rollups, "
+        "e.g. after backfilling page views or rebuilding rollups"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domain",
+            help="Only rebuild the totals of the domain with this id.",
+        )
+        parser.add_argument(
+            "--from-month",
+            help="Only rebuild the totals from this month (YYYY-MM) on.",
+        )
+
+    def handle(self, *args, **options):
+        month = None
+        if options["from_month"]:
+            try:
+                month = datetime.strptime(options["from_month"], "%Y-%m").date()
+            except ValueError:
+                raise CommandError("--from-month has to be formatted as YYYY-MM")
+
+        domain_ids = list(Domain.objects.values_list("pk", flat=True))
+        if options["domain"]:
+            domain_ids = [options["domain"]]
+        for domain_id in domain_ids:
+            PageViewMonthlyTotal.objects.unfreeze(domain_id, month)
+        closed_until = PageViewMonthlyTotal.objects.freeze(domain_ids)
+
+        self.stdout.write(
+            f"The monthly totals of {len(domain_ids)} domains were rebuilt until "
+            f"{closed_until:%Y-%m}"
+        )
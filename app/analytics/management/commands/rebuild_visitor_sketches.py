@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from analytics.models import Domain, VisitorSketch
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the unique visitor sketches from the page views, e.g. after "
+        "upgrading or after backfilling page views"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domain",
+            help="Only rebuild the sketches of the domain with this id.",
+        )
+        parser.add_argument(
+            "--from-day",
+            help="Only rebuild the sketches from this day (YYYY-MM-DD) on.",
+        )
+
+    def handle(self, *args, **options):
+        from_day = None
+        if options["from_day"]:
+            try:
+                from_day = datetime.strptime(options["from_day"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--from-day has to be formatted as YYYY-MM-DD")
+
+        domains = Domain.objects.all()
+        if options["domain"]:
+            domains = domains.filter(pk=options["domain"])
+        for domain in domains:
+            start_day = from_day
+            if start_day is None:
+                first = domain.page_views.aggregate(first=Min("timestamp"))["first"]
+                if first is None:
+                    continue
+                start_day = timezone.localdate(first)
+            VisitorSketch.objects.rebuild(domain.pk, start_day, timezone.localdate())
+            self.stdout.write(
+                f"Rebuilt the visitor sketches of {domain} from {start_day} on"
+            )
@@ -0,0 +1,30 @@
+from analytics.live import LiveAggregator, LiveTraffic
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the process which counts the tracked page views of the last "
+        "LIVE_TRAFFIC_WINDOW_SECONDS seconds for the live traffic page. Start it "
+        "next to the workers when LIVE_TRAFFIC_ENABLED is set."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--socket",
+            default=settings.LIVE_TRAFFIC_SOCKET,
+            help="Path of the Unix socket the workers send the page views to.",
+        )
+
+    def handle(self, *args, **options):
+        traffic = LiveTraffic(
+            seconds=settings.LIVE_TRAFFIC_WINDOW_SECONDS,
+            top_urls=settings.LIVE_TRAFFIC_TOP_URLS,
+        )
+        aggregator = LiveAggregator(options["socket"], traffic)
+        self.stdout.write(f"Counting the live traffic at {options['socket']}")
+        try:
+            aggregator.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,34 @@
+from analytics.models import Domain, PageUrlPeriodTotal
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the url totals of the dashboard periods forward to end today, "
+        "computing them first for new domains. Run it daily after midnight."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--domain",
+            help="Only update the totals of the domain with this id.",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Recompute the totals from the url rollups instead of moving them.",
+        )
+
+    def handle(self, *args, **options):
+        domain_ids = list(Domain.objects.values_list("pk", flat=True))
+        if options["domain"]:
+            domain_ids = [options["domain"]]
+        for domain_id in domain_ids:
+            if options["rebuild"]:
+                PageUrlPeriodTotal.objects.rebuild(domain_id)
+            else:
+                PageUrlPeriodTotal.objects.move_forward(domain_id)
+
+        self.stdout.write(
+            f"The url period totals of {len(domain_ids)} domains were updated"
+        )
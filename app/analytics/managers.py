@@ -1,13 +1,32 @@
+import hashlib
 import json
-from typing import Dict
+import threading
+import urllib.parse
+from collections import Counter, defaultdict
+from datetime import date, datetime, time, timedelta
+from functools import partial
+from time import monotonic, sleep
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from analytics.helpers import (get_client_ip_from_request_meta,
-                               get_page_view_metadata_from_request_meta)
+from analytics import archives
+from analytics.caches import get_dashboard_cache
+from analytics.helpers import (PERIODS, classify_robot, get_client_ip_from_request_meta,
+                               get_day_ranges, get_page_url_cache,
+                               get_page_view_metadata_from_request_meta,
+                               get_url_hash, normalize_url,
+                               transform_period_string_to_timedelta)
+from analytics.live import get_live_traffic_client
+from analytics.registry import get_domain_registry
+from analytics.routers import read_from_replica
+from analytics.sketches import (DOMAIN_PRECISION, URL_PRECISION, HyperLogLog,
+                                get_item_hash)
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models import Count, F, Func, Value
-from django.db.models.functions import TruncDay
+from django.core.validators import validate_ipv46_address
+from django.db import connections, models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
 from rest_framework.request import Request
 
 
@@ -17,54 +36,1560 @@ class PageViewCreationError(Exception):
     """
 
 
+# Committed dimension ids by (dimension model, name), shared by all workers threads
+_dimension_ids = {}
+
+# Monotonic time of the last data generation bump per domain id in this process
+_data_generation_bumps = {}
+# Timers of the bumps skipped within the interval per domain id, see
+# DomainManager.bump_data_generation
+_trailing_bumps = {}
+_trailing_bumps_lock = threading.Lock()
+
+
+class DimensionManager(models.Manager):
+    def get_id(self, name: Optional[str]) -> int:
+        """
+        Return the id of the dimension value with the given name, create it if
+        needed. Ids are cached in-process once the row is committed.
+        """
+        name = name or "Unknown"
+        key = (self.model, name)
+        try:
+            return _dimension_ids[key]
+        except KeyError:
+            pass
+
+        value_id = self.get_or_create(name=name)[0].id
+        transaction.on_commit(
+            partial(_dimension_ids.__setitem__, key, value_id), using=self.db
+        )
+        return value_id
+
+    def get_names(self) -> Dict[int, str]:
+        return dict(self.values_list("id", "name"))
+
+
+class PageUrlManager(models.Manager):
+    def lookup(self, domain_id, url: str) -> models.QuerySet:
+        """
+        Return the page url of the domain with the given url (0 or 1 rows),
+        found through the index on its hash.
+        """
+        url = normalize_url(url)
+        return self.filter(domain_id=domain_id, url_hash=get_url_hash(url), url=url)
+
+    def get_id(self, domain_id, url: str) -> int:
+        """
+        Return the id of the page url of the domain, create it if needed. Ids
+        are cached in-process once the row is committed.
+        """
+        url = normalize_url(url)
+        key = (domain_id, url)
+        cache = get_page_url_cache()
+        page_url_id = cache.get(key)
+        if page_url_id is not None:
+            return page_url_id
+
+        page_url_id = self.get_or_create(
+            domain_id=domain_id,
+            url_hash=get_url_hash(url),
+            defaults={"url": url, "path": urllib.parse.urlsplit(url).path},
+        )[0].id
+        transaction.on_commit(partial(cache.set, key, page_url_id), using=self.db)
+        return page_url_id
+
+    def add_page_views(self, page_views: Iterable) -> None:
+        """
+        Add newly created page views to the all time totals of their urls. Rows
+        are updated in id order to avoid deadlocks between transactions.
+        """
+        counts = defaultdict(lambda: [0, 0])
+        for page_view in page_views:
+            if page_view.page_url_id is None:
+                continue
+            if not page_view.is_robot:
+                counts[page_view.page_url_id][0] += 1
+            counts[page_view.page_url_id][1] += 1
+        self.add_totals(counts)
+
+    def add_totals(self, counts: Dict[int, list]) -> None:
+        """
+        Add [views, views with robots] per page url id to the all time totals.
+        """
+        if not counts:
+            return
+
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        values = ", ".join(["(%s, %s, %s)"] * len(counts))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET total_views = {table}.total_views + v.views, "
+                f"total_views_with_robots = {table}.total_views_with_robots "
+                f"+ v.views_with_robots "
+                f"FROM (VALUES {values}) AS v(id, views, views_with_robots) "
+                f"WHERE {table}.id = v.id",
+                [
+                    value
+                    for page_url_id in sorted(counts)
+                    for value in (page_url_id, *counts[page_url_id])
+                ],
+            )
+
+    def update_totals(self, domain_id) -> None:
+        """
+        Recompute the all time and period totals of the urls of the domain from
+        the url rollup and the archived page views.
+        """
+        from analytics.models import Domain, PageUrlPeriodTotal, PageViewUrlRollup
+
+        rollups = (
+            PageViewUrlRollup.objects.filter(page_url=models.OuterRef("pk"))
+            .values("page_url")
+            .annotate(total=Sum("page_views"))
+            .values("total")
+        )
+        self.filter(domain_id=domain_id).update(
+            total_views=Coalesce(models.Subquery(rollups.filter(is_robot=False)), 0),
+            total_views_with_robots=Coalesce(models.Subquery(rollups), 0),
+        )
+
+        archived_until = Domain.objects.get_archived_until(domain_id)
+        if archived_until:
+            archived = archives.count_page_views(
+                domain_id, archived_until, ["page_url", "is_robot"], with_robots=True
+            )
+            counts = defaultdict(lambda: [0, 0])
+            for (page_url_id, is_robot), page_views in archived.items():
+                if not is_robot:
+                    counts[page_url_id][0] += page_views
+                counts[page_url_id][1] += page_views
+            self.add_totals(counts)
+
+        domains = Domain.objects.filter(pk=domain_id, period_totals_day__isnull=False)
+        if domains.exists():
+            PageUrlPeriodTotal.objects.rebuild(domain_id)
+
+
+class PeriodTotalManager(models.Manager):
+    """
+    Manager of the totals of the urls over the periods of the dashboard, for
+    the urls with the most page views of a period.
+
+    The totals of a period count the page views from Domain.period_totals_day
+    minus the days of the period on. Page views are added at ingest and
+    move_forward subtracts the days that left the periods once a day.
+    """
+
+    period_days = [
+        transform_period_string_to_timedelta(period).days for period in PERIODS
+    ]
+
+    def add_page_views(self, page_views: Iterable) -> None:
+        """
+        Add newly created page views to the totals of the periods they are in.
+        Domains whose period totals were never computed are skipped.
+        """
+        counts = defaultdict(lambda: [0, 0])
+        for page_view in page_views:
+            if page_view.page_url_id is None:
+                continue
+            key = (page_view.page_url_id, timezone.localdate(page_view.timestamp))
+            if not page_view.is_robot:
+                counts[key][0] += 1
+            counts[key][1] += 1
+        self.add_totals(counts)
+
+    def add_totals(self, counts: Dict[tuple, list]) -> None:
+        """
+        Add [views, views with robots] per (page url id, day) to the totals of
+        the periods the days are in.
+        """
+        if not counts:
+            return
+
+        from analytics.models import Domain, PageUrl
+
+        quote_name = connections[self.db].ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        page_url_table = quote_name(PageUrl._meta.db_table)
+        domain_table = quote_name(Domain._meta.db_table)
+        values = ", ".join(["(%s, %s::date, %s, %s)"] * len(counts))
+        periods = ", ".join(["(%s)"] * len(self.period_days))
+        with connections[self.db].cursor() as cursor:
+            # Rows are inserted in key order to avoid deadlocks between
+            # transactions
+            cursor.execute(
+                f"INSERT INTO {table} (domain_id, page_url_id, days, url, "
+                f"total_views, total_views_with_robots) "
+                f"SELECT u.domain_id, u.id, p.days, u.url, SUM(v.views), "
+                f"SUM(v.views_with_robots) "
+                f"FROM (VALUES {values}) AS v(id, day, views, views_with_robots) "
+                f"JOIN {page_url_table} u ON u.id = v.id "
+                f"JOIN {domain_table} d ON d.id = u.domain_id "
+                f"CROSS JOIN (VALUES {periods}) AS p(days) "
+                f"WHERE v.day >= d.period_totals_day - p.days "
+                f"GROUP BY u.domain_id, u.id, p.days, u.url "
+                f"ORDER BY u.id, p.days "
+                f"ON CONFLICT (page_url_id, days) DO UPDATE "
+                f"SET total_views = {table}.total_views + EXCLUDED.total_views, "
+                f"total_views_with_robots = {table}.total_views_with_robots "
+                f"+ EXCLUDED.total_views_with_robots",
+                [value for key in sorted(counts) for value in (*key, *counts[key])]
+                + self.period_days,
+            )
+
+    def subtract_totals(self, counts: Dict[tuple, list]) -> None:
+        """
+        Subtract [views, views with robots] per (page url id, day) from the
+        totals of the periods the days are in.
+        """
+        if not counts:
+            return
+
+        from analytics.models import Domain, PageUrl
+
+        quote_name = connections[self.db].ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        page_url_table = quote_name(PageUrl._meta.db_table)
+        domain_table = quote_name(Domain._meta.db_table)
+        values = ", ".join(["(%s, %s::date, %s, %s)"] * len(counts))
+        periods = ", ".join(["(%s)"] * len(self.period_days))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET total_views = {table}.total_views - s.views, "
+                f"total_views_with_robots = {table}.total_views_with_robots "
+                f"- s.views_with_robots "
+                f"FROM (SELECT u.id, p.days, SUM(v.views) AS views, "
+                f"SUM(v.views_with_robots) AS views_with_robots "
+                f"FROM (VALUES {values}) AS v(id, day, views, views_with_robots) "
+                f"JOIN {page_url_table} u ON u.id = v.id "
+                f"JOIN {domain_table} d ON d.id = u.domain_id "
+                f"CROSS JOIN (VALUES {periods}) AS p(days) "
+                f"WHERE v.day >= d.period_totals_day - p.days "
+                f"GROUP BY u.id, p.days) AS s "
+                f"WHERE {table}.page_url_id = s.id AND {table}.days = s.days",
+                [value for key in sorted(counts) for value in (*key, *counts[key])]
+                + self.period_days,
+            )
+
+    @staticmethod
+    def count_page_views(
+        domain_id, start_day: date, end_day: Optional[date] = None
+    ) -> Dict[int, list]:
+        """
+        Return [views, views with robots] per page url id of the domain between
+        start_day (inclusive) and end_day (exclusive), from the url rollup and
+        the archived page views.
+        """
+        from analytics.models import Domain, PageViewUrlRollup
+
+        rollups = PageViewUrlRollup.objects.filter(
+            domain_id=domain_id, day__gte=start_day
+        )
+        if end_day:
+            rollups = rollups.filter(day__lt=end_day)
+        rows = (
+            rollups.values_list("page_url", "is_robot")
+            .annotate(Sum("page_views"))
+            .order_by()
+        )
+        archived_until = Domain.objects.get_archived_until(domain_id)
+        if archived_until and start_day < archived_until:
+            archived = archives.count_page_views(
+                domain_id,
+                archived_until,
+                ["page_url", "is_robot"],
+                start_day=start_day,
+                end_day=end_day,
+                with_robots=True,
+            )
+            rows = [
+                *rows,
+                *((*key, page_views) for key, page_views in archived.items()),
+            ]
+
+        counts = defaultdict(lambda: [0, 0])
+        for page_url_id, is_robot, page_views in rows:
+            if not is_robot:
+                counts[page_url_id][0] += page_views
+            counts[page_url_id][1] += page_views
+        return counts
+
+    def rebuild(self, domain_id, day: Optional[date] = None) -> None:
+        """
+        Recompute the totals of the domain for the periods ending on the day
+        (today by default).
+        """
+        from analytics.models import Domain, PageUrl
+
+        day = day or timezone.localdate()
+        with transaction.atomic(using=self.db):
+            # Locks the domain against move_forward
+            Domain.objects.filter(pk=domain_id).update(period_totals_day=day)
+            self.filter(domain_id=domain_id).delete()
+            urls = dict(
+                PageUrl.objects.filter(domain_id=domain_id).values_list("pk", "url")
+            )
+            for period_days in self.period_days:
+                counts = self.count_page_views(
+                    domain_id, day - timedelta(days=period_days)
+                )
+                self.bulk_create(
+                    (
+                        self.model(
+                            domain_id=domain_id,
+                            page_url_id=page_url_id,
+                            days=period_days,
+                            url=urls[page_url_id],
+                            total_views=views,
+                            total_views_with_robots=views_with_robots,
+                        )
+                        for page_url_id, (views, views_with_robots) in counts.items()
+                        # Archives keep the ids of deleted urls
+                        if page_url_id in urls
+                    ),
+                    batch_size=1000,
+                )
+            Domain.objects.bump_data_generation([domain_id], force=True)
+
+    def move_forward(self, domain_id, day: Optional[date] = None) -> None:
+        """
+        Move the periods of the totals of the domain forward to end on the day
+        (today by default) by subtracting the page views of the days that left
+        them. Totals that were never computed are rebuilt.
+        """
+        from analytics.models import Domain
+
+        day = day or timezone.localdate()
+        with transaction.atomic(using=self.db):
+            totals_day = (
+                Domain.objects.select_for_update()
+                .filter(pk=domain_id)
+                .values_list("period_totals_day", flat=True)
+                .get()
+            )
+            if totals_day == day:
+                return
+            if totals_day is None or totals_day > day:
+                self.rebuild(domain_id, day)
+                return
+
+            table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+            with connections[self.db].cursor() as cursor:
+                for period_days in self.period_days:
+                    counts = self.count_page_views(
+                        domain_id,
+                        totals_day - timedelta(days=period_days),
+                        day - timedelta(days=period_days),
+                    )
+                    if not counts:
+                        continue
+                    values = ", ".join(["(%s, %s, %s)"] * len(counts))
+                    cursor.execute(
+                        f"UPDATE {table} SET total_views = {table}.total_views - "
+                        f"v.views, total_views_with_robots = "
+                        f"{table}.total_views_with_robots - v.views_with_robots "
+                        f"FROM (VALUES {values}) AS v(id, views, views_with_robots) "
+                        f"WHERE {table}.page_url_id = v.id AND {table}.days = %s",
+                        [
+                            value
+                            for page_url_id in sorted(counts)
+                            for value in (page_url_id, *counts[page_url_id])
+                        ]
+                        + [period_days],
+                    )
+            self.filter(domain_id=domain_id, total_views_with_robots=0).delete()
+            Domain.objects.filter(pk=domain_id).update(period_totals_day=day)
+            Domain.objects.bump_data_generation([domain_id], force=True)
+
+
+class RollupManager(models.Manager):
+    """
+    Manager of pre-aggregated page view counters.
+
+    A counter row is identified by its key_fields, which are either "day" or
+    fields with the same name on PageView.
+    """
+
+    def __init__(self, key_fields: Tuple[str, ...]):
+        super().__init__()
+        self.key_fields = key_fields
+
+    def get_key(self, page_view) -> Optional[tuple]:
+        key = []
+        for name in self.key_fields:
+            if name == "day":
+                key.append(timezone.localdate(page_view.timestamp))
+            else:
+                key.append(getattr(page_view, page_view._meta.get_field(name).attname))
+        if None in key:
+            return None
+        return tuple(key)
+
+    def add_page_views(self, page_views: Iterable) -> None:
+        keys = (self.get_key(page_view) for page_view in page_views)
+        self.increment(Counter(key for key in keys if key is not None))
+
+    def reclassify_page_views(self, page_views: Iterable) -> None:
+        """
+        Move page views whose is_robot was changed from the counters of their
+        previous classification to the ones of the current. Counter rows without
+        page views left are deleted.
+        """
+        robot_index = self.key_fields.index("is_robot")
+        counts = Counter()
+        for page_view in page_views:
+            key = self.get_key(page_view)
+            if key is None:
+                continue
+            counts[key] += 1
+            previous_key = list(key)
+            previous_key[robot_index] = not page_view.is_robot
+            counts[tuple(previous_key)] -= 1
+        self.increment({key: count for key, count in counts.items() if count > 0})
+        self.decrement({key: -count for key, count in counts.items() if count < 0})
+
+    def get_page_views(self, domain_id) -> models.QuerySet:
+        """
+        Return the page views of the domain that are counted by the rollup, i.e.
+        the ones without an empty key field (like page views whose dimensions
+        were not migrated yet) that are not pending, merge_pending adds those.
+        """
+        from analytics.models import PageView, PendingPageView
+
+        filters = {
+            f"{name}__isnull": False for name in self.key_fields if name != "day"
+        }
+        pending = PendingPageView.objects.filter(page_view_id=models.OuterRef("pk"))
+        return PageView.objects.filter(domain_id=domain_id, **filters).exclude(
+            models.Exists(pending)
+        )
+
+    def increment(self, counts: Dict[tuple, int], batch_size: int = 1000) -> None:
+        """
+        Add the counts to the counter rows with the given keys, missing rows are
+        created. Rows are locked in key order to avoid deadlocks between
+        concurrent transactions.
+        """
+        if not counts:
+            return
+
+        quote_name = connections[self.db].ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        columns = ", ".join(
+            quote_name(self.model._meta.get_field(name).column)
+            for name in self.key_fields
+        )
+        keys = sorted(counts, key=lambda key: tuple(str(value) for value in key))
+        row_placeholder = f"({', '.join(['%s'] * (len(self.key_fields) + 1))})"
+        with connections[self.db].cursor() as cursor:
+            for start in range(0, len(keys), batch_size):
+                batch = keys[start : start + batch_size]
+                values = ", ".join([row_placeholder] * len(batch))
+                cursor.execute(
+                    f"INSERT INTO {table} ({columns}, page_views) VALUES {values} "
+                    f"ON CONFLICT ({columns}) DO UPDATE "
+                    f"SET page_views = {table}.page_views + EXCLUDED.page_views",
+                    [value for key in batch for value in (*key, counts[key])],
+                )
+
+    def decrement(self, counts: Dict[tuple, int]) -> None:
+        """
+        Subtract the counts from the existing counter rows with the given keys,
+        rows without page views left are deleted. Rows are locked in key order
+        like by increment.
+        """
+        if not counts:
+            return
+
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        fields = [self.model._meta.get_field(name) for name in self.key_fields]
+        columns = [quote_name(field.column) for field in fields]
+        casts = ", ".join(f"%s::{field.db_type(connection)}" for field in fields)
+        values = ", ".join([f"({casts}, %s, %s)"] * len(counts))
+        keys = sorted(counts, key=lambda key: tuple(str(value) for value in key))
+        params = [
+            value
+            for position, key in enumerate(keys)
+            for value in (*key, counts[key], position)
+        ]
+        names = ", ".join([*columns, "page_views", "position"])
+        counted = f"(VALUES {values}) AS v({names})"
+        conditions = " AND ".join(
+            f"{table}.{column} = v.{column}" for column in columns
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {table}.id FROM {table} JOIN {counted} ON {conditions} "
+                f"ORDER BY v.position FOR UPDATE OF {table}",
+                params,
+            )
+            cursor.execute(
+                f"UPDATE {table} SET page_views = {table}.page_views - v.page_views "
+                f"FROM {counted} WHERE {conditions}",
+                params,
+            )
+            cursor.execute(
+                f"DELETE FROM {table} USING {counted} "
+                f"WHERE {conditions} AND {table}.page_views = 0",
+                params,
+            )
+
+    def rebuild(self, domain_id, start_day: date, end_day: date) -> None:
+        """
+        Recompute the counters of the domain between start_day and end_day
+        (inclusive) from the page views. Archived and downsampled days have no
+        page views and are skipped.
+        """
+        from analytics.models import Domain
+
+        raw_data_start = Domain.objects.get_raw_data_start(domain_id)
+        if raw_data_start:
+            start_day = max(start_day, raw_data_start)
+            if start_day > end_day:
+                return
+        start = timezone.make_aware(datetime.combine(start_day, time.min))
+        end = timezone.make_aware(
+            datetime.combine(end_day + timedelta(days=1), time.min)
+        )
+        key_attnames = [
+            name if name == "day" else self.model._meta.get_field(name).attname
+            for name in self.key_fields
+        ]
+        rows = (
+            self.get_page_views(domain_id)
+            .filter(timestamp__gte=start, timestamp__lt=end)
+            .annotate(day=TruncDate("timestamp"))
+            .values(*key_attnames)
+            .annotate(page_views=Count("pk"))
+            .order_by()
+        )
+        with transaction.atomic(using=self.db):
+            self.filter(domain_id=domain_id, day__range=(start_day, end_day)).delete()
+            self.bulk_create((self.model(**row) for row in rows), batch_size=1000)
+            Domain.objects.bump_data_generation([domain_id], force=True)
+
+    def rebuild_days(self, domain_id, days: Iterable[date]) -> None:
+        """
+        Recompute the counters of the domain on the given days, consecutive days
+        are rebuilt together.
+        """
+        for start_day, end_day in get_day_ranges(days):
+            self.rebuild(domain_id, start_day, end_day)
+
+    def get_daily_totals(
+        self,
+        domain_id,
+        start_day: Optional[date] = None,
+        end_day: Optional[date] = None,
+    ) -> Dict[tuple, int]:
+        """
+        Return the amount of page views per (day, is_robot) of the domain
+        between start_day and end_day (inclusive).
+        """
+        rollups = self.filter(domain_id=domain_id)
+        if start_day:
+            rollups = rollups.filter(day__gte=start_day)
+        if end_day:
+            rollups = rollups.filter(day__lte=end_day)
+        rows = (
+            rollups.values_list("day", "is_robot")
+            .annotate(Sum("page_views"))
+            .order_by()
+        )
+        return {(day, is_robot): page_views for day, is_robot, page_views in rows}
+
+    def get_expected_daily_totals(
+        self,
+        domain_id,
+        start_day: Optional[date] = None,
+        end_day: Optional[date] = None,
+    ) -> Dict[tuple, int]:
+        """
+        Return the amount of page views per (day, is_robot) between start_day
+        and end_day (inclusive) the rollup should contain according to the page
+        views.
+        """
+        page_views = self.get_page_views(domain_id)
+        if start_day:
+            start = timezone.make_aware(datetime.combine(start_day, time.min))
+            page_views = page_views.filter(timestamp__gte=start)
+        if end_day:
+            end = timezone.make_aware(
+                datetime.combine(end_day + timedelta(days=1), time.min)
+            )
+            page_views = page_views.filter(timestamp__lt=end)
+        rows = (
+            page_views.annotate(day=TruncDate("timestamp"))
+            .values_list("day", "is_robot")
+            .annotate(Count("pk"))
+            .order_by()
+        )
+        return {(day, is_robot): page_views for day, is_robot, page_views in rows}
+
+    def get_differing_days(
+        self, domain_id, end_day: Optional[date] = None
+    ) -> List[date]:
+        """
+        Return the days until end_day (inclusive) whose counters differ from
+        the page views. Archived and downsampled days are not compared, their
+        page views were deleted.
+        """
+        from analytics.models import Domain
+
+        start_day = Domain.objects.get_raw_data_start(domain_id)
+        expected_totals = self.get_expected_daily_totals(domain_id, start_day, end_day)
+        totals = self.get_daily_totals(domain_id, start_day, end_day)
+        return sorted(
+            {
+                day
+                for day, is_robot in expected_totals.keys() | totals.keys()
+                if expected_totals.get((day, is_robot)) != totals.get((day, is_robot))
+            }
+        )
+
+
+class UrlRollupManager(RollupManager):
+    def rebuild(
+        self, domain_id, start_day: date, end_day: date, update_totals: bool = True
+    ) -> None:
+        """
+        Recompute the counters like RollupManager.rebuild and, unless
+        update_totals is false, the all time totals of the urls of the domain,
+        which are recomputed from all of its rollups.
+        """
+        from analytics.models import PageUrl
+
+        with transaction.atomic(using=self.db):
+            super().rebuild(domain_id, start_day, end_day)
+            if update_totals:
+                PageUrl.objects.update_totals(domain_id)
+
+    def rebuild_days(self, domain_id, days: Iterable[date]) -> None:
+        from analytics.models import PageUrl
+
+        with transaction.atomic(using=self.db):
+            for start_day, end_day in get_day_ranges(days):
+                self.rebuild(domain_id, start_day, end_day, update_totals=False)
+            PageUrl.objects.update_totals(domain_id)
+
+
+class DimensionRollupManager(RollupManager):
+    def rebuild(self, domain_id, start_day: date, end_day: date) -> None:
+        from analytics.models import PageViewMonthlyTotal
+
+        with transaction.atomic(using=self.db):
+            super().rebuild(domain_id, start_day, end_day)
+            PageViewMonthlyTotal.objects.unfreeze(domain_id, start_day)
+
+    def get_breakdowns(
+        self,
+        domain_id,
+        dimensions: List[str],
+        start_day: Optional[date] = None,
+        with_robots: bool = False,
+    ) -> Tuple[int, Dict[str, List[Tuple[str, int]]]]:
+        """
+        Return the total amount of page views of the domain and the amount per
+        value name of each of the dimensions, ordered by amount.
+
+        All breakdowns come from a single scan over the rollups grouped by
+        GROUPING SETS, so labels and counts always belong to the same rows.
+        """
+        quote_name = connections[self.db].ops.quote_name
+        opts = self.model._meta
+        joins = []
+        names = []
+        for index, dimension in enumerate(dimensions):
+            field = opts.get_field(dimension)
+            alias = f"d{index}"
+            joins.append(
+                f"JOIN {quote_name(field.related_model._meta.db_table)} {alias} "
+                f"ON {alias}.id = r.{quote_name(field.column)}"
+            )
+            names.append(f"{alias}.name")
+
+        where = ["r.domain_id = %s"]
+        params = [domain_id]
+        if not with_robots:
+            where.append("NOT r.is_robot")
+        if start_day:
+            where.append("r.day >= %s")
+            params.append(start_day)
+
+        groupings = ", ".join(f"GROUPING({name})" for name in names)
+        grouping_sets = ", ".join(f"({name})" for name in names)
+        sql = (
+            f"SELECT {', '.join(names)}, {groupings}, SUM(r.page_views) "
+            f"FROM {quote_name(opts.db_table)} r {' '.join(joins)} "
+            f"WHERE {' AND '.join(where)} "
+            f"GROUP BY GROUPING SETS ({grouping_sets}, ()) "
+            f"ORDER BY SUM(r.page_views) DESC, {', '.join(names)}"
+        )
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        total = 0
+        breakdowns = {dimension: [] for dimension in dimensions}
+        amount_dimensions = len(dimensions)
+        for row in rows:
+            values = row[:amount_dimensions]
+            grouped = row[amount_dimensions : 2 * amount_dimensions]
+            page_views = row[-1] or 0
+            if all(grouped):
+                total = page_views
+                continue
+            index = grouped.index(0)
+            breakdowns[dimensions[index]].append((values[index], page_views))
+        return total, breakdowns
+
+
+# Months are frozen once they ended this long ago, so that page views written
+# by transactions still running at the end of the month are counted
+MONTH_FREEZE_DELAY = timedelta(hours=1)
+
+
+class MonthlyTotalManager(models.Manager):
+    """
+    Manager of the page view totals of closed months, which never change and
+    are stored once by freeze so that monthly series only aggregate the rollups
+    of the months that are not stored yet.
+
+    Domain.monthly_totals_until is the first month of the domain whose total
+    is not stored.
+    """
+
+    @staticmethod
+    def get_closed_until() -> date:
+        return timezone.localdate(timezone.now() - MONTH_FREEZE_DELAY).replace(day=1)
+
+    def freeze(self, domain_ids: Optional[Iterable] = None) -> date:
+        """
+        Store the totals of the closed months of the domains (all by default)
+        which are not stored yet and return the first month that is not closed.
+        """
+        from analytics.models import Domain, PageViewDimensionRollup
+
+        closed_until = self.get_closed_until()
+        domains = Domain.objects.all()
+        if domain_ids is not None:
+            domains = domains.filter(pk__in=domain_ids)
+        domains = domains.exclude(monthly_totals_until=closed_until)
+        if not domains.exists():
+            return closed_until
+
+        with transaction.atomic(using=self.db):
+            stale_domains = list(
+                domains.select_for_update()
+                .order_by("pk")
+                .values_list("pk", "monthly_totals_until")
+            )
+            domain_ids_by_until = defaultdict(list)
+            for domain_id, until in stale_domains:
+                domain_ids_by_until[until].append(domain_id)
+            for until, until_domain_ids in domain_ids_by_until.items():
+                rollups = PageViewDimensionRollup.objects.filter(
+                    domain_id__in=until_domain_ids, day__lt=closed_until
+                )
+                if until:
+                    rollups = rollups.filter(day__gte=until)
+                rows = (
+                    rollups.annotate(month=TruncMonth("day"))
+                    .values("domain_id", "month", "is_robot")
+                    .annotate(page_views=Sum("page_views"))
+                    .order_by()
+                )
+                self.bulk_create((self.model(**row) for row in rows), batch_size=1000)
+            Domain.objects.filter(
+                pk__in=[domain_id for domain_id, _ in stale_domains]
+            ).update(monthly_totals_until=closed_until)
+        return closed_until
+
+    def unfreeze(self, domain_id, day: Optional[date] = None) -> None:
+        """
+        Delete the stored totals of the domain from the month of the day on (all
+        without a day), e.g. after the rollups of the day were rebuilt. They are
+        stored again by the next freeze. The totals of archived months are kept.
+        """
+        from analytics.models import Domain
+
+        month = day.replace(day=1) if day else None
+        # The totals of archived months can not be recomputed from the rollups
+        archived_until = Domain.objects.get_archived_until(domain_id)
+        if archived_until and (month is None or month < archived_until):
+            month = archived_until
+        with transaction.atomic(using=self.db):
+            domains = Domain.objects.filter(pk=domain_id)
+            totals = self.filter(domain_id=domain_id)
+            if month:
+                domains = domains.filter(monthly_totals_until__gt=month)
+                totals = totals.filter(month__gte=month)
+            domains.update(monthly_totals_until=month)
+            totals.delete()
+
+    def get_monthly_page_views(
+        self, domain_ids: Optional[Iterable] = None, start_day: Optional[date] = None
+    ) -> Counter:
+        """
+        Return the amount of page views per (domain id, month, is_robot) since
+        the start_day, taken from the stored totals of the frozen months and the
+        rollups of the other days.
+
+        Reads never freeze months, see freeze_monthly_totals. Months from the
+        Domain.monthly_totals_until of a domain on are read from the rollups,
+        so the stored totals and the rollups always come from the same
+        (replica) snapshot.
+        """
+        from analytics.models import PageViewDimensionRollup
+
+        totals = self.all()
+        rollups = PageViewDimensionRollup.objects.all()
+        if domain_ids is not None:
+            totals = totals.filter(domain_id__in=domain_ids)
+            rollups = rollups.filter(domain_id__in=domain_ids)
+
+        not_frozen = Q(domain__monthly_totals_until__isnull=True) | Q(
+            day__gte=F("domain__monthly_totals_until")
+        )
+        if start_day is None:
+            rollups = rollups.filter(not_frozen)
+        else:
+            # The month of a start_day in the middle of a month is partial
+            frozen_from = start_day
+            if start_day.day != 1:
+                frozen_from = (start_day.replace(day=1) + timedelta(days=31)).replace(
+                    day=1
+                )
+            totals = totals.filter(month__gte=frozen_from)
+            rollups = rollups.filter(
+                Q(day__lt=frozen_from) | not_frozen, day__gte=start_day
+            )
+
+        monthly_page_views = Counter()
+        rows = totals.values_list("domain_id", "month", "is_robot").annotate(
+            Sum("page_views")
+        )
+        rollup_rows = (
+            rollups.annotate(month=TruncMonth("day"))
+            .values_list("domain_id", "month", "is_robot")
+            .annotate(Sum("page_views"))
+        )
+        for queryset in [rows, rollup_rows]:
+            for domain_id, month, is_robot, page_views in queryset.order_by():
+                monthly_page_views[(domain_id, month, is_robot)] += page_views
+        return monthly_page_views
+
+
+class VisitorSketchManager(models.Manager):
+    """
+    Manager of the HyperLogLog sketches of the visitors per domain and day and
+    per url and day. Page views of robots are not counted as visitors.
+
+    Tracking inserts the visitors as PendingVisitor rows, which merge_pending
+    merges into the sketches periodically, so that tracking never locks or
+    rewrites a sketch. Reads add up the sketches and the pending visitors.
+    """
+
+    @staticmethod
+    def get_visitor(ip: str, browser_id, os_id, device_id) -> str:
+        if not settings.VISITOR_SKETCH_USER_AGENT:
+            return ip
+        ids = [str(value or "") for value in (browser_id, os_id, device_id)]
+        return "|".join([ip, *ids])
+
+    def get_visitor_hash(self, ip: str, browser_id, os_id, device_id) -> int:
+        return get_item_hash(
+            self.get_visitor(ip, browser_id, os_id, device_id), signed=True
+        )
+
+    @staticmethod
+    def add_visitor(
+        visitors: Dict[tuple, set], domain_id, day: date, page_url_id, visitor_hash
+    ) -> None:
+        visitors[(domain_id, day, None)].add(visitor_hash)
+        if page_url_id is not None:
+            visitors[(domain_id, day, page_url_id)].add(visitor_hash)
+
+    def add_page_views(self, page_views: Iterable) -> None:
+        """
+        Insert the visitors of newly created page views as pending visitors.
+        """
+        from analytics.models import PendingVisitor
+
+        visitors = {
+            (
+                page_view.domain_id,
+                timezone.localdate(page_view.timestamp),
+                page_view.page_url_id,
+                self.get_visitor_hash(
+                    page_view.ip,
+                    page_view.browser_id,
+                    page_view.os_id,
+                    page_view.device_id,
+                ),
+            )
+            for page_view in page_views
+            if not page_view.is_robot
+        }
+        PendingVisitor.objects.bulk_create(
+            PendingVisitor(
+                domain_id=domain_id,
+                day=day,
+                page_url_id=page_url_id,
+                visitor_hash=visitor_hash,
+            )
+            for domain_id, day, page_url_id, visitor_hash in visitors
+        )
+
+    def add_visitors(self, visitors: Dict[tuple, set]) -> None:
+        """
+        Add the visitor hashes to the sketches with the (domain_id, day,
+        page_url_id) keys, missing sketches are created. Sketches are locked in
+        key order to avoid deadlocks between concurrent transactions.
+        """
+        if not visitors:
+            return
+
+        keys = sorted(visitors, key=lambda key: tuple(str(value) for value in key))
+        # The sketches have to stay locked until they are updated
+        with transaction.atomic(using=self.db, savepoint=False):
+            quote_name = connections[self.db].ops.quote_name
+            table = quote_name(self.model._meta.db_table)
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} (domain_id, day, page_url_id, registers) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(keys))} "
+                    f"ON CONFLICT DO NOTHING",
+                    [
+                        value
+                        for domain_id, day, page_url_id in keys
+                        for value in (
+                            domain_id,
+                            day,
+                            page_url_id,
+                            HyperLogLog(self.get_precision(page_url_id)).to_bytes(),
+                        )
+                    ],
+                )
+
+            key_filter = Q()
+            for domain_id, day, page_url_id in keys:
+                key_filter |= Q(domain_id=domain_id, day=day, page_url_id=page_url_id)
+            sketches = list(
+                self.select_for_update()
+                .filter(key_filter)
+                .order_by("domain_id", "day", "page_url_id")
+            )
+            for sketch in sketches:
+                hll = HyperLogLog(
+                    self.get_precision(sketch.page_url_id), bytes(sketch.registers)
+                )
+                hll.update_hashes(
+                    visitors[(sketch.domain_id, sketch.day, sketch.page_url_id)]
+                )
+                sketch.registers = hll.to_bytes()
+            self.bulk_update(sketches, ["registers"])
+
+    def merge_pending(self, batch_size: int = 10000) -> int:
+        """
+        Merge the pending visitors into the sketches and delete them, in
+        batches of their own transaction. Return the amount of merged visitors.
+        Concurrent merges skip the visitors locked by each other.
+        """
+        from analytics.models import PendingVisitor
+
+        amount = 0
+        while True:
+            with transaction.atomic(using=self.db):
+                rows = list(
+                    PendingVisitor.objects.select_for_update(skip_locked=True)
+                    .order_by("pk")
+                    .values_list(
+                        "pk", "domain_id", "day", "page_url_id", "visitor_hash"
+                    )[:batch_size]
+                )
+                if not rows:
+                    return amount
+                visitors = defaultdict(set)
+                for _, domain_id, day, page_url_id, visitor_hash in rows:
+                    self.add_visitor(
+                        visitors, domain_id, day, page_url_id, visitor_hash
+                    )
+                self.add_visitors(visitors)
+                PendingVisitor.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            amount += len(rows)
+
+    @staticmethod
+    def get_precision(page_url_id) -> int:
+        return URL_PRECISION if page_url_id is not None else DOMAIN_PRECISION
+
+    def rebuild(self, domain_id, start_day: date, end_day: date) -> None:
+        """
+        Recompute the sketches of the domain between start_day and end_day
+        (inclusive) from the page views, one day at a time. The sketches of
+        archived and downsampled days are kept.
+        """
+        from analytics.models import Domain, PageView
+
+        raw_data_start = Domain.objects.get_raw_data_start(domain_id)
+        if raw_data_start:
+            start_day = max(start_day, raw_data_start)
+        day = start_day
+        while day <= end_day:
+            start = timezone.make_aware(datetime.combine(day, time.min))
+            end = timezone.make_aware(
+                datetime.combine(day + timedelta(days=1), time.min)
+            )
+            rows = PageView.objects.filter(
+                domain_id=domain_id,
+                is_robot=False,
+                timestamp__gte=start,
+                timestamp__lt=end,
+            ).values_list("ip", "browser_id", "os_id", "device_id", "page_url_id")
+            visitors = defaultdict(set)
+            for ip, browser_id, os_id, device_id, page_url_id in rows.iterator():
+                self.add_visitor(
+                    visitors,
+                    domain_id,
+                    day,
+                    page_url_id,
+                    self.get_visitor_hash(ip, browser_id, os_id, device_id),
+                )
+
+            sketches = []
+            for (_, _, page_url_id), visitor_hashes in visitors.items():
+                hll = HyperLogLog(self.get_precision(page_url_id))
+                hll.update_hashes(visitor_hashes)
+                sketches.append(
+                    self.model(
+                        domain_id=domain_id,
+                        day=day,
+                        page_url_id=page_url_id,
+                        registers=hll.to_bytes(),
+                    )
+                )
+            # Pending visitors of the day are merged again, which changes nothing
+            with transaction.atomic(using=self.db):
+                self.filter(domain_id=domain_id, day=day).delete()
+                self.bulk_create(sketches, batch_size=1000)
+            day += timedelta(days=1)
+
+    def get_monthly_visitors(
+        self,
+        domain_id,
+        start_day: Optional[date] = None,
+        page_url_ids: Optional[List[int]] = None,
+    ) -> Tuple[int, Dict[date, int]]:
+        """
+        Return the estimated amount of unique visitors of the domain since
+        start_day and per month, of the given urls only if page_url_ids is set.
+        """
+        from analytics.models import PendingVisitor
+
+        sketches = self.filter(domain_id=domain_id)
+        if page_url_ids is None:
+            sketches = sketches.filter(page_url__isnull=True)
+            precision = DOMAIN_PRECISION
+        else:
+            sketches = sketches.filter(page_url_id__in=page_url_ids)
+            precision = URL_PRECISION
+        if start_day:
+            sketches = sketches.filter(day__gte=start_day)
+        pending = PendingVisitor.objects.filter(domain_id=domain_id)
+        if page_url_ids is not None:
+            pending = pending.filter(page_url_id__in=page_url_ids)
+        if start_day:
+            pending = pending.filter(day__gte=start_day)
+
+        total = HyperLogLog(precision)
+        months = defaultdict(lambda: HyperLogLog(precision))
+        for day, registers in sketches.values_list("day", "registers"):
+            sketch = HyperLogLog(precision, bytes(registers))
+            months[day.replace(day=1)].merge(sketch)
+            total.merge(sketch)
+        for day, visitor_hash in pending.values_list("day", "visitor_hash"):
+            months[day.replace(day=1)].add_hash(visitor_hash)
+            total.add_hash(visitor_hash)
+        return total.count(), {month: months[month].count() for month in sorted(months)}
+
+
 class DomainManager(models.Manager):
+    def bump_data_generation(self, domain_ids: Iterable, force: bool = False) -> None:
+        """
+        Increment the data generation of the domains, which invalidates their
+        cached dashboard results (see analytics.caches.cached_analytics).
+
+        Unless forced, the generation of a domain is bumped at most once per
+        DASHBOARD_CACHE_BUMP_INTERVAL seconds by every process. A skipped bump
+        is caught up by a timer once the interval is over, so cached results and
+        ETags are at most that many seconds stale.
+        """
+        now = monotonic()
+        interval = settings.DASHBOARD_CACHE_BUMP_INTERVAL
+        due_ids = []
+        with _trailing_bumps_lock:
+            for domain_id in set(domain_ids):
+                last_bump = _data_generation_bumps.get(domain_id, -interval)
+                if force or now - last_bump >= interval:
+                    due_ids.append(domain_id)
+                    timer = _trailing_bumps.pop(domain_id, None)
+                    if timer:
+                        timer.cancel()
+                elif domain_id not in _trailing_bumps:
+                    timer = threading.Timer(
+                        last_bump + interval - now,
+                        self._run_trailing_bump,
+                        args=(domain_id,),
+                    )
+                    timer.daemon = True
+                    _trailing_bumps[domain_id] = timer
+                    timer.start()
+            for domain_id in due_ids:
+                _data_generation_bumps[domain_id] = now
+        if not due_ids:
+            return
+        self.filter(pk__in=sorted(due_ids)).update(
+            data_generation=F("data_generation") + 1
+        )
+
+    def _run_trailing_bump(self, domain_id) -> None:
+        with _trailing_bumps_lock:
+            if _trailing_bumps.pop(domain_id, None) is None:
+                # Cancelled by a bump in the meantime
+                return
+        try:
+            self.bump_data_generation([domain_id], force=True)
+        finally:
+            # The timer thread ends, so its connection would never be reused
+            connections.close_all()
+
+    def get_archived_until(self, domain_id) -> Optional[date]:
+        return (
+            self.filter(pk=domain_id).values_list("archived_until", flat=True).first()
+        )
+
+    def get_raw_data_start(self, domain_id) -> Optional[date]:
+        """
+        Return the first day of the domain whose page views are neither archived
+        nor downsampled, None if all page views are kept.
+        """
+        days = (
+            self.filter(pk=domain_id)
+            .values_list("archived_until", "downsampled_until")
+            .first()
+        )
+        days = [day for day in days or () if day]
+        return max(days) if days else None
+
+    @read_from_replica
     def get_monthly_average_page_views(self) -> list:
-        monthly_average_page_views = []
-        for domain in self.model.objects.all().prefetch_related("page_views"):
-            data = {
-                "domain": domain.base_url,
-                "with_robots": domain.get_monthly_average_page_views(with_robots=True),
-                "no_robots": domain.get_monthly_average_page_views(with_robots=False),
+        """
+        Return the average amount of page views per month with and without
+        robots of every domain.
+
+        The page views are summed per domain, month and robot classification by
+        grouped queries over the closed month totals and the rollups of the
+        current month, so neither the amount of queries nor the memory use grow
+        with the amount of domains or page views. The result is cached until the
+        data generation of a domain changes.
+        """
+        from analytics.models import PageViewMonthlyTotal
+
+        domains = list(self.values_list("id", "base_url", "data_generation"))
+        if settings.DASHBOARD_CACHE_ENABLED:
+            generations = sorted(f"{pk}.{generation}" for pk, _, generation in domains)
+            key = "analytics:monthly_average_page_views:" + hashlib.sha1(
+                ",".join(generations).encode()
+            ).hexdigest()
+            monthly_average_page_views = get_dashboard_cache().get(key)
+            if monthly_average_page_views is not None:
+                return monthly_average_page_views
+
+        with_robots = defaultdict(Counter)
+        no_robots = defaultdict(Counter)
+        monthly_page_views = PageViewMonthlyTotal.objects.get_monthly_page_views()
+        for (domain_id, month, is_robot), page_views in monthly_page_views.items():
+            with_robots[domain_id][month] += page_views
+            if not is_robot:
+                no_robots[domain_id][month] += page_views
+
+        def get_average(monthly_page_views: Counter) -> float:
+            if not monthly_page_views:
+                return 0
+            return round(sum(monthly_page_views.values()) / len(monthly_page_views), 2)
+
+        monthly_average_page_views = [
+            {
+                "domain": base_url,
+                "with_robots": get_average(with_robots[domain_id]),
+                "no_robots": get_average(no_robots[domain_id]),
             }
-            monthly_average_page_views.append(data)
+            for domain_id, base_url, _ in domains
+        ]
+        if settings.DASHBOARD_CACHE_ENABLED:
+            get_dashboard_cache().set(key, monthly_average_page_views)
         return monthly_average_page_views
 
 
 class PageViewManager(models.Manager):
-    def get_views_for_url(self, domain_pk: str, url: str, with_robots: bool) -> Dict:
-        if not url.endswith('/'):
-            url += '/'
+    @read_from_replica
+    def get_views_for_url(
+        self,
+        domain_pk: str,
+        url: str,
+        with_robots: bool,
+        include_subpages: bool = False,
+    ) -> Dict:
+        """
+        Return the page views per day of the url, or of all urls starting with
+        it when include_subpages is set (like query string variants).
+        """
+        from analytics.models import Domain, PageUrl, PageViewUrlRollup
+
+        if not url.endswith("/"):
+            url += "/"
+
+        if include_subpages:
+            page_urls = PageUrl.objects.filter(
+                domain__pk=domain_pk, url__startswith=normalize_url(url)
+            )
+        else:
+            page_urls = PageUrl.objects.lookup(domain_pk, url)
+        rollups = PageViewUrlRollup.objects.filter(
+            domain__pk=domain_pk, page_url__in=page_urls
+        )
 
-        page_views = self.model.objects.filter(domain__pk=domain_pk, url__contains=url)
-        
         if not with_robots:
-            page_views = page_views.exclude(
-                metadata__device__in=settings.EXCLUDED_DEVICES
-            ).exclude(metadata__browser__icontains="bot")
+            rollups = rollups.filter(is_robot=False)
 
         qs = (
-            page_views.annotate(day_with_views=TruncDay("timestamp"))
-            .values("day_with_views")
-            .annotate(Count("pk", distinct=True))
-        ).order_by("day_with_views")
-        qs = qs.annotate(
-            day_with_views_iso_format=Func(
-                F("day_with_views"),
-                Value("YYYY-MM-DD"),
-                function="to_char",
-                output_field=models.CharField(),
-            )
-        )
-        days = list(qs.values_list("day_with_views_iso_format", flat=True))
-        data = list(qs.values_list("pk__count", flat=True))
+            rollups.values_list("day")
+            .annotate(Sum("page_views"))
+            .order_by("day")
+        )
+        page_views_per_day = dict(qs)
+        archived_until = Domain.objects.get_archived_until(domain_pk)
+        if archived_until:
+            archived = archives.count_page_views(
+                domain_pk,
+                archived_until,
+                ["day"],
+                with_robots=with_robots,
+                page_url_ids=page_urls.values_list("pk", flat=True),
+            )
+            for (day,), page_views in archived.items():
+                page_views_per_day[day] = page_views_per_day.get(day, 0) + page_views
+
+        days = []
+        data = []
+        for day in sorted(page_views_per_day):
+            days.append(day.isoformat())
+            data.append(page_views_per_day[day])
         return {"data": data, "days": days}
 
-    def create_from_request(self, request: Request):
-        from analytics.models import Domain
+    def rebuild_aggregates(self, domain_id, start_day: date, end_day: date) -> None:
+        """
+        Recompute the rollups of the domain between start_day and end_day from
+        the page views, e.g. after page views were reclassified.
+        """
+        from analytics.models import (
+            PageViewDimensionRollup,
+            PageViewUrlRollup,
+            VisitorSketch,
+        )
+
+        PageViewUrlRollup.objects.rebuild(domain_id, start_day, end_day)
+        PageViewDimensionRollup.objects.rebuild(domain_id, start_day, end_day)
+        VisitorSketch.objects.rebuild(domain_id, start_day, end_day)
+
+    def reclassify_aggregates(self, page_views: List["PageView"]) -> None:
+        """
+        Move page views whose is_robot was changed between the robot and the
+        non robot counts of the aggregates. Has to be called in the transaction
+        that updates them.
+
+        The counters are adjusted by the changed page views only. Visitors can
+        not be removed from a sketch, so the sketches of the days with new
+        robots are rebuilt.
+        """
+        from analytics.models import (
+            Domain,
+            PageUrl,
+            PageUrlPeriodTotal,
+            PageViewDimensionRollup,
+            PageViewMonthlyTotal,
+            PageViewUrlRollup,
+            VisitorSketch,
+        )
 
-        domain_id = request.data.get("domain_id")
+        PageViewUrlRollup.objects.reclassify_page_views(page_views)
+        PageViewDimensionRollup.objects.reclassify_page_views(page_views)
+
+        # [views, views with robots] added to and subtracted from the totals,
+        # the totals with robots do not change
+        url_counts = defaultdict(lambda: [0, 0])
+        period_counts = defaultdict(lambda: [0, 0])
+        removed_period_counts = defaultdict(lambda: [0, 0])
+        first_days = {}
+        robot_days = set()
+        for page_view in page_views:
+            day = timezone.localdate(page_view.timestamp)
+            domain_id = page_view.domain_id
+            first_days[domain_id] = min(day, first_days.get(domain_id, day))
+            if page_view.is_robot:
+                robot_days.add((domain_id, day))
+            if page_view.page_url_id is None:
+                continue
+            if page_view.is_robot:
+                url_counts[page_view.page_url_id][0] -= 1
+                removed_period_counts[(page_view.page_url_id, day)][0] += 1
+            else:
+                url_counts[page_view.page_url_id][0] += 1
+                period_counts[(page_view.page_url_id, day)][0] += 1
+        PageUrl.objects.add_totals(url_counts)
+        PageUrlPeriodTotal.objects.add_totals(period_counts)
+        PageUrlPeriodTotal.objects.subtract_totals(removed_period_counts)
+
+        VisitorSketch.objects.add_page_views(
+            [page_view for page_view in page_views if not page_view.is_robot]
+        )
+        if robot_days:
+            # The pending visitors of the new robots are merged first, so that
+            # the rebuilt sketches replace them
+            VisitorSketch.objects.merge_pending()
+        for domain_id, day in sorted(robot_days):
+            VisitorSketch.objects.rebuild(domain_id, day, day)
+        for domain_id, day in first_days.items():
+            PageViewMonthlyTotal.objects.unfreeze(domain_id, day)
+        Domain.objects.bump_data_generation(first_days, force=True)
+
+    def rebuild_aggregates_of_days(self, domain_id, days: Iterable[date]) -> None:
+        """
+        Recompute the rollups of the domain on the given days like
+        rebuild_aggregates, consecutive days are rebuilt together.
+        """
+        from analytics.models import (
+            PageViewDimensionRollup,
+            PageViewUrlRollup,
+            VisitorSketch,
+        )
+
+        days = set(days)
+        PageViewUrlRollup.objects.rebuild_days(domain_id, days)
+        PageViewDimensionRollup.objects.rebuild_days(domain_id, days)
+        for start_day, end_day in get_day_ranges(days):
+            VisitorSketch.objects.rebuild(domain_id, start_day, end_day)
+
+    def downsample(
+        self, domain_id, until_day: date, batch_size: int = 1000, pause: float = 0.0
+    ) -> int:
+        """
+        Delete the page views of the domain before until_day, only their
+        rollups, visitor sketches and url totals are kept. Return the amount of
+        deleted page views.
+
+        The rollups of the days that differ from the page views are rebuilt
+        first. The page views are then deleted in batches, see
+        delete_in_batches.
+        """
+        from analytics.models import Domain, PageViewDimensionRollup, PageViewUrlRollup
+
+        last_day = until_day - timedelta(days=1)
+        for rollups in [PageViewUrlRollup.objects, PageViewDimensionRollup.objects]:
+            rollups.rebuild_days(
+                domain_id, rollups.get_differing_days(domain_id, end_day=last_day)
+            )
+        # From now on rebuilds and checks skip the days
+        Domain.objects.filter(
+            Q(downsampled_until__isnull=True) | Q(downsampled_until__lt=until_day),
+            pk=domain_id,
+        ).update(downsampled_until=until_day)
+
+        until = timezone.make_aware(datetime.combine(until_day, time.min))
+        return self.delete_in_batches(
+            self.filter(domain_id=domain_id, timestamp__lt=until), batch_size, pause
+        )
+
+    def delete_in_batches(
+        self, page_views: models.QuerySet, batch_size: int = 1000, pause: float = 0.0
+    ) -> int:
+        """
+        Delete the page views in timestamp order in batches of their own
+        transaction, with a pause of that many seconds in between, so that no
+        delete holds its locks long or writes a lot of WAL at once. Return the
+        amount of deleted page views.
+        """
+        amount = 0
+        start = None
+        while True:
+            # Continue after the last batch instead of scanning the index entries
+            # of the deleted page views again
+            batch = page_views
+            if start is not None:
+                batch = batch.filter(timestamp__gte=start)
+            rows = list(
+                batch.order_by("timestamp", "pk").values_list("pk", "timestamp")[
+                    :batch_size
+                ]
+            )
+            if not rows:
+                break
+            start = rows[-1][1]
+            # The timestamp range limits the delete to the partitions of the batch
+            deleted, _ = page_views.filter(
+                pk__in=[pk for pk, _ in rows], timestamp__range=(rows[0][1], start)
+            ).delete()
+            amount += deleted
+            if pause:
+                sleep(pause)
+        return amount
+
+    def update_aggregates(self, page_views: List["PageView"]) -> None:
+        """
+        Add newly created page views to the aggregates. Once they are committed
+        the data generation of their domains is bumped and they are added to
+        the live traffic. Has to be called in the transaction that creates them
+        unless they are created with save(), see analytics.signals.
+
+        With PAGE_VIEW_MERGE_ENABLED the page views are only inserted as pending
+        page views, which merge_pending adds to the counters, so that tracking
+        never waits for the locks of the counter rows.
+        """
+        from analytics.models import Domain, PendingPageView, VisitorSketch
+
+        if settings.PAGE_VIEW_MERGE_ENABLED:
+            PendingPageView.objects.bulk_create(
+                PendingPageView(
+                    page_view_id=page_view.pk,
+                    domain_id=page_view.domain_id,
+                    timestamp=page_view.timestamp,
+                    page_url_id=page_view.page_url_id,
+                    is_robot=page_view.is_robot,
+                    browser_id=page_view.browser_id,
+                    os_id=page_view.os_id,
+                    device_id=page_view.device_id,
+                    country_id=page_view.country_id,
+                )
+                for page_view in page_views
+            )
+        else:
+            self.add_to_counters(page_views)
+        VisitorSketch.objects.add_page_views(page_views)
+        # Bumped after the commit, so that tracking does not lock the domain rows
+        # until then
+        transaction.on_commit(
+            partial(
+                Domain.objects.bump_data_generation,
+                {page_view.domain_id for page_view in page_views},
+            ),
+            using=self.db,
+        )
+        if settings.LIVE_TRAFFIC_ENABLED:
+            transaction.on_commit(
+                partial(get_live_traffic_client().send_page_views, page_views),
+                using=self.db,
+            )
+
+    @staticmethod
+    def add_to_counters(page_views: List["PageView"]) -> None:
+        """
+        Add page views to the url and dimension rollups and the url totals.
+        """
+        from analytics.models import (
+            PageUrl,
+            PageUrlPeriodTotal,
+            PageViewDimensionRollup,
+            PageViewUrlRollup,
+        )
+
+        PageViewUrlRollup.objects.add_page_views(page_views)
+        PageViewDimensionRollup.objects.add_page_views(page_views)
+        PageUrl.objects.add_page_views(page_views)
+        PageUrlPeriodTotal.objects.add_page_views(page_views)
+
+    def merge_pending(self, batch_size: int = 10000) -> int:
+        """
+        Add the pending page views to the counters and delete them, in batches
+        of their own transaction. Return the amount of merged page views.
+        Concurrent merges skip the page views locked by each other.
+        """
+        from analytics.models import Domain, PendingPageView
+
+        amount = 0
+        while True:
+            with transaction.atomic(using=self.db):
+                pending = list(
+                    PendingPageView.objects.select_for_update(skip_locked=True)
+                    .order_by("pk")[:batch_size]
+                )
+                if not pending:
+                    return amount
+                self.add_to_counters(
+                    [
+                        self.model(
+                            domain_id=page_view.domain_id,
+                            timestamp=page_view.timestamp,
+                            page_url_id=page_view.page_url_id,
+                            is_robot=page_view.is_robot,
+                            browser_id=page_view.browser_id,
+                            os_id=page_view.os_id,
+                            device_id=page_view.device_id,
+                            country_id=page_view.country_id,
+                        )
+                        for page_view in pending
+                    ]
+                )
+                PendingPageView.objects.filter(
+                    pk__in=[page_view.pk for page_view in pending]
+                ).delete()
+                transaction.on_commit(
+                    partial(
+                        Domain.objects.bump_data_generation,
+                        {page_view.domain_id for page_view in pending},
+                    ),
+                    using=self.db,
+                )
+            amount += len(pending)
+
+    @staticmethod
+    def get_dimension_ids(metadata: dict) -> dict:
+        """
+        Return the browser, os, device and country ids of the page view metadata.
+        """
+        from analytics.models import DIMENSIONS
+
+        return {
+            f"{dimension}_id": model.objects.get_id(metadata.get(dimension))
+            for dimension, model in DIMENSIONS.items()
+        }
+
+    def build_from_data(
+        self,
+        data: dict,
+        metadata_cache: Optional[dict] = None,
+        page_url_ids: Optional[dict] = None,
+    ) -> "PageView":
+        """
+        Validate the data of a tracked page view and return an unsaved PageView.
+
+        Pass a dict as metadata_cache to share the enrichment (user agent parsing,
+        GeoIP lookup and dimension ids) between page views of the same client and
+        a dict as page_url_ids to share the page url ids of the same url.
+        """
+        from analytics.models import Domain, PageUrl
+
+        if not isinstance(data, dict):
+            raise PageViewCreationError(
+                "PageView could not be created because the data is not an object"
+            )
+
+        domain_id = data.get("domain_id")
         try:
-            domain = Domain.objects.get(id=domain_id)
+            domain = get_domain_registry().get(domain_id)
         except ValidationError:
             raise PageViewCreationError(
                 f"PageView could not be created because the domain_id {domain_id} is not valid."
@@ -75,30 +1600,111 @@ class PageViewManager(models.Manager):
                 f"{domain_id} does not exists."
             )
 
-        try:
-            page_view_url = request.data["url"]
-        except KeyError:
+        page_view_url = data.get("url")
+        if not isinstance(page_view_url, str):
             raise PageViewCreationError(
                 "PageView could not be created because no valid url was passed"
             )
 
-        if domain.base_url not in page_view_url:
+        if not domain.matches(page_view_url):
             raise PageViewCreationError(
                 f"PageView could not be created the request url does not belong to the domain with domain_id {domain_id}"
             )
-        try:
-            request_meta = request.data["request_meta"]
-        except KeyError:
+        request_meta = data.get("request_meta")
+        if not isinstance(request_meta, dict):
             raise PageViewCreationError(
                 "PageView could not be created because no valid request meta was passed"
             )
         if domain_id and page_view_url and request_meta:
-            return self.create(
-                domain=domain,
+            ip = get_client_ip_from_request_meta(request_meta)
+            # Checked before the GeoIP lookup, which would resolve host names
+            try:
+                validate_ipv46_address(str(ip))
+            except ValidationError:
+                raise PageViewCreationError(
+                    f"PageView could not be created because the ip {ip} is not valid"
+                )
+            user_agent = request_meta.get("HTTP_USER_AGENT")
+            if not isinstance(user_agent, str):
+                raise PageViewCreationError(
+                    "PageView could not be created because no valid user agent was passed"
+                )
+            key = (user_agent, ip)
+            if metadata_cache is None or key not in metadata_cache:
+                metadata = get_page_view_metadata_from_request_meta(request_meta)
+                # Only the dimension ids are stored, not the metadata itself
+                enrichment = (
+                    self.get_dimension_ids(metadata),
+                    classify_robot(metadata),
+                )
+                if metadata_cache is not None:
+                    metadata_cache[key] = enrichment
+            else:
+                enrichment = metadata_cache[key]
+            dimension_ids, is_robot = enrichment
+            url_key = (domain.id, page_view_url)
+            if page_url_ids is None or url_key not in page_url_ids:
+                try:
+                    page_url_id = PageUrl.objects.get_id(domain.id, page_view_url)
+                except ValueError:
+                    # Raised by the url normalization for invalid ports or hosts
+                    raise PageViewCreationError(
+                        f"PageView could not be created because the url "
+                        f"{page_view_url} is not valid"
+                    )
+                if page_url_ids is not None:
+                    page_url_ids[url_key] = page_url_id
+            else:
+                page_url_id = page_url_ids[url_key]
+            return self.model(
+                domain_id=domain.id,
                 url=page_view_url,
-                ip=get_client_ip_from_request_meta(request_meta),
-                metadata=get_page_view_metadata_from_request_meta(request_meta),
+                page_url_id=page_url_id,
+                ip=ip,
+                is_robot=is_robot,
+                timestamp=timezone.now(),
+                **dimension_ids,
             )
         raise PageViewCreationError(
             f"PageView could not be created because an required parameter is missing"
         )
+
+    def build_from_request(self, request: Request) -> "PageView":
+        return self.build_from_data(data=request.data)
+
+    def create_from_request(self, request: Request):
+        """
+        Validate and enrich the tracked page view before the transaction, which
+        only inserts it and updates the aggregates. bulk_create skips the save()
+        machinery and its signal, see update_aggregates.
+        """
+        page_view = self.build_from_request(request=request)
+        with transaction.atomic(using=self.db):
+            self.bulk_create([page_view])
+            self.update_aggregates([page_view])
+        return page_view
+
+    def create_batch_from_data(self, items: List[dict]) -> List[dict]:
+        """
+        Validate every tracked page view on its own, insert the valid ones with a
+        single bulk_create and return a result for every item.
+        """
+        page_views = []
+        results = []
+        metadata_cache = {}
+        page_url_ids = {}
+        for item in items:
+            try:
+                page_view = self.build_from_data(
+                    data=item, metadata_cache=metadata_cache, page_url_ids=page_url_ids
+                )
+            except PageViewCreationError as e:
+                results.append({"status": "error", "message": f"Error: {e}"})
+                continue
+            page_views.append(page_view)
+            results.append({"status": "created"})
+
+        with transaction.atomic(using=self.db):
+            self.bulk_create(page_views)
+            self.update_aggregates(page_views)
+        return results
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pageview",
+            name="is_robot",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name="pageview",
+            index=models.Index(
+                fields=["domain", "is_robot", "timestamp"],
+                name="pageview_domain_robot_ts_idx",
+            ),
+        ),
+    ]
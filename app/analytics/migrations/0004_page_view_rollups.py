@@ -0,0 +1,118 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0003_page_view_dimensions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PageViewUrlRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("url", models.URLField()),
+                ("is_robot", models.BooleanField()),
+                ("page_views", models.PositiveIntegerField(default=0)),
+                (
+                    "domain",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="url_rollups",
+                        to="analytics.domain",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PageViewDimensionRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("is_robot", models.BooleanField()),
+                ("page_views", models.PositiveIntegerField(default=0)),
+                (
+                    "browser",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="rollups",
+                        to="analytics.browser",
+                    ),
+                ),
+                (
+                    "country",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="rollups",
+                        to="analytics.country",
+                    ),
+                ),
+                (
+                    "device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="rollups",
+                        to="analytics.device",
+                    ),
+                ),
+                (
+                    "domain",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dimension_rollups",
+                        to="analytics.domain",
+                    ),
+                ),
+                (
+                    "os",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="rollups",
+                        to="analytics.operatingsystem",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="pageviewurlrollup",
+            constraint=models.UniqueConstraint(
+                fields=("domain", "day", "url", "is_robot"),
+                name="pageviewurlrollup_unique_key",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="pageviewdimensionrollup",
+            constraint=models.UniqueConstraint(
+                fields=(
+                    "domain",
+                    "day",
+                    "is_robot",
+                    "browser",
+                    "os",
+                    "device",
+                    "country",
+                ),
+                name="pageviewdimensionrollup_unique_key",
+            ),
+        ),
+    ]
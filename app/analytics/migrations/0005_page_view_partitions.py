@@ -0,0 +1,96 @@
+from datetime import date, datetime, time
+
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = "analytics_pageview"
+OLD_TABLE = "analytics_pageview_old"
+DEFAULT_PARTITION = "analytics_pageview_default"
+PARTITIONS_AHEAD = 3
+
+
+def add_months(month, amount):
+    index = month.year * 12 + month.month - 1 + amount
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_indexes_and_foreign_keys(cursor):
+    cursor.execute(
+        "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+        "WHERE indrelid = %s::regclass AND NOT indisprimary",
+        [TABLE],
+    )
+    indexes = [
+        definition.replace(" ON ONLY ", " ON ") for (definition,) in cursor.fetchall()
+    ]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    return indexes, cursor.fetchall()
+
+
+def recreate_table(cursor, partitioned):
+    """
+    Replace the page view table by a (non) partitioned copy with the same
+    columns, indexes and foreign keys. Indexes and foreign keys are created
+    after copying the rows.
+    """
+    indexes, foreign_keys = get_indexes_and_foreign_keys(cursor)
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}")
+    if partitioned:
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS) "
+            f"PARTITION BY RANGE (timestamp)"
+        )
+        cursor.execute(f"SELECT min(timestamp) FROM {OLD_TABLE}")
+        first_timestamp = cursor.fetchone()[0]
+        current_month = timezone.localdate().replace(day=1)
+        month = current_month
+        if first_timestamp:
+            month = min(month, timezone.localdate(first_timestamp).replace(day=1))
+        while month <= add_months(current_month, PARTITIONS_AHEAD):
+            start = timezone.make_aware(datetime.combine(month, time.min))
+            end = timezone.make_aware(datetime.combine(add_months(month, 1), time.min))
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            month = add_months(month, 1)
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+        primary_key = "id, timestamp"
+    else:
+        cursor.execute(f"CREATE TABLE {TABLE} (LIKE {OLD_TABLE} INCLUDING DEFAULTS)")
+        primary_key = "id"
+
+    cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {OLD_TABLE}")
+    cursor.execute(f"DROP TABLE {OLD_TABLE}")
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({primary_key})"
+    )
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+    cursor.execute(f"ANALYZE {TABLE}")
+
+
+def partition_page_views(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        recreate_table(cursor, partitioned=True)
+
+
+def unpartition_page_views(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        recreate_table(cursor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0004_page_view_rollups"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_page_views, unpartition_page_views),
+    ]
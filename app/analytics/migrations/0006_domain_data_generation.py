@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0005_page_view_partitions"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="domain",
+            name="data_generation",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0006_domain_data_generation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="domain",
+            name="monthly_totals_until",
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name="PageViewMonthlyTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("is_robot", models.BooleanField()),
+                ("page_views", models.PositiveBigIntegerField()),
+                (
+                    "domain",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="monthly_totals",
+                        to="analytics.domain",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="pageviewmonthlytotal",
+            constraint=models.UniqueConstraint(
+                fields=("domain", "month", "is_robot"),
+                name="pageviewmonthlytotal_unique_key",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0007_page_view_monthly_totals"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pageview",
+            index=models.Index(
+                fields=["domain", "timestamp"], name="pageview_domain_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageview",
+            index=models.Index(
+                fields=["domain", "url", "timestamp"], name="pageview_domain_url_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageview",
+            index=models.Index(
+                condition=models.Q(("browser__isnull", True)),
+                fields=["id"],
+                name="pageview_no_dimensions_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageviewdimensionrollup",
+            index=models.Index(fields=["day"], name="pageviewdimrollup_day_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="pageviewurlrollup",
+            index=models.Index(
+                fields=["domain", "url", "day"], name="pageviewurlrollup_url_idx"
+            ),
+        ),
+    ]
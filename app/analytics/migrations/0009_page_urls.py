@@ -0,0 +1,123 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0008_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PageUrl",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("url", models.CharField(max_length=2000)),
+                ("path", models.CharField(max_length=2000)),
+                ("url_hash", models.BigIntegerField()),
+                (
+                    "domain",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="urls",
+                        to="analytics.domain",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="pageurl",
+            constraint=models.UniqueConstraint(
+                fields=("domain", "url_hash"), name="pageurl_unique_url_hash"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageurl",
+            index=models.Index(
+                fields=["url"],
+                name="pageurl_url_prefix_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+        migrations.AddField(
+            model_name="pageview",
+            name="page_url",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="page_views",
+                to="analytics.pageurl",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="pageview",
+            name="pageview_domain_url_ts_idx",
+        ),
+        migrations.AddIndex(
+            model_name="pageview",
+            index=models.Index(
+                fields=["page_url", "timestamp"], name="pageview_page_url_ts_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageview",
+            index=models.Index(
+                condition=models.Q(("page_url__isnull", True)),
+                fields=["id"],
+                name="pageview_no_page_url_idx",
+            ),
+        ),
+        # The url rollup is keyed by page url from now on, it is refilled by the
+        # migrate_page_urls command.
+        migrations.RunSQL(
+            "DELETE FROM analytics_pageviewurlrollup", migrations.RunSQL.noop
+        ),
+        migrations.RemoveConstraint(
+            model_name="pageviewurlrollup",
+            name="pageviewurlrollup_unique_key",
+        ),
+        migrations.RemoveIndex(
+            model_name="pageviewurlrollup",
+            name="pageviewurlrollup_url_idx",
+        ),
+        migrations.RemoveField(
+            model_name="pageviewurlrollup",
+            name="url",
+        ),
+        migrations.AddField(
+            model_name="pageviewurlrollup",
+            name="page_url",
+            field=models.ForeignKey(
+                db_index=False,
+                default=None,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="rollups",
+                to="analytics.pageurl",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name="pageviewurlrollup",
+            constraint=models.UniqueConstraint(
+                fields=("domain", "day", "page_url", "is_robot"),
+                name="pageviewurlrollup_unique_key",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageviewurlrollup",
+            index=models.Index(
+                fields=["page_url", "day"], name="pageviewurlrollup_page_url_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0009_page_urls"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pageurl",
+            name="total_views",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="pageurl",
+            name="total_views_with_robots",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE analytics_pageurl SET
+                total_views = totals.views,
+                total_views_with_robots = totals.views_with_robots
+            FROM (
+                SELECT
+                    page_url_id,
+                    COALESCE(SUM(page_views) FILTER (WHERE NOT is_robot), 0) AS views,
+                    SUM(page_views) AS views_with_robots
+                FROM analytics_pageviewurlrollup
+                GROUP BY page_url_id
+            ) AS totals
+            WHERE analytics_pageurl.id = totals.page_url_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="pageurl",
+            index=models.Index(
+                fields=["domain", "total_views", "url"], name="pageurl_top_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pageurl",
+            index=models.Index(
+                fields=["domain", "total_views_with_robots", "url"],
+                name="pageurl_top_with_robots_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0010_page_url_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VisitorSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("registers", models.BinaryField()),
+                (
+                    "domain",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visitor_sketches",
+                        to="analytics.domain",
+                    ),
+                ),
+                (
+                    "page_url",
+                    models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="visitor_sketches",
+                        to="analytics.pageurl",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="visitorsketch",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("page_url__isnull", True)),
+                fields=("domain", "day"),
+                name="visitorsketch_unique_day",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="visitorsketch",
+            constraint=models.UniqueConstraint(
+                fields=("page_url", "day"), name="visitorsketch_unique_url_day"
+            ),
+        ),
+    ]
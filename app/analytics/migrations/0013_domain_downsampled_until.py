@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0012_domain_archived_until"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="domain",
+            name="downsampled_until",
+            field=models.DateField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0013_domain_downsampled_until"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="pageview",
+            name="timestamp",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
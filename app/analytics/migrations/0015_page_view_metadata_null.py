@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0014_page_view_timestamp_default"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="pageview",
+            name="metadata",
+            field=models.JSONField(null=True),
+        ),
+    ]
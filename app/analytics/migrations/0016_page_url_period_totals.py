@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0015_page_view_metadata_null"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="domain",
+            name="period_totals_day",
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name="PageUrlPeriodTotal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("days", models.PositiveSmallIntegerField()),
+                ("url", models.CharField(max_length=2000)),
+                ("total_views", models.PositiveBigIntegerField(default=0)),
+                ("total_views_with_robots", models.PositiveBigIntegerField(default=0)),
+                (
+                    "domain",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="url_period_totals",
+                        to="analytics.domain",
+                    ),
+                ),
+                (
+                    "page_url",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="period_totals",
+                        to="analytics.pageurl",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["domain", "days", "total_views", "url"],
+                        name="pageurlperiodtotal_top_idx",
+                    ),
+                    models.Index(
+                        fields=["domain", "days", "total_views_with_robots", "url"],
+                        name="pageurlperiodtotal_robots_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="pageurlperiodtotal",
+            constraint=models.UniqueConstraint(
+                fields=("page_url", "days"), name="pageurlperiodtotal_unique_key"
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0016_page_url_period_totals"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingVisitor",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("visitor_hash", models.BigIntegerField()),
+                (
+                    "domain",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_visitors",
+                        to="analytics.domain",
+                    ),
+                ),
+                (
+                    "page_url",
+                    models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_visitors",
+                        to="analytics.pageurl",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["domain", "day"], name="pendingvisitor_day_idx"
+                    )
+                ],
+            },
+        ),
+    ]
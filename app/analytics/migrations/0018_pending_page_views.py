@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("analytics", "0017_pending_visitors"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingPageView",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("page_view_id", models.UUIDField()),
+                ("timestamp", models.DateTimeField()),
+                ("is_robot", models.BooleanField()),
+                (
+                    "browser",
+                    models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="analytics.browser",
+                    ),
+                ),
+                (
+                    "country",
+                    models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="analytics.country",
+                    ),
+                ),
+                (
+                    "device",
+                    models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="analytics.device",
+                    ),
+                ),
+                (
+                    "domain",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_page_views",
+                        to="analytics.domain",
+                    ),
+                ),
+                (
+                    "os",
+                    models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="analytics.operatingsystem",
+                    ),
+                ),
+                (
+                    "page_url",
+                    models.ForeignKey(
+                        db_index=False,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pending_page_views",
+                        to="analytics.pageurl",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,19 +1,82 @@
 import uuid
-from typing import Optional
+from collections import Counter
+from typing import Iterable, Optional, Tuple
 
+from analytics import archives
+from analytics.caches import cached_analytics
 from analytics.helpers import transform_period_string_to_timedelta
-from analytics.managers import DomainManager, PageViewManager
+from analytics.managers import (
+    DimensionManager,
+    DimensionRollupManager,
+    DomainManager,
+    MonthlyTotalManager,
+    PageUrlManager,
+    PageViewManager,
+    PeriodTotalManager,
+    UrlRollupManager,
+    VisitorSketchManager,
+)
+from analytics.partitions import add_months
+from analytics.routers import read_from_replica
 from django.conf import settings
 from django.db import models
-from django.db.models import Count, F, Func, QuerySet, Value
-from django.db.models.functions import TruncMonth
+from django.db.models import F, Q, QuerySet, Sum
+from django.db.models.expressions import RawSQL
 from django.utils import timezone
 from factory.faker import faker
 
 
+class Dimension(models.Model):
+    """
+    Small lookup table of the values of a page view dimension, like the browser
+    names, referenced by PageView with a smallint foreign key.
+    """
+
+    id = models.SmallAutoField(primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+
+    objects = DimensionManager()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.name
+
+
+class Browser(Dimension):
+    pass
+
+
+class OperatingSystem(Dimension):
+    pass
+
+
+class Device(Dimension):
+    pass
+
+
+class Country(Dimension):
+    class Meta(Dimension.Meta):
+        verbose_name_plural = "countries"
+
+
 class Domain(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     base_url = models.URLField()
+    # Incremented when page views of the domain are tracked, see
+    # DomainManager.bump_data_generation
+    data_generation = models.PositiveBigIntegerField(default=0, editable=False)
+    # First month whose page view total is not stored in PageViewMonthlyTotal
+    monthly_totals_until = models.DateField(null=True, editable=False)
+    # First month whose page views are not archived, see analytics.archives
+    archived_until = models.DateField(null=True, editable=False)
+    # First day whose page views are not downsampled, the page views of earlier
+    # days were deleted and only their aggregates are kept
+    downsampled_until = models.DateField(null=True, editable=False)
+    # Last day of the periods of the url period totals, None until they are
+    # computed, see PeriodTotalManager
+    period_totals_day = models.DateField(null=True, editable=False)
 
     objects = DomainManager()
 
@@ -30,8 +93,10 @@ class Domain(models.Model):
 
     @staticmethod
     def get_colors(amount_colors) -> list:
+        # The same colors every time, so responses only change with their data
         colors = []
         fake = faker.Faker()
+        fake.seed_instance(0)
         for i in range(amount_colors):
             colors.append(fake.hex_color())
 
@@ -43,9 +108,7 @@ class Domain(models.Model):
         page_views = self.page_views
 
         if not with_robots:
-            page_views = page_views.exclude(
-                metadata__device__in=settings.EXCLUDED_DEVICES
-            ).exclude(metadata__browser__icontains="bot")
+            page_views = page_views.filter(is_robot=False)
 
         if period_timedelta:
             now = timezone.now()
@@ -53,6 +116,72 @@ class Domain(models.Model):
             page_views = page_views.filter(timestamp__range=(start_date, now))
         return page_views
 
+    def get_rollups(
+        self,
+        rollups: QuerySet,
+        period_timedelta: Optional[timezone.timedelta],
+        with_robots: bool = False,
+    ) -> QuerySet:
+        """
+        Filter the rollups of the domain like get_page_views filters the page
+        views. Rollups are per day, so a period starts at the beginning of the day.
+        """
+        rollups = rollups.filter(domain=self)
+
+        if not with_robots:
+            rollups = rollups.filter(is_robot=False)
+
+        start_day = self.get_start_day(period_timedelta)
+        if start_day:
+            rollups = rollups.filter(day__gte=start_day)
+        return rollups
+
+    def get_archived_page_views(
+        self,
+        group_by: Iterable[str] = (),
+        start_day=None,
+        end_day=None,
+        with_robots: bool = False,
+        required: Iterable[str] = (),
+        page_url_ids: Optional[Iterable[int]] = None,
+    ) -> Counter:
+        """
+        Return the amount of page views of the archived months per group_by
+        values, see analytics.archives.count_page_views. The rollups of archived
+        days are deleted, so this adds up with them.
+        """
+        if self.archived_until is None or (
+            start_day and start_day >= self.archived_until
+        ):
+            return Counter()
+        return archives.count_page_views(
+            self.pk,
+            self.archived_until,
+            group_by=group_by,
+            start_day=start_day,
+            end_day=end_day,
+            with_robots=with_robots,
+            required=required,
+            page_url_ids=page_url_ids,
+        )
+
+    @staticmethod
+    def get_start_day(period_timedelta: Optional[timezone.timedelta]):
+        if period_timedelta:
+            return timezone.localdate(timezone.now() - period_timedelta)
+        return None
+
+    def has_period_totals(self, period_timedelta: timezone.timedelta) -> bool:
+        """
+        Return whether the url period totals of the domain count the page views
+        of the period, i.e. they were moved forward today.
+        """
+        return (
+            self.period_totals_day is not None
+            and self.period_totals_day - timezone.timedelta(days=period_timedelta.days)
+            == self.get_start_day(period_timedelta)
+        )
+
     def get_monthly_average_page_views(self, with_robots: bool = False) -> float:
         page_views = self.get_page_views_data(with_robots=with_robots)["data"]
         try:
@@ -61,114 +190,355 @@ class Domain(models.Model):
             value = 0
         return value
 
+    @read_from_replica
+    @cached_analytics
     def get_page_views_data(
         self, period: str = "all", with_robots: bool = False
     ) -> dict:
+        """
+        Return the amount of page views per month. Frozen months are read from
+        their stored totals, only the other months are aggregated.
+        """
         period_timedelta = transform_period_string_to_timedelta(period=period)
-        page_views = self.get_page_views(
-            period_timedelta=period_timedelta, with_robots=with_robots
-        )
-        qs = (
-            page_views.annotate(evaluation_month=TruncMonth("timestamp"))
-            .values("evaluation_month")
-            .annotate(Count("pk", distinct=True))
-        ).order_by("evaluation_month")
-        qs = qs.annotate(
-            iso_evaluation_month=Func(
-                F("evaluation_month"),
-                Value("YYYY-MM"),
-                function="to_char",
-                output_field=models.CharField(),
-            )
+        start_day = self.get_start_day(period_timedelta)
+        monthly_page_views = PageViewMonthlyTotal.objects.get_monthly_page_views(
+            domain_ids=[self.pk], start_day=start_day
         )
-        months = list(qs.values_list("iso_evaluation_month", flat=True))
-        data = list(qs.values_list("pk__count", flat=True))
-        return {"data": data, "months": months}
+        page_views_per_month = Counter()
+        for (_, month, is_robot), page_views in monthly_page_views.items():
+            if with_robots or not is_robot:
+                page_views_per_month[month] += page_views
+        if start_day and start_day.day != 1:
+            # The partial first month is aggregated from the rollups, which
+            # archived months do not have anymore
+            month = start_day.replace(day=1)
+            archived = self.get_archived_page_views(
+                start_day=start_day,
+                end_day=add_months(month, 1),
+                with_robots=with_robots,
+                required=archives.DIMENSION_COLUMNS,
+            )
+            if archived:
+                page_views_per_month[month] += archived[()]
+        months = sorted(page_views_per_month)
+        return {
+            "data": [page_views_per_month[month] for month in months],
+            "months": [month.strftime("%Y-%m") for month in months],
+        }
 
+    @read_from_replica
+    @cached_analytics
     def get_page_views_by_url(
-        self, period: str = "all", with_robots: bool = False
-    ) -> QuerySet:
+        self,
+        period: str = "all",
+        with_robots: bool = False,
+        after: Optional[Tuple[int, str]] = None,
+        limit: Optional[int] = None,
+    ) -> dict:
+        """
+        Return a page of the urls with the most page views, ordered by count and
+        url (both descending), and the (count, url) key to pass as after to get
+        the next page, None on the last page.
+
+        Pages contain at most PAGE_VIEWS_BY_URL_PAGE_SIZE urls. The all time
+        and period totals are read in index order from the page urls and their
+        period totals, periods whose totals were not moved forward today are
+        aggregated from the url rollups.
+        """
+        page_size = settings.PAGE_VIEWS_BY_URL_PAGE_SIZE
+        limit = min(limit or page_size, page_size)
         period_timedelta = transform_period_string_to_timedelta(period=period)
-        page_views = self.get_page_views(
-            period_timedelta=period_timedelta, with_robots=with_robots
-        )
 
-        return (
-            page_views.values("url")
-            .annotate(count=Count("pk", distinct=True))
-            .order_by("-count")
+        if period_timedelta is None or self.has_period_totals(period_timedelta):
+            count_field = "total_views_with_robots" if with_robots else "total_views"
+            if period_timedelta is None:
+                rows = self.urls.all()
+            else:
+                rows = self.url_period_totals.filter(days=period_timedelta.days)
+            rows = rows.filter(**{f"{count_field}__gt": 0}).annotate(
+                count=F(count_field)
+            )
+            if after:
+                # A row comparison is used as index condition of the top indexes
+                rows = rows.filter(
+                    RawSQL(
+                        f"({count_field}, url) < (%s, %s)",
+                        after,
+                        output_field=models.BooleanField(),
+                    )
+                )
+        else:
+            rollups = self.get_rollups(
+                PageViewUrlRollup.objects,
+                period_timedelta=period_timedelta,
+                with_robots=with_robots,
+            )
+            archived = self.get_archived_page_views(
+                ["page_url"],
+                start_day=self.get_start_day(period_timedelta),
+                with_robots=with_robots,
+            )
+            if archived:
+                rows = self.get_archived_page_views_by_url(rollups, archived, after)
+                return self.get_url_page(rows[: limit + 1], limit)
+
+            rows = rollups.values("page_url").annotate(
+                url=F("page_url__url"), count=Sum("page_views")
+            )
+            if after:
+                count, url = after
+                rows = rows.filter(Q(count__lt=count) | Q(count=count, url__lt=url))
+
+        rows = list(rows.values("url", "count").order_by("-count", "-url")[: limit + 1])
+        return self.get_url_page(rows, limit)
+
+    @staticmethod
+    def get_url_page(rows: list, limit: int) -> dict:
+        next_key = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_key = (rows[-1]["count"], rows[-1]["url"])
+        return {"data": rows, "next": next_key}
+
+    @staticmethod
+    def get_archived_page_views_by_url(
+        rollups: QuerySet, archived: Counter, after: Optional[Tuple[int, str]]
+    ) -> list:
+        """
+        Return the urls of the rollups and the archived page views per page url
+        ordered like get_page_views_by_url, after the given key.
+        """
+        counts = Counter(
+            dict(rollups.values_list("page_url").annotate(Sum("page_views")).order_by())
+        )
+        for (page_url_id,), count in archived.items():
+            counts[page_url_id] += count
+        urls = dict(
+            PageUrl.objects.filter(pk__in=list(counts)).values_list("pk", "url")
         )
+        rows = [
+            {"url": urls[page_url_id], "count": count}
+            for page_url_id, count in counts.items()
+        ]
+        if after:
+            rows = [row for row in rows if (row["count"], row["url"]) < tuple(after)]
+        return sorted(rows, key=lambda row: (row["count"], row["url"]), reverse=True)
 
-    def get_browser_analytics(
-        self, period: str = "all", with_robots: bool = False
+    @read_from_replica
+    @cached_analytics
+    def get_unique_visitors(
+        self, period: str = "all", url: Optional[str] = None
     ) -> dict:
+        """
+        Return the estimated amount of unique visitors in the period and per
+        month, of the given url only if it is set.
+        """
         period_timedelta = transform_period_string_to_timedelta(period=period)
-        page_views = self.get_page_views(
-            period_timedelta=period_timedelta, with_robots=with_robots
+        page_url_ids = None
+        if url is not None:
+            page_url_ids = list(
+                PageUrl.objects.lookup(self.pk, url).values_list("id", flat=True)
+            )
+        total, months = VisitorSketch.objects.get_monthly_visitors(
+            self.pk, self.get_start_day(period_timedelta), page_url_ids
         )
+        return {
+            "total": total,
+            "data": list(months.values()),
+            "months": [month.strftime("%Y-%m") for month in months],
+        }
 
-        qs = (
-            page_views.values("metadata__browser")
-            .annotate(browser_count=Count("metadata__browser"))
-            .order_by()
+    @read_from_replica
+    @cached_analytics
+    def get_dimension_analytics(
+        self, dimension: str, period: str = "all", with_robots: bool = False
+    ) -> dict:
+        """
+        Return the share of the page views per value of the given dimension
+        (browser, os, device or country).
+        """
+        period_timedelta = transform_period_string_to_timedelta(period=period)
+        rollups = self.get_rollups(
+            PageViewDimensionRollup.objects,
+            period_timedelta=period_timedelta,
+            with_robots=with_robots,
+        )
+        counts = Counter(
+            dict(rollups.values_list(dimension).annotate(Sum("page_views")).order_by())
         )
-        labels = list(qs.values_list("metadata__browser", flat=True))
+        archived = self.get_archived_page_views(
+            [dimension],
+            start_day=self.get_start_day(period_timedelta),
+            with_robots=with_robots,
+            required=archives.DIMENSION_COLUMNS,
+        )
+        for (value_id,), count in archived.items():
+            counts[value_id] += count
+        names = DIMENSIONS[dimension].objects.get_names()
+        return self.get_pie_data(
+            [(names.get(value_id), count) for value_id, count in counts.items()]
+        )
+
+    def get_pie_data(self, rows: list) -> dict:
+        labels = [label for label, count in rows]
         colors = self.get_colors(len(labels))
-        data = list(qs.values_list("browser_count", flat=True))
-        data = self.get_data_in_percentages(data)
+        data = self.get_data_in_percentages([count for label, count in rows])
         return {"data": data, "colors": colors, "labels": labels}
 
-    def get_country_analytics(
+    @read_from_replica
+    @cached_analytics
+    def get_overview_analytics(
         self, period: str = "all", with_robots: bool = False
     ) -> dict:
+        """
+        Return the total amount of page views and the browser, os, device and
+        country analytics, all computed with one query.
+        """
         period_timedelta = transform_period_string_to_timedelta(period=period)
-        page_views = self.get_page_views(
-            period_timedelta=period_timedelta, with_robots=with_robots
+        start_day = self.get_start_day(period_timedelta)
+        total, breakdowns = PageViewDimensionRollup.objects.get_breakdowns(
+            self.pk,
+            dimensions=list(DIMENSIONS),
+            start_day=start_day,
+            with_robots=with_robots,
+        )
+        archived_total = 0
+        for dimension, model in DIMENSIONS.items():
+            archived = self.get_archived_page_views(
+                [dimension],
+                start_day=start_day,
+                with_robots=with_robots,
+                required=archives.DIMENSION_COLUMNS,
+            )
+            if not archived:
+                continue
+            # Every dimension is set for the counted page views
+            archived_total = sum(archived.values())
+            names = model.objects.get_names()
+            counts = Counter(dict(breakdowns[dimension]))
+            for (value_id,), count in archived.items():
+                counts[names.get(value_id)] += count
+            breakdowns[dimension] = sorted(
+                counts.items(), key=lambda row: (-row[1], row[0])
+            )
+        overview = {"total": total + archived_total}
+        for dimension, rows in breakdowns.items():
+            overview[dimension] = self.get_pie_data(rows)
+        return overview
+
+    def get_browser_analytics(
+        self, period: str = "all", with_robots: bool = False
+    ) -> dict:
+        return self.get_dimension_analytics(
+            "browser", period=period, with_robots=with_robots
         )
-        qs = (
-            page_views.values("metadata__country")
-            .annotate(country_count=Count("metadata__country"))
-            .order_by()
+
+    def get_country_analytics(
+        self, period: str = "all", with_robots: bool = False
+    ) -> dict:
+        return self.get_dimension_analytics(
+            "country", period=period, with_robots=with_robots
         )
-        labels = list(qs.values_list("metadata__country", flat=True))
-        colors = self.get_colors(len(labels))
-        data = list(qs.values_list("country_count", flat=True))
-        data = self.get_data_in_percentages(data)
-        return {"data": data, "colors": colors, "labels": labels}
 
     def get_device_analytics(
         self, period: str = "all", with_robots: bool = False
     ) -> dict:
-        period_timedelta = transform_period_string_to_timedelta(period=period)
-        page_views = self.get_page_views(
-            period_timedelta=period_timedelta, with_robots=with_robots
-        )
-        qs = (
-            page_views.values("metadata__device")
-            .annotate(device_count=Count("metadata__device"))
-            .order_by()
+        return self.get_dimension_analytics(
+            "device", period=period, with_robots=with_robots
         )
-        labels = list(qs.values_list("metadata__device", flat=True))
-        colors = self.get_colors(len(labels))
-        data = list(qs.values_list("device_count", flat=True))
-        data = self.get_data_in_percentages(data)
-        return {"data": data, "colors": colors, "labels": labels}
 
     def get_os_analytics(self, period: str = "all", with_robots: bool = False) -> dict:
-        period_timedelta = transform_period_string_to_timedelta(period=period)
-        page_views = self.get_page_views(
-            period_timedelta=period_timedelta, with_robots=with_robots
-        )
-        qs = (
-            page_views.values("metadata__os")
-            .annotate(os_count=Count("metadata__os"))
-            .order_by()
+        return self.get_dimension_analytics(
+            "os", period=period, with_robots=with_robots
         )
-        labels = list(qs.values_list("metadata__os", flat=True))
-        colors = self.get_colors(len(labels))
-        data = list(qs.values_list("os_count", flat=True))
-        data = self.get_data_in_percentages(data)
-        return {"data": data, "colors": colors, "labels": labels}
+
+
+class PageUrl(models.Model):
+    """
+    Normalized url of the page views of a domain.
+    """
+
+    domain = models.ForeignKey(Domain, related_name="urls", on_delete=models.CASCADE)
+    url = models.CharField(max_length=2000)
+    path = models.CharField(max_length=2000)
+    # 64 bit hash of url, urls are too long for a unique btree index
+    url_hash = models.BigIntegerField()
+    # All time totals of the url rollup, for the urls with the most page views
+    total_views = models.PositiveBigIntegerField(default=0)
+    total_views_with_robots = models.PositiveBigIntegerField(default=0)
+
+    objects = PageUrlManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["domain", "url_hash"], name="pageurl_unique_url_hash"
+            ),
+        ]
+        indexes = [
+            # Urls starting with a prefix
+            models.Index(
+                fields=["url"],
+                opclasses=["varchar_pattern_ops"],
+                name="pageurl_url_prefix_idx",
+            ),
+            # Urls with the most page views (Domain.get_page_views_by_url)
+            models.Index(
+                fields=["domain", "total_views", "url"], name="pageurl_top_idx"
+            ),
+            models.Index(
+                fields=["domain", "total_views_with_robots", "url"],
+                name="pageurl_top_with_robots_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.url
+
+
+class PageUrlPeriodTotal(models.Model):
+    """
+    Amount of page views of a url in a period of the dashboard, see
+    PeriodTotalManager.
+    """
+
+    domain = models.ForeignKey(
+        Domain, related_name="url_period_totals", on_delete=models.CASCADE
+    )
+    # Indexed by pageurlperiodtotal_unique_key
+    page_url = models.ForeignKey(
+        PageUrl, db_index=False, related_name="period_totals", on_delete=models.CASCADE
+    )
+    # Length of the period in days
+    days = models.PositiveSmallIntegerField()
+    # Copy of the url of the page url, for the (count, url) order of the listing
+    url = models.CharField(max_length=2000)
+    total_views = models.PositiveBigIntegerField(default=0)
+    total_views_with_robots = models.PositiveBigIntegerField(default=0)
+
+    objects = PeriodTotalManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["page_url", "days"], name="pageurlperiodtotal_unique_key"
+            ),
+        ]
+        indexes = [
+            # Urls with the most page views of a period
+            # (Domain.get_page_views_by_url)
+            models.Index(
+                fields=["domain", "days", "total_views", "url"],
+                name="pageurlperiodtotal_top_idx",
+            ),
+            models.Index(
+                fields=["domain", "days", "total_views_with_robots", "url"],
+                name="pageurlperiodtotal_robots_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.total_views} views of {self.url} in {self.days} days"
 
 
 class PageView(models.Model):
@@ -177,11 +547,305 @@ class PageView(models.Model):
         Domain, related_name="page_views", on_delete=models.CASCADE
     )
     ip = models.GenericIPAddressField()
-    metadata = models.JSONField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Raw browser, os, device and country of page views tracked before they were
+    # stored as dimensions, cleared by migrate_page_view_dimensions
+    metadata = models.JSONField(null=True)
+    is_robot = models.BooleanField(default=False)
+    browser = models.ForeignKey(
+        Browser, null=True, related_name="page_views", on_delete=models.PROTECT
+    )
+    os = models.ForeignKey(
+        OperatingSystem, null=True, related_name="page_views", on_delete=models.PROTECT
+    )
+    device = models.ForeignKey(
+        Device, null=True, related_name="page_views", on_delete=models.PROTECT
+    )
+    country = models.ForeignKey(
+        Country, null=True, related_name="page_views", on_delete=models.PROTECT
+    )
+    # Set when the page view is built, buffered page views are written later
+    timestamp = models.DateTimeField(default=timezone.now)
     url = models.URLField()
+    # Indexed by pageview_page_url_ts_idx
+    page_url = models.ForeignKey(
+        PageUrl,
+        null=True,
+        db_index=False,
+        related_name="page_views",
+        on_delete=models.PROTECT,
+    )
 
     objects = PageViewManager()
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["domain", "is_robot", "timestamp"],
+                name="pageview_domain_robot_ts_idx",
+            ),
+            # Periods with robots and rebuilding rollups
+            models.Index(fields=["domain", "timestamp"], name="pageview_domain_ts_idx"),
+            # Page views of a url (DomainPageViewsByUrlElement)
+            models.Index(
+                fields=["page_url", "timestamp"], name="pageview_page_url_ts_idx"
+            ),
+            # Page views still to be handled by migrate_page_view_dimensions
+            models.Index(
+                fields=["id"],
+                condition=models.Q(browser__isnull=True),
+                name="pageview_no_dimensions_idx",
+            ),
+            # Page views still to be handled by migrate_page_urls
+            models.Index(
+                fields=["id"],
+                condition=models.Q(page_url__isnull=True),
+                name="pageview_no_page_url_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.url} view at {self.timestamp}"
+
+
+class PageViewUrlRollup(models.Model):
+    """
+    Amount of page views per domain, day, url and robot classification.
+    """
+
+    domain = models.ForeignKey(
+        Domain, related_name="url_rollups", on_delete=models.CASCADE
+    )
+    day = models.DateField()
+    # Indexed by pageviewurlrollup_page_url_idx
+    page_url = models.ForeignKey(
+        PageUrl, db_index=False, related_name="rollups", on_delete=models.CASCADE
+    )
+    is_robot = models.BooleanField()
+    page_views = models.PositiveIntegerField(default=0)
+
+    objects = UrlRollupManager(key_fields=("domain", "day", "page_url", "is_robot"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["domain", "day", "page_url", "is_robot"],
+                name="pageviewurlrollup_unique_key",
+            ),
+        ]
+        indexes = [
+            # Views of a url per day (PageViewManager.get_views_for_url)
+            models.Index(
+                fields=["page_url", "day"], name="pageviewurlrollup_page_url_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.page_views} views of {self.page_url} at {self.day}"
+
+
+class PageViewDimensionRollup(models.Model):
+    """
+    Amount of page views per domain, day, robot classification and combination
+    of browser, os, device and country.
+    """
+
+    domain = models.ForeignKey(
+        Domain, related_name="dimension_rollups", on_delete=models.CASCADE
+    )
+    day = models.DateField()
+    is_robot = models.BooleanField()
+    browser = models.ForeignKey(
+        Browser, related_name="rollups", on_delete=models.PROTECT
+    )
+    os = models.ForeignKey(
+        OperatingSystem, related_name="rollups", on_delete=models.PROTECT
+    )
+    device = models.ForeignKey(Device, related_name="rollups", on_delete=models.PROTECT)
+    country = models.ForeignKey(
+        Country, related_name="rollups", on_delete=models.PROTECT
+    )
+    page_views = models.PositiveIntegerField(default=0)
+
+    objects = DimensionRollupManager(
+        key_fields=("domain", "day", "is_robot", "browser", "os", "device", "country")
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "domain",
+                    "day",
+                    "is_robot",
+                    "browser",
+                    "os",
+                    "device",
+                    "country",
+                ],
+                name="pageviewdimensionrollup_unique_key",
+            ),
+        ]
+        indexes = [
+            # Current month of all domains (DomainManager monthly averages)
+            models.Index(fields=["day"], name="pageviewdimrollup_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.page_views} views at {self.day}"
+
+
+class PageViewMonthlyTotal(models.Model):
+    """
+    Amount of page views per domain, closed month and robot classification.
+    """
+
+    domain = models.ForeignKey(
+        Domain, related_name="monthly_totals", on_delete=models.CASCADE
+    )
+    month = models.DateField()
+    is_robot = models.BooleanField()
+    page_views = models.PositiveBigIntegerField()
+
+    objects = MonthlyTotalManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["domain", "month", "is_robot"],
+                name="pageviewmonthlytotal_unique_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.page_views} views in {self.month:%Y-%m}"
+
+
+class VisitorSketch(models.Model):
+    """
+    HyperLogLog sketch of the visitors of a domain (page_url is None) or of a
+    url on a day, see analytics.sketches.
+    """
+
+    domain = models.ForeignKey(
+        Domain, related_name="visitor_sketches", on_delete=models.CASCADE
+    )
+    day = models.DateField()
+    # Indexed by visitorsketch_unique_url_day
+    page_url = models.ForeignKey(
+        PageUrl,
+        null=True,
+        db_index=False,
+        related_name="visitor_sketches",
+        on_delete=models.CASCADE,
+    )
+    registers = models.BinaryField()
+
+    objects = VisitorSketchManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["domain", "day"],
+                condition=models.Q(page_url__isnull=True),
+                name="visitorsketch_unique_day",
+            ),
+            models.UniqueConstraint(
+                fields=["page_url", "day"], name="visitorsketch_unique_url_day"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Visitors of {self.page_url or self.domain} at {self.day}"
+
+
+class PendingVisitor(models.Model):
+    """
+    Visitor of a domain (and url) on a day that is not merged into the visitor
+    sketches yet. Tracking only inserts these rows, merge_visitor_sketches
+    merges and deletes them, see VisitorSketchManager.merge_pending.
+    """
+
+    domain = models.ForeignKey(
+        Domain,
+        db_index=False,
+        related_name="pending_visitors",
+        on_delete=models.CASCADE,
+    )
+    day = models.DateField()
+    # Not indexed, the rows are merged within minutes
+    page_url = models.ForeignKey(
+        PageUrl,
+        null=True,
+        db_index=False,
+        related_name="pending_visitors",
+        on_delete=models.CASCADE,
+    )
+    # Signed hash of VisitorSketchManager.get_visitor, see analytics.sketches
+    visitor_hash = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            # Pending visitors of a period (VisitorSketchManager.get_monthly_visitors)
+            models.Index(fields=["domain", "day"], name="pendingvisitor_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"Pending visitor of {self.page_url or self.domain} at {self.day}"
+
+
+class PendingPageView(models.Model):
+    """
+    Page view that is not added to the url and dimension rollups and the url
+    totals yet. Tracking only inserts these rows, merge_page_views adds them up
+    and deletes them, see PageViewManager.merge_pending.
+    """
+
+    # Not a foreign key, the primary key of the partitioned page view table
+    # includes the timestamp. Rollups are rebuilt without the pending page views.
+    page_view_id = models.UUIDField()
+    # Not indexed, the rows are merged within seconds
+    domain = models.ForeignKey(
+        Domain,
+        db_index=False,
+        related_name="pending_page_views",
+        on_delete=models.CASCADE,
+    )
+    timestamp = models.DateTimeField()
+    page_url = models.ForeignKey(
+        PageUrl,
+        null=True,
+        db_index=False,
+        related_name="pending_page_views",
+        on_delete=models.CASCADE,
+    )
+    is_robot = models.BooleanField()
+    browser = models.ForeignKey(
+        Browser, null=True, db_index=False, related_name="+", on_delete=models.PROTECT
+    )
+    os = models.ForeignKey(
+        OperatingSystem,
+        null=True,
+        db_index=False,
+        related_name="+",
+        on_delete=models.PROTECT,
+    )
+    device = models.ForeignKey(
+        Device, null=True, db_index=False, related_name="+", on_delete=models.PROTECT
+    )
+    country = models.ForeignKey(
+        Country, null=True, db_index=False, related_name="+", on_delete=models.PROTECT
+    )
+
+    def __str__(self):
+        return (
+            f"Pending page view of {self.page_url or self.domain} at {self.timestamp}"
+        )
+
+
+# PageView dimensions by their metadata key
+DIMENSIONS = {
+    "browser": Browser,
+    "os": OperatingSystem,
+    "device": Device,
+    "country": Country,
+}
@@ -0,0 +1,107 @@
+from datetime import date, datetime, time
+from typing import List, NamedTuple, Tuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+# The page view table is partitioned by range of timestamp with one partition
+# per month, rows outside of all monthly partitions end up in the default one.
+PAGE_VIEW_TABLE = "analytics_pageview"
+DEFAULT_PARTITION = f"{PAGE_VIEW_TABLE}_default"
+
+
+class Partition(NamedTuple):
+    name: str
+    month: date
+
+
+def add_months(month: date, amount: int) -> date:
+    index = month.year * 12 + month.month - 1 + amount
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_partition_name(month: date) -> str:
+    return f"{PAGE_VIEW_TABLE}_p{month:%Y_%m}"
+
+
+def get_month_bounds(month: date) -> Tuple[datetime, datetime]:
+    start = timezone.make_aware(datetime.combine(month.replace(day=1), time.min))
+    end = timezone.make_aware(datetime.combine(add_months(month, 1), time.min))
+    return start, end
+
+
+def get_partitions() -> List[Partition]:
+    """
+    Return the monthly partitions of the page view table ordered by month.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = %s AND child.relname <> %s",
+            [PAGE_VIEW_TABLE, DEFAULT_PARTITION],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+    partitions = [
+        Partition(name=name, month=datetime.strptime(name[-7:], "%Y_%m").date())
+        for name in names
+    ]
+    return sorted(partitions, key=lambda partition: partition.month)
+
+
+def create_partition(month: date) -> bool:
+    """
+    Create the partition of the month, return False if it already exists.
+
+    Page views of the month that were already written to the default partition
+    are moved to the new partition.
+    """
+    name = get_partition_name(month)
+    if name in {partition.name for partition in get_partitions()}:
+        return False
+
+    start, end = get_month_bounds(month)
+    bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} "
+            f"WHERE timestamp >= %s AND timestamp < %s)",
+            [start, end],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {PAGE_VIEW_TABLE} {bounds}"
+            )
+            return True
+
+        # A partition can not be attached while the default partition contains
+        # rows of its range
+        cursor.execute(
+            f"ALTER TABLE {PAGE_VIEW_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"
+        )
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {PAGE_VIEW_TABLE} {bounds}")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f"WHERE timestamp >= %s AND timestamp < %s RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {PAGE_VIEW_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"
+        )
+    return True
+
+
+def remove_partition(partition: Partition, detach: bool = False) -> None:
+    """
+    Drop the partition with all its page views, or only detach it from the
+    page view table so that it can be archived and dropped later.
+    """
+    with connection.cursor() as cursor:
+        if detach:
+            cursor.execute(
+                f"ALTER TABLE {PAGE_VIEW_TABLE} DETACH PARTITION {partition.name}"
+            )
+        else:
+            cursor.execute(f"DROP TABLE {partition.name}")
@@ -0,0 +1,91 @@
+import threading
+import uuid
+from typing import Any, NamedTuple, Optional
+
+from analytics.caches import LRUCache
+from django.conf import settings
+
+
+class DomainInfo(NamedTuple):
+    id: uuid.UUID
+    base_url: str
+
+    def matches(self, url: str) -> bool:
+        """
+        Return if the url belongs to the domain.
+        """
+        return self.base_url in url
+
+
+class DomainRegistry:
+    """
+    In-process cache of the tracked domains, so that tracking a page view does
+    not need to query the Domain table.
+
+    Domains are loaded lazily and reloaded after ``ttl`` seconds. Unknown ids are
+    remembered for ``negative_ttl`` seconds so that junk traffic can not hammer
+    the database. Saving or deleting a Domain invalidates its entry in the
+    current process (see analytics.signals), other processes pick up the change
+    after the ttl.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.domains = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.unknown_domains = LRUCache(maxsize=maxsize, ttl=negative_ttl)
+
+    def get(self, domain_id: Any) -> DomainInfo:
+        """
+        Return the domain with the given id.
+
+        Raise ValidationError if the id is not valid and Domain.DoesNotExist if
+        there is no such domain, just like Domain.objects.get would.
+        """
+        from analytics.models import Domain
+
+        pk = Domain._meta.pk.to_python(domain_id)
+        domain = self.domains.get(pk)
+        if domain is not None:
+            return domain
+
+        if pk is None or self.unknown_domains.get(pk):
+            raise Domain.DoesNotExist
+        try:
+            id, base_url = Domain.objects.values_list("id", "base_url").get(pk=pk)
+        except Domain.DoesNotExist:
+            self.unknown_domains.set(pk, True)
+            raise
+        domain = DomainInfo(id=id, base_url=base_url)
+        self.domains.set(pk, domain)
+        return domain
+
+    def invalidate(self, domain_id: uuid.UUID) -> None:
+        self.domains.delete(domain_id)
+        self.unknown_domains.delete(domain_id)
+
+    def clear(self) -> None:
+        self.domains.clear()
+        self.unknown_domains.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "domains": self.domains.get_stats(),
+            "unknown_domains": self.unknown_domains.get_stats(),
+        }
+
+
+_registry: Optional[DomainRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_domain_registry() -> DomainRegistry:
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = DomainRegistry(
+                    maxsize=settings.DOMAIN_REGISTRY_SIZE,
+                    ttl=settings.DOMAIN_REGISTRY_TTL,
+                    negative_ttl=settings.DOMAIN_REGISTRY_NEGATIVE_TTL,
+                )
+    return _registry
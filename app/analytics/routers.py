@@ -0,0 +1,62 @@
+import functools
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from django.conf import settings
+
+# Alias of the replica the reads of the current block are sent to
+_replica: ContextVar[Optional[str]] = ContextVar("replica", default=None)
+
+
+@contextmanager
+def use_replicas(enabled: bool = True):
+    """
+    Send the reads in the block to one random replica, or back to the primary
+    when not enabled. Nested blocks keep the replica, so that all reads of a
+    request see the same state. Writes always go to the primary.
+    """
+    replica = None
+    if enabled and settings.DATABASE_REPLICAS:
+        replica = _replica.get() or random.choice(settings.DATABASE_REPLICAS)
+    token = _replica.set(replica)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def read_from_replica(function: Callable) -> Callable:
+    """
+    Run the function in use_replicas(), for read-only analytics which may be a
+    little behind the primary.
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with use_replicas():
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Routes the reads in use_replicas() blocks to a replica and all other
+    queries to the default database, also the writes of objects that were read
+    from a replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas contain the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,17 @@
+from analytics.models import Domain, PageView
+from analytics.registry import get_domain_registry
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+def invalidate_domain_registry(sender, instance: Domain, **kwargs):
+    get_domain_registry().invalidate(instance.pk)
+
+
+@receiver(post_save, sender=PageView)
+def update_page_view_aggregates(sender, instance: PageView, created, raw, **kwargs):
+    # Page views created with bulk_create call update_aggregates themselves.
+    if created and not raw:
+        PageView.objects.update_aggregates([instance])
@@ -0,0 +1,43 @@
+from functools import partial
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def read_from_primary(settings):
+    # The test data is written in transactions of the default database, which
+    # the replica connections (mirrors of it in tests) do not see
+    settings.DATABASE_REPLICAS = []
+
+
+@pytest.fixture(autouse=True)
+def counted_while_tracking(settings):
+    # Most tests read the rollups right after creating page views, the pending
+    # page views are tested on their own
+    settings.PAGE_VIEW_MERGE_ENABLED = False
+
+
+@pytest.fixture(autouse=True)
+def trailing_bumps(monkeypatch):
+    """
+    Start every test without data generation bumps of earlier tests and cancel
+    the trailing bumps it leaves behind.
+    """
+    trailing_bumps = {}
+    monkeypatch.setattr("analytics.managers._data_generation_bumps", {})
+    monkeypatch.setattr("analytics.managers._trailing_bumps", trailing_bumps)
+    yield trailing_bumps
+    for timer in list(trailing_bumps.values()):
+        timer.cancel()
+
+
+@pytest.fixture()
+def execute_on_commit(monkeypatch, django_capture_on_commit_callbacks):
+    """
+    Context manager that runs the on_commit callbacks of the block, like the
+    data generation bumps of tracked page views. The ids they cache would
+    outlive the rolled back test transaction, so the caches are replaced.
+    """
+    monkeypatch.setattr("analytics.managers._dimension_ids", {})
+    monkeypatch.setattr("analytics.helpers._page_url_cache", None)
+    return partial(django_capture_on_commit_callbacks, execute=True)
@@ -1,7 +1,16 @@
 import random
 
 import factory
-from analytics.models import Domain, PageView
+from analytics.helpers import classify_robot
+from analytics.models import (
+    Browser,
+    Country,
+    Device,
+    Domain,
+    OperatingSystem,
+    PageUrl,
+    PageView,
+)
 
 
 class DomainFactory(factory.django.DjangoModelFactory):
@@ -41,6 +50,30 @@ class PageViewFactory(factory.django.DjangoModelFactory):
         uri_path = random.choice(TEST_URI_PATHS)
         return f"{self.domain.base_url}{uri_path}/"
 
+    @factory.lazy_attribute
+    def page_url_id(self):
+        return PageUrl.objects.get_id(self.domain.id, self.url)
+
     @factory.lazy_attribute
     def metadata(self):
         return TEST_METADATA
+
+    @factory.lazy_attribute
+    def is_robot(self):
+        return classify_robot(self.metadata)
+
+    @factory.lazy_attribute
+    def browser_id(self):
+        return Browser.objects.get_id(self.metadata.get("browser"))
+
+    @factory.lazy_attribute
+    def os_id(self):
+        return OperatingSystem.objects.get_id(self.metadata.get("os"))
+
+    @factory.lazy_attribute
+    def device_id(self):
+        return Device.objects.get_id(self.metadata.get("device"))
+
+    @factory.lazy_attribute
+    def country_id(self):
+        return Country.objects.get_id(self.metadata.get("country"))
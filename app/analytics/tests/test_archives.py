@@ -0,0 +1,203 @@
+from datetime import date
+
+import numpy as np
+import pytest
+from analytics.archives import (
+    archive_month,
+    count_page_views,
+    get_day_starts,
+    read_month,
+)
+from analytics.models import (
+    Domain,
+    PageUrl,
+    PageView,
+    PageViewDimensionRollup,
+    PageViewMonthlyTotal,
+    PageViewUrlRollup,
+)
+from analytics.tests.factories import DomainFactory, PageViewFactory
+from django.core.management import call_command
+from freezegun import freeze_time
+
+CHROME_METADATA = {
+    "browser": "Chrome",
+    "os": "Windows",
+    "device": "Other",
+    "country": "DE",
+}
+ROBOT_METADATA = {
+    "browser": "UptimeRobot",
+    "os": "Other",
+    "device": "Spider",
+    "country": "US",
+}
+
+
+@pytest.fixture()
+def domain(settings, tmp_path):
+    settings.PAGE_VIEW_ARCHIVE_PATH = str(tmp_path)
+    settings.DASHBOARD_CACHE_ENABLED = False
+    domain = DomainFactory.create()
+    for timestamp, amount in [
+        ("2023-01-01 00:30", 2),
+        ("2023-01-31 23:30", 1),
+        ("2023-02-05 12:00", 3),
+        ("2023-02-20 12:00", 2),
+        ("2023-03-02 12:00", 2),
+    ]:
+        with freeze_time(timestamp):
+            PageViewFactory.create_batch(amount, domain=domain)
+            PageViewFactory.create(domain=domain, metadata=CHROME_METADATA)
+            PageViewFactory.create(domain=domain, metadata=ROBOT_METADATA)
+    PageViewFactory.create(domain=DomainFactory.create())
+    return domain
+
+
+def get_analytics(domain: Domain) -> dict:
+    def get_pie_values(pie_data: dict) -> dict:
+        return dict(zip(pie_data["labels"], pie_data["data"]))
+
+    analytics = {}
+    for period in ["all", "1", "3"]:
+        for with_robots in [False, True]:
+            key = (period, with_robots)
+            overview = domain.get_overview_analytics(period, with_robots)
+            analytics[key] = {
+                "browser": get_pie_values(
+                    domain.get_dimension_analytics("browser", period, with_robots)
+                ),
+                "total": overview["total"],
+                "overview": {
+                    dimension: get_pie_values(pie_data)
+                    for dimension, pie_data in overview.items()
+                    if dimension != "total"
+                },
+                "page_views": domain.get_page_views_data(period, with_robots),
+                "by_url": domain.get_page_views_by_url(period, with_robots, limit=2),
+            }
+        analytics[period, "views_for_url"] = PageView.objects.get_views_for_url(
+            domain.pk, f"{domain.base_url}/my-first-post", with_robots=True
+        )
+    return analytics
+
+
+@pytest.mark.django_db
+@freeze_time("2023-03-15")
+class TestArchive:
+    def test__columns(self, domain):
+        page_url_ids = set(
+            domain.page_views.filter(timestamp__lt=date(2023, 2, 1)).values_list(
+                "page_url", flat=True
+            )
+        )
+        archive_month(domain.pk, date(2023, 1, 1))
+
+        columns = read_month(domain.pk, date(2023, 1, 1))
+        assert len(columns["second"]) == 7
+        assert isinstance(columns["second"], np.memmap)
+        assert list(np.diff(columns["second"]) >= 0) == [True] * 6
+        assert columns["is_robot"].sum() == 2
+        assert columns["browser"].dtype == np.int8
+        assert set(columns["page_url"].tolist()) == page_url_ids
+
+    def test__moves_page_views_and_rollups(self, domain):
+        call_command("archive_page_views", until="2023-03")
+
+        domain.refresh_from_db()
+        assert domain.archived_until == date(2023, 3, 1)
+        assert domain.page_views.count() == 4
+        assert not PageViewDimensionRollup.objects.filter(
+            domain=domain, day__lt=date(2023, 3, 1)
+        ).exists()
+        assert not PageViewUrlRollup.objects.filter(
+            domain=domain, day__lt=date(2023, 3, 1)
+        ).exists()
+        assert PageViewMonthlyTotal.objects.filter(domain=domain).count() == 4
+        # Page views of other domains stay
+        assert PageView.objects.exclude(domain=domain).count() == 1
+
+    def test__deletes_page_views_in_batches(self, domain):
+        archive_month(domain.pk, date(2023, 1, 1), batch_size=2)
+
+        assert not domain.page_views.filter(timestamp__lt=date(2023, 2, 1)).exists()
+        assert domain.page_views.count() == 13
+
+    def test__interrupted_deletes_are_continued(self, domain, monkeypatch):
+        monkeypatch.setattr(PageView.objects, "delete_in_batches", lambda *args: 0)
+        archive_month(domain.pk, date(2023, 1, 1))
+        monkeypatch.undo()
+        domain.refresh_from_db()
+
+        assert domain.archived_until == date(2023, 2, 1)
+        assert get_analytics(domain)["all", False]["total"] == 15
+        assert domain.page_views.count() == 20
+
+        archive_month(domain.pk, date(2023, 2, 1))
+
+        assert domain.page_views.count() == 4
+
+    def test__count_page_views(self, domain):
+        call_command("archive_page_views", until="2023-03")
+
+        counts = count_page_views(
+            domain.pk,
+            date(2023, 3, 1),
+            ["day"],
+            start_day=date(2023, 1, 31),
+            end_day=date(2023, 2, 20),
+        )
+        assert counts == {(date(2023, 1, 31),): 2, (date(2023, 2, 5),): 4}
+
+    def test__analytics_combine_archive_and_rollups(self, domain):
+        expected = get_analytics(domain)
+
+        call_command("archive_page_views", until="2023-03")
+        domain.refresh_from_db()
+
+        assert get_analytics(domain) == expected
+
+    def test__rebuilds_keep_archived_aggregates(self, domain):
+        call_command("archive_page_views", until="2023-03")
+        domain.refresh_from_db()
+        totals = dict(domain.urls.values_list("url", "total_views"))
+        page_views = domain.get_page_views_data(with_robots=True)
+
+        PageView.objects.rebuild_aggregates(
+            domain.pk, date(2023, 1, 1), date(2023, 3, 15)
+        )
+        call_command("rebuild_monthly_totals", domain=str(domain.pk))
+
+        assert dict(domain.urls.values_list("url", "total_views")) == totals
+        assert domain.get_page_views_data(with_robots=True) == page_views
+        assert sum(totals.values()) == 15
+
+    def test__months_are_archived_in_order(self, domain):
+        archive_month(domain.pk, date(2023, 1, 1))
+
+        with pytest.raises(ValueError):
+            archive_month(domain.pk, date(2023, 1, 1))
+        with pytest.raises(ValueError):
+            archive_month(domain.pk, date(2023, 3, 1))
+
+    def test__unknown_urls(self, domain):
+        call_command("archive_page_views", until="2023-03")
+        domain.refresh_from_db()
+
+        assert PageUrl.objects.lookup(domain.pk, "https://example.com").count() == 0
+        assert PageView.objects.get_views_for_url(
+            domain.pk, "https://example.com", with_robots=True
+        ) == {"data": [], "days": []}
+
+
+def test_get_day_starts(settings):
+    settings.TIME_ZONE = "Europe/Vienna"
+
+    day_starts = get_day_starts(date(2023, 3, 1))
+
+    assert len(day_starts) == 32
+    assert day_starts[0] == 0
+    # The clocks were set forward on 2023-03-26
+    day_lengths = list(np.diff(day_starts))
+    assert day_lengths[25] == 23 * 3600
+    assert day_lengths[:25] + day_lengths[26:] == [24 * 3600] * 30
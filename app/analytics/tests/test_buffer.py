@@ -0,0 +1,117 @@
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from analytics.buffer import PageViewBuffer
+from analytics.models import PageView
+from analytics.tests.factories import TEST_METADATA, DomainFactory
+from analytics.tests.test_views import TEST_REQUEST_META
+from django.urls import reverse
+from freezegun import freeze_time
+from rest_framework import status
+
+
+def build_page_view(domain) -> PageView:
+    return PageView(
+        domain=domain,
+        url=f"{domain.base_url}/new-post",
+        ip="127.0.0.1",
+        metadata=TEST_METADATA,
+    )
+
+
+class TestPageViewBuffer:
+    pytestmark = pytest.mark.django_db
+
+    def test__flush__writes_in_batches(self):
+        domain = DomainFactory.create()
+        buffer = PageViewBuffer(max_size=10, batch_size=3, flush_interval=1)
+        for _ in range(7):
+            assert buffer.put(build_page_view(domain))
+        assert buffer.depth == 7
+
+        assert buffer.flush() == 7
+        assert buffer.depth == 0
+        assert PageView.objects.filter(domain=domain).count() == 7
+        assert buffer.get_stats()["written"] == 7
+
+    def test__put__full_buffer_drops(self):
+        domain = DomainFactory.create()
+        buffer = PageViewBuffer(max_size=2, batch_size=10, flush_interval=1)
+        assert buffer.put(build_page_view(domain))
+        assert buffer.put(build_page_view(domain))
+        assert not buffer.put(build_page_view(domain))
+
+        stats = buffer.get_stats()
+        assert stats["depth"] == 2
+        assert stats["dropped"] == 1
+
+    def test__flush__keeps_the_time_of_the_page_view(self):
+        domain = DomainFactory.create()
+        buffer = PageViewBuffer(max_size=10, batch_size=10, flush_interval=1)
+        with freeze_time("2023-01-31 23:59"):
+            buffer.put(build_page_view(domain))
+
+        with freeze_time("2023-02-01 00:01"):
+            buffer.flush()
+
+        assert PageView.objects.get(domain=domain).timestamp == datetime(
+            2023, 1, 31, 23, 59, tzinfo=timezone.utc
+        )
+
+    def test__stop__flushes_pending_page_views(self):
+        domain = DomainFactory.create()
+        buffer = PageViewBuffer(max_size=10, batch_size=10, flush_interval=60)
+        buffer.put(build_page_view(domain))
+        buffer.stop()
+        assert PageView.objects.filter(domain=domain).count() == 1
+
+
+def test_page_view_buffer__flusher_survives_errors(monkeypatch):
+    buffer = PageViewBuffer(max_size=10, batch_size=1, flush_interval=0.01)
+    written = threading.Event()
+    batches = []
+
+    def write(batch):
+        batches.append(batch)
+        if len(batches) == 1:
+            raise ValueError("Broken page view")
+        written.set()
+        return len(batch)
+
+    monkeypatch.setattr(buffer, "_write", write)
+    buffer.put("first")
+    buffer.put("second")
+    buffer.start()
+
+    assert written.wait(5)
+    buffer.stop()
+    assert batches == [["first"], ["second"]]
+    assert buffer.get_stats()["failed"] == 1
+
+
+@pytest.mark.django_db
+def test_track_view__buffered(client, settings, monkeypatch):
+    settings.PAGE_VIEW_BUFFER_ENABLED = True
+    buffer = PageViewBuffer(max_size=1, batch_size=10, flush_interval=1)
+    monkeypatch.setattr("analytics.views.get_page_view_buffer", lambda: buffer)
+    domain = DomainFactory.create()
+    data = {
+        "url": f"{domain.base_url}/new-post",
+        "domain_id": str(domain.id),
+        "request_meta": TEST_REQUEST_META,
+    }
+
+    response = client.post(
+        reverse("track_view"), data=data, content_type="application/json"
+    )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    assert PageView.objects.filter(domain=domain).count() == 0
+
+    response = client.post(
+        reverse("track_view"), data=data, content_type="application/json"
+    )
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    buffer.flush()
+    assert PageView.objects.filter(domain=domain).count() == 1
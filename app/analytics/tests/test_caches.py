@@ -0,0 +1,138 @@
+import os
+import shutil
+
+import pytest
+from analytics.caches import LRUCache
+from analytics.geoip import CachedGeoIP
+from analytics.models import Domain
+from analytics.tests.factories import DomainFactory, PageViewFactory
+from django.conf import settings
+
+
+def test_lru_cache__evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_lru_cache__stats():
+    cache = LRUCache(maxsize=10)
+    assert cache.get_or_set("a", lambda: None) is None
+    assert cache.get_or_set("a", lambda: "computed again") is None
+    assert cache.get("b") is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["size"] == 1
+    assert stats["hit_rate"] == 0.3333
+
+
+def test_lru_cache__disabled():
+    cache = LRUCache(maxsize=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_cache__ttl(freezer):
+    cache = LRUCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    freezer.tick(61)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cached_geoip__reload_on_replaced_file(tmp_path):
+    source = os.path.join(settings.GEOIP_PATH, "GeoLite2-Country.mmdb")
+    path = tmp_path / "GeoLite2-Country.mmdb"
+    shutil.copy(source, path)
+    geo_ip = CachedGeoIP(path=str(path), cache_size=10, reload_check_interval=0)
+
+    geo_ip.country_name("127.0.0.1")
+    geo_ip.country_name("127.0.0.1")
+    assert geo_ip.get_stats()["hits"] == 1
+
+    replacement = tmp_path / "new.mmdb"
+    shutil.copy(source, replacement)
+    os.replace(replacement, path)
+    geo_ip.country_name("127.0.0.1")
+
+    stats = geo_ip.get_stats()
+    assert stats["reloads"] == 1
+    assert stats["size"] == 1
+
+
+@pytest.mark.django_db
+class TestCachedAnalytics:
+    def test__cached_until_page_views_are_tracked(
+        self, django_assert_num_queries, execute_on_commit, settings
+    ):
+        settings.DASHBOARD_CACHE_BUMP_INTERVAL = 0
+        domain = DomainFactory.create()
+        with execute_on_commit():
+            PageViewFactory.create(domain=domain)
+        assert domain.get_page_views_data()["data"] == [1]
+
+        # Only the data generation of the domain is queried
+        with django_assert_num_queries(1):
+            assert domain.get_page_views_data()["data"] == [1]
+
+        with execute_on_commit():
+            PageViewFactory.create(domain=domain)
+        assert domain.get_page_views_data()["data"] == [2]
+        assert domain.get_page_views_data(with_robots=True)["data"] == [2]
+
+    def test__bump_interval(self, settings, execute_on_commit, trailing_bumps):
+        settings.DASHBOARD_CACHE_BUMP_INTERVAL = 60
+        domain = DomainFactory.create()
+        with execute_on_commit():
+            PageViewFactory.create(domain=domain)
+            PageViewFactory.create(domain=domain)
+        domain.refresh_from_db()
+        assert domain.data_generation == 1
+        # The skipped bump is caught up once the interval is over
+        assert list(trailing_bumps) == [domain.id]
+
+    def test__bumped_after_commit(self, execute_on_commit):
+        domain = DomainFactory.create()
+        with execute_on_commit() as callbacks:
+            PageViewFactory.create(domain=domain)
+            domain.refresh_from_db()
+            assert domain.data_generation == 0
+        assert callbacks
+        domain.refresh_from_db()
+        assert domain.data_generation == 1
+
+    def test__domain_manager(self, django_assert_num_queries):
+        domain = DomainFactory.create()
+        PageViewFactory.create(domain=domain)
+        Domain.objects.get_monthly_average_page_views()
+
+        with django_assert_num_queries(1):
+            data = Domain.objects.get_monthly_average_page_views()
+        assert data == [{"domain": domain.base_url, "with_robots": 1, "no_robots": 1}]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bump_data_generation__trailing_bump(settings, trailing_bumps):
+    settings.DASHBOARD_CACHE_BUMP_INTERVAL = 0.1
+    domain = DomainFactory.create()
+    Domain.objects.bump_data_generation([domain.id])
+    Domain.objects.bump_data_generation([domain.id])
+    Domain.objects.bump_data_generation([domain.id])
+    domain.refresh_from_db()
+    assert domain.data_generation == 1
+
+    trailing_bumps[domain.id].join()
+    domain.refresh_from_db()
+    assert domain.data_generation == 2
+    assert trailing_bumps == {}
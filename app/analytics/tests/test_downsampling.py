@@ -0,0 +1,108 @@
+from datetime import date
+
+import pytest
+from analytics.archives import archive_month
+from analytics.models import (
+    PageView,
+    PageViewDimensionRollup,
+    PageViewUrlRollup,
+    VisitorSketch,
+)
+from analytics.tests.factories import DomainFactory, PageViewFactory
+from analytics.tests.test_archives import CHROME_METADATA, ROBOT_METADATA, get_analytics
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from freezegun import freeze_time
+
+
+@pytest.fixture()
+def domain(settings, tmp_path):
+    settings.PAGE_VIEW_ARCHIVE_PATH = str(tmp_path)
+    settings.DASHBOARD_CACHE_ENABLED = False
+    domain = DomainFactory.create()
+    for timestamp, amount in [
+        ("2023-01-01 00:30", 2),
+        ("2023-01-31 23:30", 1),
+        ("2023-02-05 12:00", 3),
+        ("2023-03-02 12:00", 2),
+        ("2023-03-14 12:00", 1),
+    ]:
+        with freeze_time(timestamp):
+            PageViewFactory.create_batch(amount, domain=domain)
+            PageViewFactory.create(domain=domain, metadata=CHROME_METADATA)
+            PageViewFactory.create(domain=domain, metadata=ROBOT_METADATA)
+    PageViewFactory.create(domain=DomainFactory.create())
+    VisitorSketch.objects.merge_pending()
+    return domain
+
+
+@pytest.mark.django_db
+@freeze_time("2023-03-15")
+class TestDownsample:
+    def test__deletes_page_views_in_batches(self, domain):
+        amount = PageView.objects.downsample(domain.pk, date(2023, 3, 1), batch_size=2)
+
+        domain.refresh_from_db()
+        assert amount == 12
+        assert domain.downsampled_until == date(2023, 3, 1)
+        assert domain.page_views.count() == 7
+        assert PageView.objects.exclude(domain=domain).count() == 1
+        assert PageViewUrlRollup.objects.filter(
+            domain=domain, day__lt=date(2023, 3, 1)
+        ).exists()
+
+    def test__analytics_read_the_rollups(self, domain):
+        expected = get_analytics(domain)
+        visitors = domain.get_unique_visitors()
+
+        call_command("downsample_page_views", after_days=14, pause=0)
+        domain.refresh_from_db()
+
+        assert domain.downsampled_until == date(2023, 3, 1)
+        assert get_analytics(domain) == expected
+        assert domain.get_unique_visitors() == visitors
+
+    def test__repairs_rollups_first(self, domain):
+        PageViewDimensionRollup.objects.filter(
+            domain=domain, day=date(2023, 2, 5)
+        ).delete()
+
+        PageView.objects.downsample(domain.pk, date(2023, 3, 1))
+
+        assert PageViewDimensionRollup.objects.get_daily_totals(
+            domain.pk, date(2023, 2, 5), date(2023, 2, 5)
+        ) == {(date(2023, 2, 5), False): 4, (date(2023, 2, 5), True): 1}
+
+    def test__rebuilds_and_checks_keep_downsampled_days(self, domain):
+        PageView.objects.downsample(domain.pk, date(2023, 3, 1))
+        domain.refresh_from_db()
+        totals = PageViewUrlRollup.objects.get_daily_totals(domain.pk)
+        sketches = VisitorSketch.objects.filter(domain=domain).count()
+
+        PageView.objects.rebuild_aggregates(
+            domain.pk, date(2023, 1, 1), date(2023, 3, 15)
+        )
+        call_command("check_rollups", domain=domain.pk)
+        call_command("check_rollups", domain=domain.pk, repair=True)
+
+        assert PageViewUrlRollup.objects.get_daily_totals(domain.pk) == totals
+        assert VisitorSketch.objects.filter(domain=domain).count() == sketches
+
+    def test__archive_skips_downsampled_months(self, domain):
+        PageView.objects.downsample(domain.pk, date(2023, 1, 15))
+
+        with pytest.raises(ValueError):
+            archive_month(domain.pk, date(2023, 1, 1))
+        call_command("archive_page_views", until="2023-03")
+        domain.refresh_from_db()
+
+        assert domain.archived_until == date(2023, 3, 1)
+        # The rollups of the downsampled month stay
+        assert PageViewDimensionRollup.objects.filter(
+            domain=domain, day__lt=date(2023, 2, 1)
+        ).exists()
+        assert get_analytics(domain)["all", True]["total"] == 19
+
+    def test__command_requires_an_age(self, domain):
+        with pytest.raises(CommandError):
+            call_command("downsample_page_views")
@@ -0,0 +1,122 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date
+
+import pytest
+from analytics.exports import EXPORT_COLUMNS, export_page_views
+from analytics.models import PageView
+from analytics.tests.factories import DomainFactory, PageViewFactory
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from freezegun import freeze_time
+from rest_framework import status
+
+
+@pytest.fixture()
+def domain(monkeypatch):
+    # Exports of several chunks
+    monkeypatch.setattr("analytics.exports.ROWS_PER_CHUNK", 2)
+    domain = DomainFactory.create()
+    with freeze_time("2023-01-10"):
+        PageViewFactory.create_batch(2, domain=domain)
+    with freeze_time("2023-02-10"):
+        PageViewFactory.create_batch(3, domain=domain)
+    PageViewFactory.create(domain=DomainFactory.create())
+    return domain
+
+
+def read_csv(content: bytes) -> list:
+    return list(csv.DictReader(io.StringIO(content.decode())))
+
+
+@pytest.mark.django_db
+class TestExportPageViews:
+    def test__csv(self, domain):
+        rows = read_csv(b"".join(export_page_views(domain.pk, chunk_size=2)))
+
+        assert len(rows) == 5
+        assert list(rows[0]) == EXPORT_COLUMNS
+        assert rows[0]["timestamp"].startswith("2023-01-10")
+        assert rows[0]["browser"] == "Mobile Safari"
+        assert rows[0]["country"] == "AT"
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5, 6])
+    def test__chunks(self, domain, chunk_size, django_assert_max_num_queries):
+        # The page views of a day share their timestamp, chunks continue after
+        # the id of the last row
+        expected_ids = sorted(
+            str(page_view_id)
+            for page_view_id in PageView.objects.filter(domain=domain).values_list(
+                "pk", flat=True
+            )
+        )
+        with django_assert_max_num_queries(4 + 5 // chunk_size + 1):
+            rows = read_csv(
+                b"".join(export_page_views(domain.pk, chunk_size=chunk_size))
+            )
+
+        assert sorted(row["id"] for row in rows) == expected_ids
+        assert [row["timestamp"] for row in rows] == sorted(
+            row["timestamp"] for row in rows
+        )
+
+    def test__ndjson__date_range(self, domain):
+        chunks = export_page_views(
+            domain.pk,
+            export_format="ndjson",
+            start_day=date(2023, 1, 1),
+            end_day=date(2023, 1, 31),
+        )
+        rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+
+        assert len(rows) == 2
+        assert rows[0]["is_robot"] is False
+
+    def test__gzip(self, domain):
+        content = b"".join(export_page_views(domain.pk, compress=True))
+        assert len(read_csv(gzip.decompress(content))) == 5
+
+    def test__empty(self):
+        content = b"".join(export_page_views(DomainFactory.create().pk))
+        assert content.decode().strip() == ",".join(EXPORT_COLUMNS)
+
+    def test__view(self, client, domain):
+        url = reverse("domain_page_views_export", kwargs={"pk": domain.pk})
+        response = client.get(url)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        superuser = User.objects.create_user(
+            username="superuser", password="Qwert1234", is_superuser=True
+        )
+        client.force_login(superuser)
+        response = client.get(url, data={"start": "2023-02-01", "gzip": "true"})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response["Content-Type"] == "application/gzip"
+        content = gzip.decompress(b"".join(response.streaming_content))
+        assert len(read_csv(content)) == 3
+
+        response = client.get(url, data={"format": "xml"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.parametrize(
+        "data", [{"start": "2023/01/01"}, {"end": "2023-02-30"}, {"end": "today"}]
+    )
+    def test__view__invalid_day(self, client, domain, data):
+        superuser = User.objects.create_user(
+            username="superuser", password="Qwert1234", is_superuser=True
+        )
+        client.force_login(superuser)
+        url = reverse("domain_page_views_export", kwargs={"pk": domain.pk})
+        response = client.get(url, data=data)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test__command(self, domain, tmp_path):
+        path = tmp_path / "export.ndjson"
+        call_command(
+            "export_page_views", str(domain.pk), format="ndjson", output=str(path)
+        )
+        assert len(path.read_text().splitlines()) == 5
@@ -0,0 +1,114 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from analytics.generator import (
+    COUNTRIES,
+    USER_AGENTS,
+    GeneratedDomain,
+    PageViewGenerator,
+    RowStream,
+    get_domain_id,
+    get_domain_page_views,
+    get_urls,
+)
+from analytics.models import (
+    Domain,
+    PageUrl,
+    PageView,
+    PageViewDimensionRollup,
+    PageViewUrlRollup,
+)
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+
+def get_generator(seed: int = 1) -> PageViewGenerator:
+    names = {name for _, *names in USER_AGENTS for name in names}
+    names |= {country for _, country in COUNTRIES}
+    dimension_ids = {
+        dimension: {name: index for index, name in enumerate(sorted(names))}
+        for dimension in ["browser", "os", "device", "country"]
+    }
+    urls = get_urls("https://example.com", 20)
+    domain = GeneratedDomain(
+        index=0,
+        domain_id=get_domain_id(seed, 0),
+        urls=urls,
+        page_url_ids=list(range(1, len(urls) + 1)),
+    )
+    return PageViewGenerator(seed, domain, date(2023, 1, 1), 31, dimension_ids)
+
+
+def test_get_rows_is_deterministic():
+    rows = list(get_generator().get_rows(0, 1000))
+
+    assert list(get_generator().get_rows(0, 1000)) == rows
+    assert list(get_generator().get_rows(1, 1000)) != rows
+    assert list(get_generator(seed=2).get_rows(0, 1000)) != rows
+    assert len(set(row.split("\t")[0] for row in rows)) == 1000
+    assert all(row.endswith("\n") and row.count("\t") == 10 for row in rows)
+
+
+def test_row_stream():
+    rows = list(get_generator().get_rows(0, 100))
+    stream = RowStream(iter(rows))
+
+    parts = []
+    while True:
+        part = stream.read(1000)
+        if not part:
+            break
+        assert len(part) <= 1000
+        parts.append(part)
+
+    assert b"".join(parts) == "".join(rows).encode()
+
+
+def test_get_domain_page_views():
+    amounts = get_domain_page_views(10, 10001)
+
+    assert sum(amounts) == 10001
+    assert amounts == sorted(amounts, reverse=True)
+    assert amounts[0] > 3 * amounts[9]
+
+
+@pytest.mark.django_db
+class TestGeneratePageViews:
+    def test__page_views_and_aggregates(self):
+        call_command(
+            "generate_page_views",
+            domains=3,
+            page_views=2000,
+            days=40,
+            start="2023-01-10",
+            urls=20,
+            seed=5,
+            chunk_size=300,
+        )
+
+        amounts = get_domain_page_views(3, 2000)
+        domains = Domain.objects.filter(
+            pk__in=[get_domain_id(5, index) for index in range(3)]
+        )
+        assert domains.count() == 3
+        start = timezone.make_aware(datetime(2023, 1, 10))
+        end = start + timedelta(days=40)
+        for index in range(3):
+            domain = domains.get(pk=get_domain_id(5, index))
+            page_views = PageView.objects.filter(domain=domain)
+            assert page_views.count() == amounts[index]
+            assert not page_views.exclude(timestamp__gte=start, timestamp__lt=end)
+            assert page_views.filter(is_robot=True).exists()
+            assert PageUrl.objects.filter(domain=domain).count() == 20
+            for rollups in [PageViewUrlRollup.objects, PageViewDimensionRollup.objects]:
+                assert rollups.get_differing_days(domain.pk) == []
+        assert domain.get_overview_analytics("all", True)["total"] == amounts[2]
+        assert "Germany" in domain.get_dimension_analytics("country")["labels"]
+
+    def test__same_seed_twice(self):
+        options = {"domains": 1, "page_views": 10, "days": 2, "urls": 2, "seed": 6}
+        call_command("generate_page_views", **options)
+
+        with pytest.raises(CommandError):
+            call_command("generate_page_views", **options)
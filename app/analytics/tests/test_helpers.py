@@ -1,5 +1,15 @@
+from datetime import date
+
 import pytest
-from analytics.helpers import transform_period_string_to_timedelta
+from analytics.helpers import (
+    classify_robot,
+    get_day_ranges,
+    get_user_agent_cache,
+    get_url_hash,
+    get_user_agent_families,
+    normalize_url,
+    transform_period_string_to_timedelta,
+)
 from django.utils import timezone
 
 
@@ -16,3 +26,64 @@ from django.utils import timezone
 )
 def test_transform_period_string_to_timedelta(period, expected_timedelta):
     assert transform_period_string_to_timedelta(period=period) == expected_timedelta
+
+
+def test_get_user_agent_families__cached():
+    user_agent_string = (
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 "
+        "(KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1"
+    )
+    cache = get_user_agent_cache()
+    cache.clear()
+    hits = cache.hits
+
+    expected_families = ("Mobile Safari", "iOS", "iPhone")
+    assert get_user_agent_families(user_agent_string) == expected_families
+    assert get_user_agent_families(user_agent_string) == expected_families
+    assert cache.hits == hits + 1
+
+
+@pytest.mark.parametrize(
+    "metadata, expected_is_robot",
+    [
+        ({"browser": "Mobile Safari", "device": "iPhone"}, False),
+        ({"browser": "AhrefsBot", "device": "Other"}, True),
+        ({"browser": "UptimeRobot", "device": "Other"}, True),
+        ({"browser": "Other", "device": "Spider"}, True),
+        ({}, False),
+    ],
+)
+def test_classify_robot(metadata, expected_is_robot):
+    assert classify_robot(metadata) == expected_is_robot
+
+
+@pytest.mark.parametrize(
+    "url, expected_url",
+    [
+        ("https://Example.com", "https://example.com/"),
+        ("HTTPS://example.com:443/post/#comments", "https://example.com/post/"),
+        (
+            "http://example.com:8000/post/?page=2",
+            "http://example.com:8000/post/?page=2",
+        ),
+        ("example.com/Post/", "example.com/Post/"),
+    ],
+)
+def test_normalize_url(url, expected_url):
+    assert normalize_url(url) == expected_url
+
+
+def test_get_url_hash():
+    url_hash = get_url_hash("https://example.com/")
+    assert url_hash == get_url_hash("https://example.com/")
+    assert url_hash != get_url_hash("https://example.com/post/")
+    assert -(2**63) <= url_hash < 2**63
+
+
+def test_get_day_ranges():
+    days = [date(2023, 1, 31), date(2023, 1, 2), date(2023, 2, 1), date(2023, 1, 3)]
+    assert get_day_ranges(days + [date(2023, 1, 2)]) == [
+        (date(2023, 1, 2), date(2023, 1, 3)),
+        (date(2023, 1, 31), date(2023, 2, 1)),
+    ]
+    assert get_day_ranges([]) == []
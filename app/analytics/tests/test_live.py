@@ -0,0 +1,179 @@
+import json
+import threading
+
+import pytest
+from analytics.live import (
+    LiveAggregator,
+    LiveTraffic,
+    LiveTrafficClient,
+    LiveWindow,
+)
+from analytics.models import PageView
+from analytics.tests.factories import DomainFactory, PageViewFactory
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+
+
+def test_live_window():
+    window = LiveWindow(seconds=3)
+    window.add(100, "https://example.com/a/", is_robot=False, now=100)
+    window.add(100, "https://example.com/a/", is_robot=True, now=100)
+    window.add(101, "https://example.com/b/", is_robot=False, now=101)
+    # Outside of the window
+    window.add(98, "https://example.com/c/", is_robot=False, now=101)
+    window.add(105, "https://example.com/c/", is_robot=False, now=101)
+
+    assert window.get_data(now=101, top_urls=10) == {
+        "now": 101,
+        "total": 2,
+        "robots": 1,
+        "page_views": [0, 1, 1],
+        "robot_page_views": [0, 1, 0],
+        "top_urls": [("https://example.com/a/", 1), ("https://example.com/b/", 1)],
+    }
+
+    # The slot of second 100 is reused for second 103
+    window.add(103, "https://example.com/b/", is_robot=False, now=103)
+    data = window.get_data(now=103, top_urls=1)
+    assert data["page_views"] == [1, 0, 1]
+    assert data["top_urls"] == [("https://example.com/b/", 2)]
+
+
+def test_live_traffic__prune():
+    traffic = LiveTraffic(seconds=60, top_urls=10)
+    traffic.add("a", 100, "https://example.com/", False, now=100)
+    traffic.add("b", 150, "https://example.com/", False, now=150)
+
+    traffic.prune(now=165)
+
+    assert list(traffic.windows) == ["b"]
+    assert traffic.get_data("a", now=165)["total"] == 0
+
+
+@pytest.fixture(autouse=True)
+def live_traffic_client(monkeypatch):
+    # Every test gets a client for its own settings
+    monkeypatch.setattr("analytics.live._client", None)
+
+
+@pytest.fixture()
+def aggregator(tmp_path):
+    aggregator = LiveAggregator(
+        str(tmp_path / "live.sock"), LiveTraffic(seconds=60, top_urls=10)
+    )
+    aggregator.bind()
+    yield aggregator
+    aggregator.socket.close()
+
+
+def receive(aggregator: LiveAggregator) -> None:
+    aggregator.handle(*aggregator.socket.recvfrom(1 << 20))
+
+
+@pytest.mark.django_db
+def test_live_traffic_client(aggregator):
+    client = LiveTrafficClient(aggregator.path, timeout=5)
+    domain = DomainFactory.create()
+    page_views = PageViewFactory.create_batch(2, domain=domain)
+    page_views[0].url = "HTTPS://Example.com#top"
+
+    client.send_page_views(page_views)
+    receive(aggregator)
+    thread = threading.Thread(target=receive, args=[aggregator])
+    thread.start()
+    window = client.get_window(domain.pk)
+    thread.join()
+
+    assert window["total"] == 2
+    assert ("https://example.com/", 1) in map(tuple, window["top_urls"])
+    assert client.get_stats() == {"sent": 2, "dropped": 0}
+
+
+@pytest.mark.django_db
+def test_live_traffic_client__split_messages(monkeypatch):
+    monkeypatch.setattr("analytics.live.MAX_MESSAGE_SIZE", 200)
+    client = LiveTrafficClient("unused", timeout=1)
+    page_views = PageViewFactory.create_batch(5, url="https://example.com/a/")
+
+    messages = list(client.get_messages(page_views))
+
+    assert len(messages) > 1
+    assert sum(len(lines) for lines in messages) == 5
+
+
+@pytest.mark.django_db
+def test_live_traffic_client__aggregator_not_running(tmp_path):
+    client = LiveTrafficClient(str(tmp_path / "live.sock"), timeout=0.1)
+
+    client.send_page_views(PageViewFactory.create_batch(3))
+
+    assert client.get_stats() == {"sent": 0, "dropped": 3}
+    assert client.get_window("a") is None
+
+
+@pytest.mark.django_db
+def test_tracked_page_views_are_sent_on_commit(
+    settings, aggregator, django_capture_on_commit_callbacks
+):
+    settings.LIVE_TRAFFIC_ENABLED = True
+    settings.LIVE_TRAFFIC_SOCKET = aggregator.path
+    domain = DomainFactory.create()
+    page_views = PageViewFactory.build_batch(2, domain=domain, timestamp=timezone.now())
+
+    # Only the callbacks of update_aggregates run, others would fill the
+    # in-process id caches with rows that are rolled back after the test
+    with django_capture_on_commit_callbacks(execute=True):
+        PageView.objects.update_aggregates(page_views)
+    receive(aggregator)
+
+    now = int(page_views[0].timestamp.timestamp())
+    assert aggregator.traffic.get_data(str(domain.pk), now)["total"] == 2
+
+
+@pytest.mark.django_db
+class TestDomainLiveTraffic:
+    @pytest.fixture()
+    def test_domain(self, client, settings):
+        settings.LIVE_TRAFFIC_INTERVAL = 0
+        settings.LIVE_TRAFFIC_STREAM_SECONDS = 0
+        superuser = User.objects.create_user(
+            username="superuser", password="Qwert1234", is_superuser=True
+        )
+        client.force_login(superuser)
+        return DomainFactory.create()
+
+    def test__page(self, client, test_domain, settings):
+        settings.LIVE_TRAFFIC_ENABLED = True
+        url = reverse("domain_live_traffic", kwargs={"pk": test_domain.pk})
+
+        response = client.get(url)
+
+        assert response.status_code == 200
+        assert (
+            reverse("domain_live_traffic_stream", kwargs={"pk": test_domain.pk})
+            in response.content.decode()
+        )
+
+    def test__stream(self, client, test_domain, settings, aggregator):
+        settings.LIVE_TRAFFIC_SOCKET = aggregator.path
+        url = reverse("domain_live_traffic_stream", kwargs={"pk": test_domain.pk})
+
+        response = client.get(url)
+        thread = threading.Thread(target=receive, args=[aggregator])
+        thread.start()
+        content = b"".join(response.streaming_content).decode()
+        thread.join()
+
+        assert response["Content-Type"] == "text/event-stream"
+        retry, event, _ = content.split("\n\n")
+        assert retry == "retry: 0"
+        assert json.loads(event.removeprefix("data: "))["total"] == 0
+
+    def test__stream__aggregator_not_running(self, client, test_domain, settings):
+        settings.LIVE_TRAFFIC_SOCKET = "/nonexistent/live.sock"
+        url = reverse("domain_live_traffic_stream", kwargs={"pk": test_domain.pk})
+
+        content = b"".join(client.get(url).streaming_content).decode()
+
+        assert "event: unavailable" in content
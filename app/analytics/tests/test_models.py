@@ -1,9 +1,29 @@
+import math
+from datetime import date, timedelta
+from unittest.mock import ANY
+
 import pytest
-from analytics.models import Domain
-from analytics.tests.factories import DomainFactory, PageViewFactory
+from analytics.helpers import classify_robot
+from analytics.managers import PageUrlManager, PageViewManager
+from analytics.models import (
+    Domain,
+    PageUrlPeriodTotal,
+    PageView,
+    PageViewDimensionRollup,
+    PageViewMonthlyTotal,
+    PageViewUrlRollup,
+    PendingPageView,
+    PendingVisitor,
+    VisitorSketch,
+)
+from analytics.sketches import URL_PRECISION
+from analytics.tests.factories import TEST_METADATA, DomainFactory, PageViewFactory
 from django.conf import settings
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase
+from django.utils import timezone
+from freezegun import freeze_time
 
 
 class TestAnalytics(TestCase):
@@ -170,3 +190,605 @@ def test__domain_manager__get_monthly_average_page_views():
         }
     ]
     assert Domain.objects.get_monthly_average_page_views() == expected_data
+
+
+@pytest.mark.django_db
+def test__domain_manager__get_monthly_average_page_views__queries(
+    settings, django_assert_max_num_queries
+):
+    settings.DASHBOARD_CACHE_ENABLED = False
+    domains = DomainFactory.create_batch(2)
+    PageViewFactory.create_batch(3, domain=domains[0])
+    PageViewFactory.create(domain=domains[0], is_robot=True)
+    # Including storing the totals of the closed months of all domains
+    with django_assert_max_num_queries(10):
+        data = Domain.objects.get_monthly_average_page_views()
+    assert {row["domain"]: row["with_robots"] for row in data} == {
+        domains[0].base_url: 4,
+        domains[1].base_url: 0,
+    }
+    for domain in domains:
+        assert {
+            "domain": domain.base_url,
+            "with_robots": domain.get_monthly_average_page_views(with_robots=True),
+            "no_robots": domain.get_monthly_average_page_views(with_robots=False),
+        } in data
+
+    DomainFactory.create_batch(5)
+    with django_assert_max_num_queries(10):
+        assert len(Domain.objects.get_monthly_average_page_views()) == 7
+    with django_assert_max_num_queries(4):
+        assert len(Domain.objects.get_monthly_average_page_views()) == 7
+
+
+@pytest.mark.django_db
+def test_classify_robots_command():
+    domain = DomainFactory.create()
+    robot_metadata = {
+        "browser": "AhrefsBot",
+        "os": "Other",
+        "device": "Other",
+        "country": "Unknown",
+    }
+    PageViewFactory.create_batch(
+        3, domain=domain, metadata=robot_metadata, is_robot=False
+    )
+    PageViewFactory.create_batch(2, domain=domain, is_robot=True)
+
+    PageView.objects.update(metadata=None)
+    PageUrlPeriodTotal.objects.rebuild(domain.pk)
+
+    call_command("classify_robots", batch_size=2)
+
+    domain.refresh_from_db()
+    assert PageView.objects.filter(domain=domain, is_robot=True).count() == 3
+    assert domain.get_page_views_data(with_robots=False)["data"] == [2]
+    for period in ["all", "1"]:
+        data = domain.get_page_views_by_url(period)["data"]
+        assert sum(row["count"] for row in data) == 2
+    assert PageViewUrlRollup.objects.get_differing_days(domain.pk) == []
+
+
+@pytest.mark.django_db
+def test_classify_robots_command__interrupted(monkeypatch):
+    domain = DomainFactory.create()
+    robot_metadata = {**TEST_METADATA, "browser": "AhrefsBot"}
+    for day in ["2023-01-10", "2023-01-11", "2023-01-12"]:
+        with freeze_time(day):
+            PageViewFactory.create(
+                domain=domain,
+                url=f"{domain.base_url}/{day}/",
+                metadata=robot_metadata,
+                is_robot=False,
+            )
+            PageViewFactory.create(domain=domain, url=f"{domain.base_url}/{day}/")
+    PageView.objects.update(metadata=None)
+    calls = []
+
+    def interrupt_fifth_page_view(metadata):
+        calls.append(metadata)
+        if len(calls) == 5:
+            raise KeyboardInterrupt
+        return classify_robot(metadata)
+
+    monkeypatch.setattr(
+        "analytics.management.commands.classify_robots.classify_robot",
+        interrupt_fifth_page_view,
+    )
+    with pytest.raises(KeyboardInterrupt):
+        call_command("classify_robots", batch_size=2)
+
+    # The batches before the interruption are counted as they are classified
+    assert PageView.objects.filter(domain=domain, is_robot=True).exists()
+    assert PageViewUrlRollup.objects.get_differing_days(domain.pk) == []
+    assert PageViewDimensionRollup.objects.get_differing_days(domain.pk) == []
+    monkeypatch.undo()
+
+    call_command("classify_robots", batch_size=2)
+
+    assert PageView.objects.filter(domain=domain, is_robot=True).count() == 3
+    assert PageViewUrlRollup.objects.get_differing_days(domain.pk) == []
+    assert PageViewDimensionRollup.objects.get_differing_days(domain.pk) == []
+    assert domain.get_page_views_by_url()["data"] == [
+        {"url": f"{domain.base_url}/{day}/", "count": 1}
+        for day in ["2023-01-12", "2023-01-11", "2023-01-10"]
+    ]
+    total_visitors, _ = VisitorSketch.objects.get_monthly_visitors(domain.pk)
+    assert total_visitors == 3
+
+
+@pytest.mark.django_db
+def test_migrate_page_view_dimensions_command():
+    domain = DomainFactory.create()
+    PageViewFactory.create_batch(
+        3, domain=domain, browser_id=None, os_id=None, device_id=None, country_id=None
+    )
+
+    call_command("migrate_page_view_dimensions", batch_size=2)
+
+    assert not PageView.objects.filter(browser__isnull=True).exists()
+    assert not PageView.objects.filter(metadata__isnull=False).exists()
+    assert domain.get_browser_analytics() == {
+        "data": [100],
+        "colors": ANY,
+        "labels": ["Mobile Safari"],
+    }
+
+
+@pytest.mark.django_db
+def test_migrate_page_view_dimensions_command__frozen_month():
+    domain = DomainFactory.create()
+    for day in ["2023-01-10", "2023-02-11"]:
+        with freeze_time(day):
+            PageViewFactory.create(
+                domain=domain, browser_id=None, os_id=None, device_id=None
+            )
+    PageViewMonthlyTotal.objects.freeze([domain.pk])
+
+    call_command("migrate_page_view_dimensions", batch_size=1)
+
+    assert PageViewDimensionRollup.objects.get_differing_days(domain.pk) == []
+    PageViewMonthlyTotal.objects.freeze([domain.pk])
+    assert PageViewMonthlyTotal.objects.get_monthly_page_views([domain.pk]) == {
+        (domain.pk, date(2023, 1, 1), False): 1,
+        (domain.pk, date(2023, 2, 1), False): 1,
+    }
+
+
+@pytest.mark.django_db
+def test_migrate_page_view_dimensions_command__interrupted(monkeypatch):
+    domain = DomainFactory.create()
+    for day in ["2023-01-10", "2023-01-11", "2023-01-12"]:
+        with freeze_time(day):
+            PageViewFactory.create(
+                domain=domain, browser_id=None, os_id=None, device_id=None
+            )
+    get_dimension_ids = PageViewManager.get_dimension_ids
+    calls = []
+
+    def interrupt_third_page_view(metadata):
+        calls.append(metadata)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return get_dimension_ids(metadata)
+
+    monkeypatch.setattr(
+        PageViewManager, "get_dimension_ids", staticmethod(interrupt_third_page_view)
+    )
+    with pytest.raises(KeyboardInterrupt):
+        call_command("migrate_page_view_dimensions", batch_size=2)
+    monkeypatch.undo()
+
+    call_command("migrate_page_view_dimensions", batch_size=2)
+
+    assert PageViewDimensionRollup.objects.get_differing_days(domain.pk) == []
+
+
+@pytest.mark.django_db
+def test_migrate_page_urls_command():
+    domain = DomainFactory.create()
+    PageViewFactory.create_batch(
+        3, domain=domain, url=f"https://{domain.base_url}/post/", page_url_id=None
+    )
+    PageViewFactory.create(
+        domain=domain, url=f"HTTPS://{domain.base_url}:443/post/#top", page_url_id=None
+    )
+    assert not PageViewUrlRollup.objects.filter(domain=domain).exists()
+
+    call_command("migrate_page_urls", batch_size=2)
+
+    assert not PageView.objects.filter(page_url__isnull=True).exists()
+    assert domain.get_page_views_by_url()["data"] == [
+        {"url": f"https://{domain.base_url}/post/", "count": 4}
+    ]
+
+
+@pytest.mark.django_db
+def test_migrate_page_urls_command__period_totals():
+    domain = DomainFactory.create()
+    PageUrlPeriodTotal.objects.rebuild(domain.pk)
+    PageViewFactory.create_batch(
+        3, domain=domain, url=f"https://{domain.base_url}/post/", page_url_id=None
+    )
+    with freeze_time(timezone.now() - timedelta(days=60)):
+        PageViewFactory.create(
+            domain=domain, url=f"https://{domain.base_url}/post/", page_url_id=None
+        )
+
+    call_command("migrate_page_urls", batch_size=2)
+
+    for period, count in [("all", 4), ("1", 3), ("3", 4)]:
+        assert domain.get_page_views_by_url(period)["data"] == [
+            {"url": f"https://{domain.base_url}/post/", "count": count}
+        ]
+
+
+@pytest.mark.django_db
+def test_migrate_page_urls_command__interrupted(monkeypatch):
+    domain = DomainFactory.create()
+    for day in ["2023-01-10", "2023-01-11", "2023-01-12"]:
+        with freeze_time(day):
+            PageViewFactory.create(
+                domain=domain, url=f"{domain.base_url}/{day}/", page_url_id=None
+            )
+    get_id = PageUrlManager.get_id
+    calls = []
+
+    def interrupt_third_page_view(self, domain_id, url):
+        calls.append(url)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return get_id(self, domain_id, url)
+
+    monkeypatch.setattr(PageUrlManager, "get_id", interrupt_third_page_view)
+    with pytest.raises(KeyboardInterrupt):
+        call_command("migrate_page_urls", batch_size=2)
+    monkeypatch.undo()
+
+    call_command("migrate_page_urls", batch_size=2)
+
+    assert PageViewUrlRollup.objects.get_differing_days(domain.pk) == []
+    assert domain.get_page_views_by_url()["data"] == [
+        {"url": f"{domain.base_url}/{day}/", "count": 1}
+        for day in ["2023-01-12", "2023-01-11", "2023-01-10"]
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "period, with_period_totals", [("all", False), ("1", False), ("1", True)]
+)
+def test_get_page_views_by_url__pages(settings, period, with_period_totals):
+    settings.DASHBOARD_CACHE_ENABLED = False
+    settings.PAGE_VIEWS_BY_URL_PAGE_SIZE = 2
+    domain = DomainFactory.create()
+    if with_period_totals:
+        call_command("update_period_totals", domain=domain.pk)
+    for amount, path in [(3, "a"), (2, "b"), (2, "c"), (1, "d")]:
+        PageViewFactory.create_batch(
+            amount, domain=domain, url=f"{domain.base_url}/{path}/"
+        )
+    PageViewFactory.create(domain=domain, url=f"{domain.base_url}/e/", is_robot=True)
+    domain.refresh_from_db()
+    assert domain.has_period_totals(timedelta(days=30)) == with_period_totals
+
+    first_page = domain.get_page_views_by_url(period=period, limit=10)
+    assert [row["url"][-2] for row in first_page["data"]] == ["a", "c"]
+    assert first_page["next"] == (2, f"{domain.base_url}/c/")
+
+    second_page = domain.get_page_views_by_url(period=period, after=first_page["next"])
+    assert [row["url"][-2] for row in second_page["data"]] == ["b", "d"]
+    assert second_page["next"] is None
+
+    with_robots = domain.get_page_views_by_url(
+        period=period, with_robots=True, after=(2, f"{domain.base_url}/b/")
+    )
+    assert [row["url"][-2] for row in with_robots["data"]] == ["e", "d"]
+
+
+@pytest.mark.django_db
+def test_update_period_totals_command(settings):
+    settings.DASHBOARD_CACHE_ENABLED = False
+    domain = DomainFactory.create()
+    for day, amount in [("2023-01-10", 3), ("2023-02-05", 2), ("2023-02-20", 1)]:
+        with freeze_time(day):
+            PageViewFactory.create_batch(
+                amount, domain=domain, url=f"{domain.base_url}/{day}/"
+            )
+
+    def get_period_totals() -> dict:
+        return {
+            (total.url[-6:-1], total.days): total.total_views
+            for total in PageUrlPeriodTotal.objects.filter(
+                domain=domain, total_views__gt=0
+            )
+        }
+
+    with freeze_time("2023-02-20"):
+        call_command("update_period_totals")
+        # Page views tracked afterwards are added at ingest
+        PageViewFactory.create(domain=domain, url=f"{domain.base_url}/2023-02-20/")
+        PageViewFactory.create(domain=domain, is_robot=True)
+    assert get_period_totals() == {
+        ("01-10", 90): 3,
+        ("01-10", 180): 3,
+        ("01-10", 365): 3,
+        ("02-05", 30): 2,
+        ("02-05", 90): 2,
+        ("02-05", 180): 2,
+        ("02-05", 365): 2,
+        ("02-20", 30): 2,
+        ("02-20", 90): 2,
+        ("02-20", 180): 2,
+        ("02-20", 365): 2,
+    }
+
+    with freeze_time("2023-03-10"):
+        call_command("update_period_totals")
+        domain.refresh_from_db()
+        assert domain.period_totals_day == date(2023, 3, 10)
+        assert domain.get_page_views_by_url(period="1")["data"] == [
+            {"url": f"{domain.base_url}/2023-02-20/", "count": 2}
+        ]
+    expected_totals = {
+        ("01-10", 90): 3,
+        ("01-10", 180): 3,
+        ("01-10", 365): 3,
+        ("02-05", 90): 2,
+        ("02-05", 180): 2,
+        ("02-05", 365): 2,
+        ("02-20", 30): 2,
+        ("02-20", 90): 2,
+        ("02-20", 180): 2,
+        ("02-20", 365): 2,
+    }
+    assert get_period_totals() == expected_totals
+
+    with freeze_time("2023-03-10"):
+        call_command("update_period_totals", rebuild=True)
+    assert get_period_totals() == expected_totals
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("with_user_agent", [False, True])
+def test_get_unique_visitors(settings, with_user_agent):
+    settings.DASHBOARD_CACHE_ENABLED = False
+    settings.VISITOR_SKETCH_USER_AGENT = with_user_agent
+    domain = DomainFactory.create()
+    post_url = f"{domain.base_url}/post/"
+    with freeze_time("2023-01-10"):
+        for index in range(40):
+            PageViewFactory.create_batch(2, domain=domain, ip=f"10.0.0.{index}")
+        PageViewFactory.create(domain=domain, ip="10.0.1.1", is_robot=True)
+    with freeze_time("2023-02-10"):
+        for index in range(30, 60):
+            PageViewFactory.create(domain=domain, ip=f"10.0.0.{index}", url=post_url)
+
+    def get_exact_count(page_views) -> int:
+        return page_views.filter(is_robot=False).values("ip").distinct().count()
+
+    # Three times the standard error of the url sketches
+    error_bound = 3 * 1.04 / math.sqrt(2**URL_PRECISION)
+    visitors = domain.get_unique_visitors()
+    assert get_exact_count(domain.page_views) == 60
+    assert visitors["total"] == pytest.approx(60, rel=error_bound)
+    assert visitors["months"] == ["2023-01", "2023-02"]
+    assert visitors["data"] == pytest.approx([40, 30], rel=error_bound)
+    assert domain.get_unique_visitors(url=post_url)["total"] == pytest.approx(
+        get_exact_count(domain.page_views.filter(page_url__url=post_url)),
+        rel=error_bound,
+    )
+
+    # The visitors of every page view are pending until they are merged, which
+    # does not change the estimates
+    assert PendingVisitor.objects.count() == 110
+    call_command("merge_visitor_sketches", once=True)
+    assert not PendingVisitor.objects.exists()
+    assert domain.get_unique_visitors() == visitors
+
+    def get_sketches() -> dict:
+        rows = VisitorSketch.objects.values_list("day", "page_url", "registers")
+        return {(day, page_url): bytes(registers) for day, page_url, registers in rows}
+
+    sketches = get_sketches()
+    PageView.objects.rebuild_aggregates(domain.pk, date(2023, 1, 1), date(2023, 2, 28))
+    assert get_sketches() == sketches
+
+    VisitorSketch.objects.all().delete()
+    call_command("rebuild_visitor_sketches", domain=domain.pk)
+    assert get_sketches() == sketches
+
+
+@pytest.mark.django_db(transaction=True)
+def test_merge_visitor_sketches__outside_of_transaction():
+    PageViewFactory.create()
+    assert PendingVisitor.objects.count() == 1
+    assert not VisitorSketch.objects.exists()
+
+    call_command("merge_visitor_sketches", once=True)
+    assert not PendingVisitor.objects.exists()
+    assert VisitorSketch.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_merge_page_views(settings):
+    settings.PAGE_VIEW_MERGE_ENABLED = True
+    settings.DASHBOARD_CACHE_ENABLED = False
+    domain = DomainFactory.create()
+    PageUrlPeriodTotal.objects.rebuild(domain.pk)
+    domain.refresh_from_db()
+    url = f"{domain.base_url}/post/"
+    PageViewFactory.create_batch(2, domain=domain, url=url)
+    PageViewFactory.create(domain=domain, url=url, is_robot=True)
+
+    # Tracking only inserts the pending page views, the rollups skip them
+    assert PendingPageView.objects.count() == 3
+    assert not PageViewUrlRollup.objects.exists()
+    assert not PageViewDimensionRollup.objects.exists()
+    assert PageViewUrlRollup.objects.get_differing_days(domain.pk) == []
+
+    # Rebuilding the rollups does not count them twice
+    PageView.objects.rebuild_aggregates_of_days(domain.pk, [timezone.localdate()])
+    call_command("merge_page_views", once=True)
+
+    assert not PendingPageView.objects.exists()
+    assert PageViewUrlRollup.objects.get_differing_days(domain.pk) == []
+    assert PageViewDimensionRollup.objects.get_differing_days(domain.pk) == []
+    for period in ["all", "1"]:
+        assert domain.get_page_views_by_url(period)["data"] == [
+            {"url": url, "count": 2}
+        ]
+        assert domain.get_page_views_by_url(period, with_robots=True)["data"] == [
+            {"url": url, "count": 3}
+        ]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_merge_page_views__outside_of_transaction(settings, monkeypatch):
+    settings.PAGE_VIEW_MERGE_ENABLED = True
+    # The committed ids must not stay cached after the tables are flushed
+    monkeypatch.setattr("analytics.managers._dimension_ids", {})
+    monkeypatch.setattr("analytics.helpers._page_url_cache", None)
+    PageViewFactory.create()
+    assert PendingPageView.objects.count() == 1
+
+    call_command("merge_page_views", once=True)
+    assert not PendingPageView.objects.exists()
+    assert PageViewUrlRollup.objects.get().page_views == 1
+
+
+@pytest.mark.django_db
+def test_get_views_for_url():
+    domain = DomainFactory.create()
+    with freeze_time("2023-01-10"):
+        PageViewFactory.create_batch(2, domain=domain, url=f"{domain.base_url}/post/")
+        PageViewFactory.create(domain=domain, url=f"{domain.base_url}/post/?page=2")
+        PageViewFactory.create(domain=domain, url=f"{domain.base_url}/post/2/")
+        PageViewFactory.create(domain=domain, url=f"{domain.base_url}/my-post/")
+
+    assert PageView.objects.get_views_for_url(
+        domain_pk=domain.pk, url=f"{domain.base_url}/post", with_robots=True
+    ) == {"data": [2], "days": ["2023-01-10"]}
+    assert PageView.objects.get_views_for_url(
+        domain_pk=domain.pk,
+        url=f"{domain.base_url}/post",
+        with_robots=True,
+        include_subpages=True,
+    ) == {"data": [4], "days": ["2023-01-10"]}
+
+
+@pytest.mark.django_db
+def test_page_view_rollups():
+    domain = DomainFactory.create()
+    PageViewFactory.create_batch(2, domain=domain, url=f"{domain.base_url}/post/")
+    PageViewFactory.create(domain=domain, url=f"{domain.base_url}/post/", is_robot=True)
+
+    assert list(
+        PageViewUrlRollup.objects.filter(domain=domain)
+        .order_by("is_robot")
+        .values_list("page_url__url", "is_robot", "page_views")
+    ) == [(f"{domain.base_url}/post/", False, 2), (f"{domain.base_url}/post/", True, 1)]
+    assert PageViewDimensionRollup.objects.filter(domain=domain).count() == 2
+
+
+@pytest.mark.django_db
+def test_check_rollups_command():
+    domain = DomainFactory.create()
+    PageViewFactory.create_batch(3, domain=domain)
+    PageViewUrlRollup.objects.filter(domain=domain).delete()
+
+    with pytest.raises(CommandError):
+        call_command("check_rollups", domain=domain.pk)
+
+    call_command("check_rollups", domain=domain.pk, repair=True)
+    call_command("check_rollups", domain=domain.pk)
+    assert PageViewUrlRollup.objects.get_daily_totals(domain.pk) == (
+        PageViewUrlRollup.objects.get_expected_daily_totals(domain.pk)
+    )
+
+
+@pytest.mark.django_db
+def test_url_rollup_rebuild_days(monkeypatch):
+    domain = DomainFactory.create()
+    for day in ["2023-01-10", "2023-01-11", "2023-01-13"]:
+        with freeze_time(day):
+            PageViewFactory.create(domain=domain, url=f"{domain.base_url}/post/")
+    PageViewUrlRollup.objects.filter(domain=domain).delete()
+    rebuild = PageViewUrlRollup.objects.rebuild
+    rebuilt_ranges = []
+
+    def record_rebuild(domain_id, start_day, end_day, **kwargs):
+        rebuilt_ranges.append((start_day, end_day))
+        rebuild(domain_id, start_day, end_day, **kwargs)
+
+    monkeypatch.setattr(PageViewUrlRollup.objects, "rebuild", record_rebuild)
+    update_totals = PageUrlManager.update_totals
+    updated_domains = []
+
+    def record_update_totals(self, domain_id):
+        updated_domains.append(domain_id)
+        update_totals(self, domain_id)
+
+    monkeypatch.setattr(PageUrlManager, "update_totals", record_update_totals)
+
+    PageViewUrlRollup.objects.rebuild_days(
+        domain.pk, [date(2023, 1, 13), date(2023, 1, 10), date(2023, 1, 11)]
+    )
+
+    assert rebuilt_ranges == [
+        (date(2023, 1, 10), date(2023, 1, 11)),
+        (date(2023, 1, 13), date(2023, 1, 13)),
+    ]
+    assert updated_domains == [domain.pk]
+    assert PageViewUrlRollup.objects.get_differing_days(domain.pk) == []
+    assert domain.get_page_views_by_url()["data"] == [
+        {"url": f"{domain.base_url}/post/", "count": 3}
+    ]
+
+
+@pytest.mark.django_db
+def test_get_overview_analytics(settings, django_assert_num_queries):
+    settings.DASHBOARD_CACHE_ENABLED = False
+    domain = DomainFactory.create()
+    PageViewFactory.create_batch(3, domain=domain)
+    PageViewFactory.create(
+        domain=domain, metadata={"browser": "Firefox", "country": "DE"}
+    )
+    PageViewFactory.create(domain=domain, is_robot=True)
+
+    with django_assert_num_queries(1):
+        overview = domain.get_overview_analytics()
+
+    assert overview["total"] == 4
+    assert overview["browser"]["labels"] == ["Mobile Safari", "Firefox"]
+    assert overview["browser"]["data"] == [75, 25]
+    assert overview["country"]["labels"] == ["AT", "DE"]
+    assert overview["os"]["labels"] == ["iOS", "Unknown"]
+    for dimension in ["browser", "os", "device", "country"]:
+        analytics = domain.get_dimension_analytics(dimension)
+        assert sorted(overview[dimension]["labels"]) == sorted(analytics["labels"])
+        assert sorted(overview[dimension]["data"]) == sorted(analytics["data"])
+
+    assert domain.get_overview_analytics(with_robots=True)["total"] == 5
+
+
+@pytest.mark.django_db
+def test_monthly_totals():
+    domain = DomainFactory.create()
+    for day in ["2023-01-10", "2023-01-20", "2023-02-05", "2023-03-15"]:
+        with freeze_time(day):
+            PageViewFactory.create(domain=domain)
+    with freeze_time("2023-03-01"):
+        PageViewFactory.create(domain=domain, is_robot=True)
+
+    with freeze_time("2023-03-20"):
+        # Reads do not store totals, the months are aggregated from the rollups
+        assert domain.get_page_views_data(with_robots=True) == {
+            "data": [2, 1, 2],
+            "months": ["2023-01", "2023-02", "2023-03"],
+        }
+        assert not PageViewMonthlyTotal.objects.filter(domain=domain).exists()
+
+        call_command("freeze_monthly_totals")
+        assert domain.get_page_views_data(with_robots=True)["data"] == [2, 1, 2]
+        # The closed months are frozen, the current month is live
+        assert set(
+            PageViewMonthlyTotal.objects.filter(domain=domain).values_list(
+                "month", "page_views"
+            )
+        ) == {(date(2023, 1, 1), 2), (date(2023, 2, 1), 1)}
+
+        # Periods starting in the middle of a month only count part of it
+        PageViewFactory.create(domain=domain)
+        assert domain.get_page_views_data(period="1") == {
+            "data": [2],
+            "months": ["2023-03"],
+        }
+
+        # Backfilled page views of closed months need a rebuild
+        with freeze_time("2023-01-15"):
+            PageViewFactory.create(domain=domain)
+        assert domain.get_page_views_data(period="3")["data"] == [2, 1, 2]
+
+        call_command("rebuild_monthly_totals", domain=domain.pk)
+        assert domain.get_page_views_data()["data"] == [3, 1, 2]
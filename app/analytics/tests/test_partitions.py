@@ -0,0 +1,79 @@
+from datetime import date, timedelta
+
+import pytest
+from analytics.models import Domain, PageView
+from analytics.partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    create_partition,
+    get_partition_name,
+    get_partitions,
+)
+from analytics.tests.factories import DomainFactory, PageViewFactory
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from freezegun import freeze_time
+
+
+def count_rows(table: str) -> int:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {table}")
+        return cursor.fetchone()[0]
+
+
+def test_add_months():
+    assert add_months(date(2023, 11, 1), 3) == date(2024, 2, 1)
+    assert add_months(date(2023, 1, 1), -1) == date(2022, 12, 1)
+
+
+@pytest.mark.django_db
+class TestPageViewPartitions:
+    def test__partitions_ahead_exist(self):
+        current_month = timezone.localdate().replace(day=1)
+        months = [partition.month for partition in get_partitions()]
+        for amount in range(4):
+            assert add_months(current_month, amount) in months
+
+    def test__create_partition__moves_rows_from_default(self):
+        with freeze_time("2019-05-10"):
+            PageViewFactory.create_batch(2, domain=DomainFactory.create())
+        with freeze_time("2019-06-10"):
+            PageViewFactory.create()
+        assert count_rows(DEFAULT_PARTITION) == 3
+
+        assert create_partition(date(2019, 5, 1))
+        assert not create_partition(date(2019, 5, 1))
+
+        assert count_rows(get_partition_name(date(2019, 5, 1))) == 2
+        assert count_rows(DEFAULT_PARTITION) == 1
+        assert PageView.objects.count() == 3
+
+    def test__command__removes_old_partitions(self):
+        with freeze_time("2019-05-10"):
+            PageViewFactory.create()
+        create_partition(date(2019, 5, 1))
+        PageViewFactory.create()
+        # The test transaction still has deferred foreign key checks pending
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        call_command("manage_page_view_partitions", retention_months=12)
+
+        assert date(2019, 5, 1) not in [p.month for p in get_partitions()]
+        assert PageView.objects.count() == 1
+        # Rebuilds keep the rollups of the removed months
+        first_kept_month = add_months(timezone.localdate().replace(day=1), -12)
+        assert set(Domain.objects.values_list("downsampled_until", flat=True)) == {
+            first_kept_month
+        }
+
+    def test__partition_pruning(self):
+        PageViewFactory.create()
+        now = timezone.now()
+        queryset = PageView.objects.filter(
+            timestamp__range=(now - timedelta(minutes=1), now)
+        )
+        plan = queryset.explain()
+        assert get_partition_name(now.date()) in plan
+        assert DEFAULT_PARTITION not in plan
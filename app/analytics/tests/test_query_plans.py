@@ -0,0 +1,248 @@
+import json
+from datetime import date, timedelta
+
+import pytest
+from analytics.exports import get_export_rows
+from analytics.models import (
+    Domain,
+    PageUrl,
+    PageUrlPeriodTotal,
+    PageView,
+    PageViewDimensionRollup,
+    PageViewUrlRollup,
+)
+from analytics.tests.factories import DomainFactory, PageViewFactory
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from freezegun import freeze_time
+
+# Tables whose plans must never fall back to a sequential scan
+LARGE_TABLES = (
+    "analytics_pageview",
+    "pageview",
+    "pageviewurlrollup",
+    "pageviewdimensionrollup",
+    "pageviewmonthlytotal",
+    "analytics_pageurl",
+    "pageurl",
+    "analytics_visitorsketch",
+    "visitorsketch",
+    "analytics_pendingvisitor",
+    "pendingvisitor",
+)
+
+
+def get_plans(func) -> list:
+    """
+    Return the plans of the SELECT queries done by func, planned with
+    sequential scans disabled so that any query without a usable index still
+    shows up as a sequential or full index scan.
+    """
+    with CaptureQueriesContext(connection) as context:
+        func()
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        plans = []
+        for query in context.captured_queries:
+            if not query["sql"].startswith("SELECT"):
+                continue
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {query['sql']}")
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            plans.append(plan[0]["Plan"])
+        cursor.execute("SET LOCAL enable_seqscan = on")
+    return plans
+
+
+def get_scans(plan: dict) -> list:
+    """
+    Return the (node type, relation, is filtered without index condition) of
+    all scans of the page view and aggregate tables in the plan. Scans of
+    partial indexes have neither an index condition nor a filter.
+    """
+    scans = []
+    relation = plan.get("Relation Name", plan.get("Index Name", ""))
+    if plan["Node Type"].endswith("Scan") and relation.startswith(LARGE_TABLES):
+        unindexed_filter = (
+            plan["Node Type"] in ["Index Scan", "Index Only Scan"]
+            and "Filter" in plan
+            and "Index Cond" not in plan
+        )
+        scans.append((plan["Node Type"], relation, unindexed_filter))
+    for child in plan.get("Plans", []):
+        scans.extend(get_scans(child))
+    return scans
+
+
+def assert_no_sequential_scans(func, full_scans: tuple = ()) -> None:
+    """
+    Assert that func only scans the page view and aggregate tables, except the
+    ones in full_scans, through index conditions.
+    """
+    plans = get_plans(func)
+    assert plans
+    for plan in plans:
+        for node_type, relation, unindexed_filter in get_scans(plan):
+            if relation.startswith(full_scans):
+                continue
+            assert node_type != "Seq Scan", f"{relation}: {plan}"
+            assert not unindexed_filter, f"Full index scan of {relation}: {plan}"
+
+
+@pytest.fixture()
+def domain(settings):
+    settings.DASHBOARD_CACHE_ENABLED = False
+    domain = DomainFactory.create()
+    other_domains = DomainFactory.create_batch(3)
+    for day in ["2023-01-10", "2023-02-10", "2023-03-10"]:
+        with freeze_time(day):
+            PageViewFactory.create_batch(2, domain=domain)
+            PageViewFactory.create(domain=domain, is_robot=True)
+            for other_domain in other_domains:
+                PageViewFactory.create(domain=other_domain)
+    PageViewFactory.create_batch(2, domain=DomainFactory.create())
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return domain
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+    @pytest.mark.parametrize("period", ["all", "1", "3"])
+    @pytest.mark.parametrize("with_robots", [True, False])
+    def test__get_page_views_data(self, domain, period, with_robots):
+        assert_no_sequential_scans(
+            lambda: domain.get_page_views_data(period=period, with_robots=with_robots)
+        )
+
+    @pytest.mark.parametrize("period", ["all", "3"])
+    @pytest.mark.parametrize("with_robots", [True, False])
+    def test__get_page_views_by_url(self, domain, period, with_robots):
+        assert_no_sequential_scans(
+            lambda: domain.get_page_views_by_url(
+                period=period, with_robots=with_robots, after=(1, domain.base_url)
+            )
+        )
+
+    def test__get_page_views_by_url__keyset(self, domain):
+        # Small tables are cheaper to sort, a page of all time totals has to be
+        # read in index order starting at the key of the previous page
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_sort = off")
+        (plan,) = get_plans(
+            lambda: domain.get_page_views_by_url(after=(1, domain.base_url))
+        )
+        assert plan["Node Type"] == "Limit"
+        (scan,) = plan["Plans"]
+        assert scan["Index Name"] == "pageurl_top_idx"
+        assert scan["Scan Direction"] == "Backward"
+        assert "ROW(total_views, url) <" in scan["Index Cond"]
+
+    def test__get_page_views_by_url__period_totals_keyset(self, domain):
+        with freeze_time("2023-03-10"):
+            PageUrlPeriodTotal.objects.rebuild(domain.pk)
+            domain.refresh_from_db()
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+                cursor.execute("SET LOCAL enable_sort = off")
+            (plan,) = get_plans(
+                lambda: domain.get_page_views_by_url(
+                    period="1", after=(1, domain.base_url)
+                )
+            )
+        assert plan["Node Type"] == "Limit"
+        (scan,) = plan["Plans"]
+        assert scan["Index Name"] == "pageurlperiodtotal_top_idx"
+        assert scan["Scan Direction"] == "Backward"
+        assert "ROW(total_views, url) <" in scan["Index Cond"]
+
+    @pytest.mark.parametrize("dimension", ["browser", "os", "device", "country"])
+    def test__get_dimension_analytics(self, domain, dimension):
+        assert_no_sequential_scans(
+            lambda: domain.get_dimension_analytics(dimension, period="3")
+        )
+
+    @pytest.mark.parametrize("with_url", [True, False])
+    def test__get_unique_visitors(self, domain, with_url):
+        url = domain.page_views.first().url if with_url else None
+        assert_no_sequential_scans(
+            lambda: domain.get_unique_visitors(period="3", url=url)
+        )
+
+    def test__get_overview_analytics(self, domain):
+        assert_no_sequential_scans(lambda: domain.get_overview_analytics(period="3"))
+
+    def test__get_monthly_average_page_views(self, domain):
+        # The closed month totals of all domains are read on purpose
+        assert_no_sequential_scans(
+            Domain.objects.get_monthly_average_page_views,
+            full_scans=("analytics_pageviewmonthlytotal",),
+        )
+
+    @pytest.mark.parametrize("with_robots", [True, False])
+    def test__get_page_views(self, domain, with_robots):
+        page_views = domain.get_page_views(timedelta(days=90), with_robots=with_robots)
+        assert_no_sequential_scans(lambda: list(page_views))
+
+    @pytest.mark.parametrize("include_subpages", [True, False])
+    @pytest.mark.parametrize("with_robots", [True, False])
+    def test__get_views_for_url(self, domain, with_robots, include_subpages):
+        url = domain.page_views.first().url
+        assert_no_sequential_scans(
+            lambda: PageView.objects.get_views_for_url(
+                domain_pk=domain.pk,
+                url=url,
+                with_robots=with_robots,
+                include_subpages=include_subpages,
+            )
+        )
+
+    def test__page_views_of_url(self, domain):
+        url = domain.page_views.first().url
+        assert_no_sequential_scans(
+            lambda: list(
+                PageUrl.objects.lookup(domain.pk, url)
+                .get()
+                .page_views.order_by("timestamp")
+            )
+        )
+
+    def test__page_views_without_page_url(self, domain):
+        assert_no_sequential_scans(
+            lambda: list(
+                PageView.objects.filter(page_url__isnull=True)
+                .order_by("pk")
+                .values_list("pk", "url")[:100]
+            )
+        )
+
+    def test__page_views_without_dimensions(self, domain):
+        assert_no_sequential_scans(
+            lambda: list(
+                PageView.objects.filter(browser__isnull=True)
+                .order_by("pk")
+                .values_list("pk", "metadata")[:100]
+            )
+        )
+
+    @pytest.mark.parametrize(
+        "rollup_model", [PageViewUrlRollup, PageViewDimensionRollup]
+    )
+    def test__rollups(self, domain, rollup_model):
+        assert_no_sequential_scans(
+            lambda: rollup_model.objects.rebuild(
+                domain.pk, date(2023, 2, 1), date(2023, 2, 28)
+            )
+        )
+        assert_no_sequential_scans(
+            lambda: rollup_model.objects.get_expected_daily_totals(domain.pk)
+        )
+        assert_no_sequential_scans(
+            lambda: rollup_model.objects.get_daily_totals(domain.pk)
+        )
+
+    def test__export(self, domain):
+        assert_no_sequential_scans(
+            lambda: list(get_export_rows(domain.pk, date(2023, 2, 1), chunk_size=2))
+        )
@@ -0,0 +1,60 @@
+import uuid
+
+import pytest
+from analytics.models import Domain
+from analytics.registry import DomainRegistry
+from analytics.tests.factories import DomainFactory
+from django.core.exceptions import ValidationError
+
+
+class TestDomainRegistry:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture()
+    def registry(self, monkeypatch):
+        registry = DomainRegistry(maxsize=10, ttl=60, negative_ttl=5)
+        monkeypatch.setattr("analytics.signals.get_domain_registry", lambda: registry)
+        return registry
+
+    def test__get__cached(self, registry, django_assert_num_queries):
+        domain = DomainFactory.create()
+        with django_assert_num_queries(1):
+            assert registry.get(str(domain.pk)).base_url == domain.base_url
+        with django_assert_num_queries(0):
+            assert registry.get(str(domain.pk)).matches(f"{domain.base_url}/post/")
+
+    def test__get__ttl(self, registry, freezer, django_assert_num_queries):
+        domain = DomainFactory.create()
+        registry.get(domain.pk)
+        freezer.tick(61)
+        with django_assert_num_queries(1):
+            registry.get(domain.pk)
+
+    def test__get__unknown_domain_is_cached(self, registry, django_assert_num_queries):
+        domain_id = uuid.uuid4()
+        with django_assert_num_queries(1):
+            with pytest.raises(Domain.DoesNotExist):
+                registry.get(domain_id)
+        with django_assert_num_queries(0):
+            with pytest.raises(Domain.DoesNotExist):
+                registry.get(domain_id)
+
+    def test__get__invalid_domain_id(self, registry, django_assert_num_queries):
+        with django_assert_num_queries(0):
+            with pytest.raises(ValidationError):
+                registry.get("nope")
+            with pytest.raises(Domain.DoesNotExist):
+                registry.get(None)
+
+    def test__save_and_delete_invalidate(self, registry):
+        domain = DomainFactory.create(base_url="https://old.example.com")
+        registry.get(domain.pk)
+
+        domain.base_url = "https://new.example.com"
+        domain.save()
+        assert registry.get(domain.pk).base_url == "https://new.example.com"
+
+        domain_id = domain.pk
+        domain.delete()
+        with pytest.raises(Domain.DoesNotExist):
+            registry.get(domain_id)
@@ -0,0 +1,69 @@
+import pytest
+from analytics.models import Domain, PageView
+from analytics.routers import ReplicaRouter, read_from_replica, use_replicas
+from analytics.tests.factories import DomainFactory, PageViewFactory
+
+
+@pytest.fixture()
+def replicas(settings):
+    settings.DATABASE_REPLICAS = ["replica1", "replica2"]
+    return settings.DATABASE_REPLICAS
+
+
+def test_replica_router(replicas):
+    router = ReplicaRouter()
+
+    assert router.db_for_read(Domain) is None
+    with use_replicas():
+        replica = router.db_for_read(Domain)
+        assert replica in replicas
+        assert router.db_for_write(Domain) == "default"
+        with use_replicas():
+            # Nested blocks read from the same replica
+            assert router.db_for_read(PageView) == replica
+        with use_replicas(False):
+            assert router.db_for_read(PageView) is None
+        assert router.db_for_read(PageView) == replica
+    assert router.db_for_read(Domain) is None
+    assert router.allow_migrate("default", "analytics") is True
+    assert router.allow_migrate("replica1", "analytics") is False
+
+
+def test_replica_router__without_replicas():
+    router = ReplicaRouter()
+
+    with use_replicas():
+        assert router.db_for_read(Domain) is None
+
+
+def test_read_from_replica(replicas):
+    @read_from_replica
+    def get_database():
+        return ReplicaRouter().db_for_read(Domain)
+
+    assert get_database() in replicas
+
+
+@pytest.mark.django_db
+def test_analytics_read_from_replicas(settings, monkeypatch):
+    domain = DomainFactory.create()
+    PageViewFactory.create_batch(2, domain=domain)
+    settings.DASHBOARD_CACHE_ENABLED = False
+    # The default connection stands in for the replica
+    settings.DATABASE_REPLICAS = ["default"]
+    databases = []
+    db_for_read = ReplicaRouter.db_for_read
+
+    def record_db_for_read(self, model, **hints):
+        database = db_for_read(self, model, **hints)
+        databases.append(database)
+        return database
+
+    monkeypatch.setattr(ReplicaRouter, "db_for_read", record_db_for_read)
+
+    assert domain.get_overview_analytics()["total"] == 2
+    assert databases and set(databases) == {"default"}
+    databases.clear()
+    # Reads outside of the analytics stay on the primary
+    assert Domain.objects.filter(pk=domain.pk).exists()
+    assert databases == [None]
@@ -0,0 +1,53 @@
+import math
+
+import pytest
+from analytics.sketches import HyperLogLog, get_item_hash
+
+
+def get_error_bound(precision: int) -> float:
+    # Three times the standard error of the estimate
+    return 3 * 1.04 / math.sqrt(2**precision)
+
+
+@pytest.mark.parametrize("precision", [10, 12])
+@pytest.mark.parametrize("amount", [10, 1000, 20000, 100000])
+def test_count__within_error_bound(precision, amount):
+    sketch = HyperLogLog(precision)
+    sketch.update(f"10.0.{index // 256}.{index % 256}" for index in range(amount))
+    # Adding the same items again does not change the estimate
+    count = sketch.count()
+    sketch.update(f"10.0.{index // 256}.{index % 256}" for index in range(amount))
+    assert sketch.count() == count
+
+    assert abs(count - amount) / amount <= get_error_bound(precision)
+
+
+def test_merge__is_the_union():
+    first = HyperLogLog()
+    first.update(str(index) for index in range(0, 6000))
+    second = HyperLogLog()
+    second.update(str(index) for index in range(4000, 10000))
+
+    merged = HyperLogLog(registers=first.to_bytes())
+    merged.merge(second)
+
+    assert abs(merged.count() - 10000) / 10000 <= get_error_bound(merged.precision)
+    assert merged.count() >= max(first.count(), second.count())
+
+
+def test_update_hashes__signed_like_unsigned():
+    items = [str(index) for index in range(1000)]
+    sketch = HyperLogLog()
+    sketch.update(items)
+    signed_sketch = HyperLogLog()
+    signed_sketch.update_hashes(get_item_hash(item, signed=True) for item in items)
+
+    assert any(get_item_hash(item, signed=True) < 0 for item in items)
+    assert signed_sketch.to_bytes() == sketch.to_bytes()
+
+
+def test_merge__different_precision__error():
+    with pytest.raises(ValueError):
+        HyperLogLog(10).merge(HyperLogLog(12))
+    with pytest.raises(ValueError):
+        HyperLogLog(10, registers=bytes(4096))
@@ -1,7 +1,11 @@
+import json
+
 import pytest
-from analytics.models import Domain, PageView
+from analytics.managers import PageViewManager
+from analytics.models import Domain, PageView, PageViewUrlRollup, PendingPageView
 from analytics.tests.factories import DomainFactory, PageViewFactory
 from django.contrib.auth.models import User
+from django.db import OperationalError, connection
 from django.urls import reverse
 from rest_framework import status
 
@@ -41,13 +45,12 @@ class TestAddPageView:
         page_view = PageView.objects.get(domain=test_domain)
         assert page_view.url == expected_url
         assert page_view.ip == "127.0.0.1"
-        expected_metadata = {
-            "browser": "Safari",
-            "os": "Mac OS X",
-            "device": "Mac",
-            "country": "Unknown",
-        }
-        assert page_view.metadata == expected_metadata
+        # Only the dimensions are stored
+        assert page_view.metadata is None
+        assert page_view.browser.name == "Safari"
+        assert page_view.os.name == "Mac OS X"
+        assert page_view.device.name == "Mac"
+        assert page_view.country.name == "Unknown"
 
     def test__passed_url_not_allowed_for_this_domain_id(self, client, test_domain):
         data = {
@@ -81,12 +84,79 @@ class TestAddPageView:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert PageView.objects.filter(domain=test_domain).count() == 0
 
+    def test__user_agent__not_passed__error(self, client, test_domain):
+        request_meta = {**TEST_REQUEST_META}
+        del request_meta["HTTP_USER_AGENT"]
+        data = {
+            "url": f"{test_domain.base_url}/new-post",
+            "domain_id": str(test_domain.id),
+            "request_meta": request_meta,
+        }
+        response = client.post(self.url, data=data, content_type="application/json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert PageView.objects.filter(domain=test_domain).count() == 0
+
     def test__url__not_passed__error(self, client, test_domain):
         data = {"domain_id": str(test_domain.id)}
         response = client.post(self.url, data=data, content_type="application/json")
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert PageView.objects.filter(domain=test_domain).count() == 0
 
+    @pytest.mark.parametrize("url", ["https://{}:99999/", "https://{}[/x"])
+    def test__invalid_url__error(self, client, test_domain, url):
+        data = {
+            "url": url.format(test_domain.base_url),
+            "domain_id": str(test_domain.id),
+            "request_meta": TEST_REQUEST_META,
+        }
+        response = client.post(self.url, data=data, content_type="application/json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert PageView.objects.filter(domain=test_domain).count() == 0
+
+    def test__database_error(self, client, test_domain, monkeypatch):
+        def bulk_create(*args, **kwargs):
+            raise OperationalError("the database is gone")
+
+        monkeypatch.setattr(PageViewManager, "bulk_create", bulk_create)
+        data = {
+            "url": f"{test_domain.base_url}/new-post",
+            "domain_id": str(test_domain.id),
+            "request_meta": TEST_REQUEST_META,
+        }
+        response = client.post(self.url, data=data, content_type="application/json")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert PageView.objects.filter(domain=test_domain).count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_track_view__outside_of_the_request_transaction(client, monkeypatch):
+    # The committed ids must not stay cached after the tables are flushed
+    monkeypatch.setattr("analytics.managers._dimension_ids", {})
+    monkeypatch.setattr("analytics.helpers._page_url_cache", None)
+    test_domain = DomainFactory.create()
+    in_atomic_block = []
+    build_from_request = PageViewManager.build_from_request
+
+    def record_build_from_request(self, request):
+        in_atomic_block.append(connection.in_atomic_block)
+        return build_from_request(self, request)
+
+    monkeypatch.setattr(
+        PageViewManager, "build_from_request", record_build_from_request
+    )
+    data = {
+        "url": f"{test_domain.base_url}/new-post",
+        "domain_id": str(test_domain.id),
+        "request_meta": TEST_REQUEST_META,
+    }
+    response = client.post(
+        reverse("track_view"), data=data, content_type="application/json"
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert in_atomic_block == [False]
+    assert test_domain.get_overview_analytics()["total"] == 1
+
 
 @pytest.mark.django_db
 def test_n_plus_1__chart_page(client, django_assert_max_num_queries):
@@ -110,6 +180,165 @@ def test_n_plus_1__chart_page(client, django_assert_max_num_queries):
         assert response.status_code == status.HTTP_200_OK
 
 
+@pytest.mark.django_db
+def test_overview_page(client, django_assert_max_num_queries):
+    PageViewFactory.create_batch(10)
+    test_domain = Domain.objects.first()
+    superuser = User.objects.create_user(
+        username="superuser", password="Qwert1234", is_superuser=True
+    )
+    client.force_login(superuser)
+    with django_assert_max_num_queries(10):
+        response = client.get(
+            reverse("domain_overview", kwargs={"pk": test_domain.pk}),
+            data={"period": "3"},
+        )
+    assert response.status_code == status.HTTP_200_OK
+    assert [chart["id"] for chart in response.context["charts"]] == [
+        "browser",
+        "os",
+        "device",
+        "country",
+    ]
+    # The chart data is fetched from the API instead of being rendered inline
+    assert "labels" not in response.context["charts"][0]
+    assert (
+        reverse(
+            "domain_analytics_api",
+            kwargs={"pk": test_domain.pk, "analytics": "overview"},
+        ).encode()
+        in response.content
+    )
+
+
+@pytest.mark.django_db
+def test_page_views_by_url_page__load_more(client, settings):
+    settings.PAGE_VIEWS_BY_URL_PAGE_SIZE = 2
+    test_domain = DomainFactory.create()
+    for path in ["a", "b", "c"]:
+        PageViewFactory.create(
+            domain=test_domain, url=f"{test_domain.base_url}/{path}/"
+        )
+    superuser = User.objects.create_user(
+        username="superuser", password="Qwert1234", is_superuser=True
+    )
+    client.force_login(superuser)
+    url = reverse("domain_page_views_by_url", kwargs={"pk": test_domain.pk})
+
+    response = client.get(url)
+    assert len(response.context["data"]) == 2
+    assert response.context["next_page_query"]
+
+    response = client.get(f"{url}?{response.context['next_page_query']}")
+    assert [entry["url"] for entry in response.context["data"]] == [
+        f"{test_domain.base_url}/a/"
+    ]
+    assert response.context["next_page_query"] is None
+
+
+class TestDomainAnalyticsApi:
+    pytestmark = pytest.mark.django_db
+
+    @pytest.fixture()
+    def test_domain(self, client):
+        superuser = User.objects.create_user(
+            username="superuser", password="Qwert1234", is_superuser=True
+        )
+        client.force_login(superuser)
+        test_domain = DomainFactory.create()
+        PageViewFactory.create_batch(3, domain=test_domain)
+        return test_domain
+
+    @staticmethod
+    def get_url(test_domain, analytics):
+        return reverse(
+            "domain_analytics_api",
+            kwargs={"pk": test_domain.pk, "analytics": analytics},
+        )
+
+    @pytest.mark.parametrize(
+        "analytics,key",
+        [
+            ("page-views", "months"),
+            ("monthly-average", "with_robots"),
+            ("unique-visitors", "total"),
+            ("overview", "total"),
+            ("browser", "labels"),
+            ("os", "labels"),
+            ("device", "labels"),
+            ("country", "labels"),
+            ("page-views-by-url", "next"),
+        ],
+    )
+    def test__analytics(self, client, test_domain, analytics, key):
+        response = client.get(self.get_url(test_domain, analytics), {"period": "1"})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert key in response.json()
+        assert response["ETag"].startswith('"')
+        assert "private" in response["Cache-Control"]
+
+    def test__views_for_url(self, client, test_domain):
+        url = self.get_url(test_domain, "views-for-url")
+        response = client.get(url, {"url": f"{test_domain.base_url}/my-first-post"})
+        assert response.status_code == status.HTTP_200_OK
+        assert set(response.json()) == {"data", "days"}
+
+        response = client.get(url)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test__not_modified(
+        self,
+        client,
+        test_domain,
+        settings,
+        django_assert_max_num_queries,
+        execute_on_commit,
+    ):
+        settings.DASHBOARD_CACHE_ENABLED = False
+        url = self.get_url(test_domain, "overview")
+        etag = client.get(url)["ETag"]
+
+        # Only the session, user and data generation are queried (in the
+        # savepoint of the atomic request)
+        with django_assert_max_num_queries(5):
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b""
+
+        # Other query parameters are other responses
+        response = client.get(url, {"period": "3"}, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+
+        with execute_on_commit():
+            PageViewFactory.create(domain=test_domain)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+        assert response.json()["total"] == 4
+
+    def test__same_etag_same_content(self, client, test_domain, settings):
+        settings.DASHBOARD_CACHE_ENABLED = False
+        url = self.get_url(test_domain, "browser")
+        first_response = client.get(url)
+        second_response = client.get(url)
+
+        assert first_response["ETag"] == second_response["ETag"]
+        assert first_response.content == second_response.content
+
+    def test__unknown(self, client, test_domain):
+        response = client.get(self.get_url(test_domain, "unknown"))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        response = client.get(self.get_url(DomainFactory.build(), "overview"))
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test__superusers_only(self, client, test_domain):
+        client.logout()
+        response = client.get(self.get_url(test_domain, "overview"))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
 @pytest.mark.django_db
 def test_n_plus_1__home_page(client, django_assert_max_num_queries):
     PageViewFactory.create_batch(1)
@@ -132,3 +361,145 @@ def test_n_plus_1__home_page(client, django_assert_max_num_queries):
 def test_no_redirect_to_login_page(client):
     response = client.get(reverse("home_view"))
     assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestBatchTrack:
+    pytestmark = pytest.mark.django_db
+    url = reverse("batch_track_view")
+
+    @pytest.fixture()
+    def test_domain(self):
+        return DomainFactory.create()
+
+    def test__created__json(self, client, test_domain, django_assert_max_num_queries):
+        valid_item = {
+            "url": f"{test_domain.base_url}/new-post",
+            "domain_id": str(test_domain.id),
+            "request_meta": TEST_REQUEST_META,
+        }
+        invalid_item = {"url": f"{test_domain.base_url}/new-post", "domain_id": "nope"}
+        data = [valid_item, invalid_item] + [valid_item] * 10
+
+        # The domain, the dimensions and the page url are only looked up once per
+        # batch, the rollups, the url totals, the url period totals and the
+        # pending visitors are written with one statement each
+        with django_assert_max_num_queries(29):
+            response = client.post(self.url, data=data, content_type="application/json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] == 11
+        assert response.data["errors"] == 1
+        assert [result["status"] for result in response.data["results"][:3]] == [
+            "created",
+            "error",
+            "created",
+        ]
+        assert PageView.objects.filter(domain=test_domain).count() == 11
+
+    def test__created__pending(
+        self, client, test_domain, settings, django_assert_max_num_queries
+    ):
+        settings.PAGE_VIEW_MERGE_ENABLED = True
+        item = {
+            "url": f"{test_domain.base_url}/new-post",
+            "domain_id": str(test_domain.id),
+            "request_meta": TEST_REQUEST_META,
+        }
+
+        # The rollups and the url totals are not written while tracking
+        with django_assert_max_num_queries(26):
+            response = client.post(
+                self.url, data=[item] * 10, content_type="application/json"
+            )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] == 10
+        assert PendingPageView.objects.filter(domain=test_domain).count() == 10
+        assert not PageViewUrlRollup.objects.filter(domain=test_domain).exists()
+
+    def test__created__ndjson(self, client, test_domain):
+        item = {
+            "url": f"{test_domain.base_url}/new-post",
+            "domain_id": str(test_domain.id),
+            "request_meta": TEST_REQUEST_META,
+        }
+        data = "\n".join(json.dumps(item) for _ in range(3)) + "\n"
+        response = client.post(self.url, data=data, content_type="application/x-ndjson")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] == 3
+        assert PageView.objects.filter(domain=test_domain).count() == 3
+
+    def test__not_a_list__error(self, client, test_domain):
+        data = {"url": f"{test_domain.base_url}/new-post"}
+        response = client.post(self.url, data=data, content_type="application/json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test__invalid_ip__error(self, client, test_domain):
+        valid_item = {
+            "url": f"{test_domain.base_url}/new-post",
+            "domain_id": str(test_domain.id),
+            "request_meta": TEST_REQUEST_META,
+        }
+        request_meta = {**TEST_REQUEST_META, "REMOTE_ADDR": "nope"}
+        without_ip = {**TEST_REQUEST_META}
+        del without_ip["REMOTE_ADDR"]
+        data = [
+            valid_item,
+            {**valid_item, "request_meta": request_meta},
+            {**valid_item, "request_meta": without_ip},
+        ]
+
+        response = client.post(self.url, data=data, content_type="application/json")
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["status"] for result in response.data["results"]] == [
+            "created",
+            "error",
+            "error",
+        ]
+        assert PageView.objects.filter(domain=test_domain).count() == 1
+
+    def test__invalid_items__error(self, client, test_domain):
+        valid_item = {
+            "url": f"{test_domain.base_url}/new-post",
+            "domain_id": str(test_domain.id),
+            "request_meta": TEST_REQUEST_META,
+        }
+        without_user_agent = {**TEST_REQUEST_META}
+        del without_user_agent["HTTP_USER_AGENT"]
+        data = [
+            valid_item,
+            {**valid_item, "url": f"https://{test_domain.base_url}:99999/"},
+            {**valid_item, "url": f"https://{test_domain.base_url}[/x"},
+            {**valid_item, "request_meta": without_user_agent},
+            {**valid_item, "url": f"{test_domain.base_url}/other-post"},
+        ]
+
+        response = client.post(self.url, data=data, content_type="application/json")
+        assert response.status_code == status.HTTP_200_OK
+        assert [result["status"] for result in response.data["results"]] == [
+            "created",
+            "error",
+            "error",
+            "error",
+            "created",
+        ]
+        assert PageView.objects.filter(domain=test_domain).count() == 2
+
+    def test__database_error(self, client, test_domain, monkeypatch):
+        def bulk_create(*args, **kwargs):
+            raise OperationalError("the database is gone")
+
+        monkeypatch.setattr(PageViewManager, "bulk_create", bulk_create)
+        data = [
+            {
+                "url": f"{test_domain.base_url}/new-post",
+                "domain_id": str(test_domain.id),
+                "request_meta": TEST_REQUEST_META,
+            }
+        ]
+        response = client.post(self.url, data=data, content_type="application/json")
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert PageView.objects.filter(domain=test_domain).count() == 0
+
+    def test__too_many_page_views__error(self, client, test_domain, settings):
+        settings.TRACK_BATCH_MAX_SIZE = 1
+        response = client.post(self.url, data=[{}, {}], content_type="application/json")
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
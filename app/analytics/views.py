@@ -1,19 +1,62 @@
-from typing import Any
-from urllib.parse import unquote
-
-import settings
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Optional, Tuple
+from urllib.parse import unquote, urlencode
+
+from analytics.buffer import get_page_view_buffer
+from analytics.exports import EXPORT_CONTENT_TYPES, export_page_views
+from analytics.geoip import get_geoip
+from analytics.helpers import get_user_agent_cache
+from analytics.live import get_live_traffic_client
 from analytics.managers import PageViewCreationError
-from analytics.models import Domain, PageView
+from analytics.models import Domain, PageUrl, PageView
+from analytics.parsers import NDJSONParser
+from analytics.registry import get_domain_registry
+from analytics.routers import read_from_replica
+from django.conf import settings
 from django.contrib.auth import logout
 from django.contrib.auth.mixins import AccessMixin
 from django.core.exceptions import PermissionDenied
+from django.db import DatabaseError, transaction
 from django.db.models import QuerySet
-from django.views.generic import DetailView, ListView, RedirectView
+from django.http import (
+    Http404,
+    HttpResponseBadRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.generic import DetailView, ListView, RedirectView, View
 from django.views.generic.base import ContextMixin
 from rest_framework import status
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+logger = logging.getLogger(__name__)
+
+
+def get_after(request) -> Optional[Tuple[int, str]]:
+    """
+    Return the (count, url) key of the last url of the previous page of the page
+    views by url, passed as the query parameters 'after_count' and 'after_url'.
+    """
+    after_count = request.GET.get("after_count")
+    after_url = request.GET.get("after_url")
+    if not after_count or not after_url:
+        return None
+    try:
+        return int(after_count), after_url
+    except ValueError:
+        return None
+
 
 class CustomLoginRequiredMixin(AccessMixin):
     """
@@ -53,18 +96,17 @@ class DashboardPageMixin(CustomLoginRequiredMixin, ContextMixin):
 
 
 class PieAnalyticsMixin(DashboardPageMixin, DetailView):
+    """
+    Page of a pie chart, its data is fetched from DomainAnalyticsApi.
+    """
+
     template_name = "pie_analytics.html"
     model = Domain
-    get_data_function = None
+    dimension = None
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        analytics = getattr(self.get_object(), self.get_data_function)(
-            with_robots=self.get_with_robots_value()
-        )
-        context["colors"] = analytics["colors"]
-        context["labels"] = analytics["labels"]
-        context["data"] = analytics["data"]
+        context["dimension"] = self.dimension
         return context
 
 
@@ -90,23 +132,52 @@ class HomeView(DashboardPageMixin, ListView):
 
 
 class DomainPageViews(DashboardPageMixin, DetailView):
+    """
+    Page views per month, their data is fetched from DomainAnalyticsApi.
+    """
+
     template_name = "domain_page_views.html"
     model = Domain
     page_title = "Page views"
 
+
+class DomainOverview(DashboardPageMixin, DetailView):
+    """
+    Pie charts of all dimensions, their data is fetched from the overview of
+    DomainAnalyticsApi.
+    """
+
+    template_name = "domain_overview.html"
+    model = Domain
+    page_title = "Overview"
+    charts = [
+        ("browser", "Browsers"),
+        ("os", "Operating systems"),
+        ("device", "Devices"),
+        ("country", "Countries"),
+    ]
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        page_views = self.get_object().get_page_views_data(
-            period=self.period, with_robots=self.get_with_robots_value()
-        )
-        context[
-            "average_views_with_robots"
-        ] = self.get_object().get_monthly_average_page_views(with_robots=True)
-        context[
-            "average_views_no_robots"
-        ] = self.get_object().get_monthly_average_page_views(with_robots=False)
-        context["data"] = page_views["data"]
-        context["months"] = page_views["months"]
+        context["charts"] = [
+            {"id": dimension, "title": title} for dimension, title in self.charts
+        ]
+        return context
+
+
+class DomainLiveTraffic(DashboardPageMixin, DetailView):
+    """
+    Page views of the last minutes, updated by DomainLiveTrafficStream.
+    """
+
+    template_name = "domain_live_traffic.html"
+    model = Domain
+    page_title = "Live traffic"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["live_traffic_enabled"] = settings.LIVE_TRAFFIC_ENABLED
+        context["window_seconds"] = settings.LIVE_TRAFFIC_WINDOW_SECONDS
         return context
 
 
@@ -118,10 +189,23 @@ class DomainPageViewsByUrl(DashboardPageMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         page_views_by_url = self.get_object().get_page_views_by_url(
-            period=self.period, with_robots=self.get_with_robots_value()
+            period=self.period,
+            with_robots=self.get_with_robots_value(),
+            after=get_after(self.request),
         )
         context["pk"] = self.kwargs.get("pk")
-        context["data"] = page_views_by_url
+        context["data"] = page_views_by_url["data"]
+        context["next_page_query"] = None
+        if page_views_by_url["next"]:
+            after_count, after_url = page_views_by_url["next"]
+            context["next_page_query"] = urlencode(
+                {
+                    "period": self.period or "",
+                    "with_robots": self.get_with_robots_value(),
+                    "after_count": after_count,
+                    "after_url": after_url,
+                }
+            )
         return context
 
 
@@ -132,44 +216,52 @@ class DomainPageViewsByUrlElement(DashboardPageMixin, ListView):
     def get_queryset(self):
         pk = self.kwargs.get("pk")
         url = unquote(self.kwargs.get("url"))
-        return self.model.objects.filter(domain__pk=pk, url=url).order_by("timestamp")
+        page_url = PageUrl.objects.lookup(pk, f"{url}/").first()
+        if page_url is None:
+            return self.model.objects.none()
+        return page_url.page_views.order_by("timestamp")
 
     def get_page_title(self) -> str:
         return f"Page views for the url '{self.kwargs.get('url')}/'"
 
     def get_context_data(self, **kwargs):
+        # The chart data is fetched from DomainAnalyticsApi
         context = super().get_context_data(**kwargs)
-        domain_pk = self.kwargs.get("pk")
-        url = unquote(self.kwargs.get("url"))
-
-        page_views = PageView.objects.get_views_for_url(
-            domain_pk=domain_pk, url=url, with_robots=self.get_with_robots_value()
+        context["pk"] = self.kwargs.get("pk")
+        context["views_for_url_query"] = urlencode(
+            {
+                "url": unquote(self.kwargs.get("url")),
+                "with_robots": self.get_with_robots_value(),
+                "subpages": self.request.GET.get("subpages") or "",
+            }
         )
-        context["data"] = page_views["data"]
-        context["days"] = page_views["days"]
         return context
 
 
 class DomainBrowserAnalytics(PieAnalyticsMixin):
     page_title = "Browser analytics"
-    get_data_function = "get_browser_analytics"
+    dimension = "browser"
 
 
 class DomainCountryAnalytics(PieAnalyticsMixin):
     page_title = "Country analytics"
-    get_data_function = "get_country_analytics"
+    dimension = "country"
 
 
 class DomainDeviceAnalytics(PieAnalyticsMixin):
     page_title = "Device analytics"
-    get_data_function = "get_device_analytics"
+    dimension = "device"
 
 
 class DomainOSAnalytics(PieAnalyticsMixin):
     page_title = "OS analytics"
-    get_data_function = "get_os_analytics"
+    dimension = "os"
 
 
+# Tracking runs outside of ATOMIC_REQUESTS, so that the parsing, user agent and
+# GeoIP lookups do not happen in an open transaction. The writes use short
+# transactions of their own.
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
 class TrackView(APIView):
     allowed_methods = ["POST"]
 
@@ -177,9 +269,291 @@ class TrackView(APIView):
         status_code = status.HTTP_201_CREATED
         payload = {}
         try:
-            PageView.objects.create_from_request(request=request)
-            payload["message"] = "PageView created"
+            if settings.PAGE_VIEW_BUFFER_ENABLED:
+                page_view = PageView.objects.build_from_request(request=request)
+                if get_page_view_buffer().put(page_view):
+                    status_code = status.HTTP_202_ACCEPTED
+                    payload["message"] = "PageView queued"
+                else:
+                    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+                    payload["message"] = "Error: the page view buffer is full"
+            else:
+                PageView.objects.create_from_request(request=request)
+                payload["message"] = "PageView created"
         except PageViewCreationError as e:
             status_code = status.HTTP_400_BAD_REQUEST
             payload["message"] = f"Error: {e}"
+        except DatabaseError:
+            # The page view was rolled back, clients may send it again
+            logger.exception("Could not store a tracked page view")
+            status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+            payload["message"] = "Error: the page view could not be stored"
         return Response(status=status_code, data=payload)
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class BatchTrackView(APIView):
+    """
+    Track many page views with one request, either as a JSON array or as
+    newline-delimited JSON. Every page view is validated on its own and the
+    response contains one result per page view in the same order.
+    """
+
+    allowed_methods = ["POST"]
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def post(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={"message": "Error: a list of page views was expected"},
+            )
+        if len(items) > settings.TRACK_BATCH_MAX_SIZE:
+            return Response(
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                data={
+                    "message": f"Error: at most {settings.TRACK_BATCH_MAX_SIZE} "
+                    f"page views can be tracked with one request"
+                },
+            )
+
+        try:
+            results = PageView.objects.create_batch_from_data(items=items)
+        except DatabaseError:
+            # No page view of the batch was stored, clients may send it again
+            logger.exception("Could not store a batch of tracked page views")
+            return Response(
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                data={"message": "Error: the page views could not be stored"},
+            )
+        created = sum(1 for result in results if result["status"] == "created")
+        payload = {
+            "message": f"{created} PageViews created",
+            "created": created,
+            "errors": len(results) - created,
+            "results": results,
+        }
+        return Response(status=status.HTTP_200_OK, data=payload)
+
+
+class TrackStatsView(CustomLoginRequiredMixin, View):
+    """
+    Ingestion statistics of the worker process that answers the request.
+    """
+
+    def get(self, request, *args, **kwargs):
+        stats = {
+            "geoip": get_geoip().get_stats(),
+            "user_agents": get_user_agent_cache().get_stats(),
+            "domains": get_domain_registry().get_stats(),
+        }
+        if settings.PAGE_VIEW_BUFFER_ENABLED:
+            stats["buffer"] = get_page_view_buffer().get_stats()
+        if settings.LIVE_TRAFFIC_ENABLED:
+            stats["live_traffic"] = get_live_traffic_client().get_stats()
+        return JsonResponse(stats)
+
+
+class DomainPageViewsExport(CustomLoginRequiredMixin, View):
+    """
+    Stream the raw page views of a domain as CSV or NDJSON.
+
+    Query parameters: 'format' (csv or ndjson), 'start' and 'end' (inclusive
+    days, YYYY-MM-DD) and 'gzip=true' to compress the export on the fly.
+    """
+
+    def get(self, request, *args, **kwargs):
+        domain = get_object_or_404(Domain, pk=self.kwargs.get("pk"))
+        export_format = request.GET.get("format", "csv")
+        if export_format not in EXPORT_CONTENT_TYPES:
+            return HttpResponseBadRequest(f"Unknown export format {export_format}")
+        days = {}
+        for name in ["start", "end"]:
+            value = request.GET.get(name)
+            try:
+                days[name] = parse_date(value) if value else None
+            except ValueError:
+                days[name] = None
+            if value and days[name] is None:
+                return HttpResponseBadRequest(f"{name} has to be a valid day")
+        start_day, end_day = days["start"], days["end"]
+        compress = request.GET.get("gzip") in ["true", "True"]
+
+        filename = f"page-views-{domain.pk}.{export_format}"
+        content_type = EXPORT_CONTENT_TYPES[export_format]
+        if compress:
+            filename += ".gz"
+            content_type = "application/gzip"
+        response = StreamingHttpResponse(
+            export_page_views(
+                domain.pk,
+                export_format=export_format,
+                start_day=start_day,
+                end_day=end_day,
+                compress=compress,
+            ),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+def get_analytics_etag(request, pk, analytics: str) -> Optional[str]:
+    """
+    Return the ETag of a DomainAnalyticsApi response. Responses only change with
+    the data generation of the domain or, as periods are relative to today, with
+    the day.
+    """
+    data_generation = (
+        Domain.objects.filter(pk=pk).values_list("data_generation", flat=True).first()
+    )
+    if data_generation is None:
+        return None
+    parts = [
+        str(pk),
+        str(data_generation),
+        timezone.localdate().isoformat(),
+        analytics,
+        request.GET.urlencode(),
+    ]
+    return hashlib.sha1(":".join(parts).encode()).hexdigest()
+
+
+class DomainAnalyticsApi(CustomLoginRequiredMixin, View):
+    """
+    Read-only JSON of the analytics of a domain for the dashboard charts.
+
+    Query parameters: 'period' and 'with_robots' like the dashboard pages,
+    'after_count', 'after_url' and 'limit' for page-views-by-url, 'url' for
+    unique-visitors and views-for-url, 'subpages=1' for views-for-url.
+
+    Responses carry a strong ETag, requests with a matching If-None-Match are
+    answered with 304 without computing the analytics.
+    """
+
+    analytics = {
+        "page-views": "get_page_views_data",
+        "monthly-average": "get_monthly_average",
+        "unique-visitors": "get_unique_visitors",
+        "overview": "get_overview_analytics",
+        "browser": "get_dimension_analytics",
+        "os": "get_dimension_analytics",
+        "device": "get_dimension_analytics",
+        "country": "get_dimension_analytics",
+        "page-views-by-url": "get_page_views_by_url",
+        "views-for-url": "get_views_for_url",
+    }
+
+    def get_with_robots_value(self) -> bool:
+        return self.request.GET.get("with_robots") in ["true", "True"]
+
+    def get_period(self) -> str:
+        return self.request.GET.get("period") or "all"
+
+    def get_page_views_data(self) -> dict:
+        return self.domain.get_page_views_data(
+            period=self.get_period(), with_robots=self.get_with_robots_value()
+        )
+
+    def get_monthly_average(self) -> dict:
+        return {
+            "with_robots": self.domain.get_monthly_average_page_views(
+                with_robots=True
+            ),
+            "no_robots": self.domain.get_monthly_average_page_views(
+                with_robots=False
+            ),
+        }
+
+    def get_unique_visitors(self) -> dict:
+        return self.domain.get_unique_visitors(
+            period=self.get_period(), url=self.request.GET.get("url") or None
+        )
+
+    def get_overview_analytics(self) -> dict:
+        return self.domain.get_overview_analytics(
+            period=self.get_period(), with_robots=self.get_with_robots_value()
+        )
+
+    def get_dimension_analytics(self) -> dict:
+        return self.domain.get_dimension_analytics(
+            self.kwargs["analytics"],
+            period=self.get_period(),
+            with_robots=self.get_with_robots_value(),
+        )
+
+    def get_page_views_by_url(self) -> dict:
+        try:
+            limit = int(self.request.GET.get("limit") or 0) or None
+        except ValueError:
+            raise ValueError("limit has to be a number")
+        return self.domain.get_page_views_by_url(
+            period=self.get_period(),
+            with_robots=self.get_with_robots_value(),
+            after=get_after(self.request),
+            limit=limit,
+        )
+
+    def get_views_for_url(self) -> dict:
+        url = self.request.GET.get("url")
+        if not url:
+            raise ValueError("url is required")
+        return PageView.objects.get_views_for_url(
+            domain_pk=self.domain.pk,
+            url=url,
+            with_robots=self.get_with_robots_value(),
+            include_subpages=self.request.GET.get("subpages") == "1",
+        )
+
+    # The ETag and the data are read from the same replica
+    @method_decorator(read_from_replica)
+    @method_decorator(condition(etag_func=get_analytics_etag))
+    def get(self, request, *args, **kwargs):
+        method_name = self.analytics.get(self.kwargs["analytics"])
+        if method_name is None:
+            raise Http404(f"Unknown analytics {self.kwargs['analytics']}")
+        self.domain = get_object_or_404(Domain, pk=self.kwargs["pk"])
+        try:
+            data = getattr(self, method_name)()
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        response = JsonResponse(data)
+        # The dashboard is only visible to superusers, browsers revalidate the
+        # cached responses with their ETag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class DomainLiveTrafficStream(CustomLoginRequiredMixin, View):
+    """
+    Server-sent events with the live traffic window of a domain every
+    LIVE_TRAFFIC_INTERVAL seconds, read from the live aggregator without
+    database queries. The stream ends after LIVE_TRAFFIC_STREAM_SECONDS seconds
+    so that it does not occupy a worker forever, browsers reconnect.
+    """
+
+    def get_events(self, domain_id):
+        client = get_live_traffic_client()
+        retry = int(settings.LIVE_TRAFFIC_INTERVAL * 1000)
+        yield f"retry: {retry}\n\n"
+        end = time.monotonic() + settings.LIVE_TRAFFIC_STREAM_SECONDS
+        while True:
+            window = client.get_window(domain_id)
+            if window is None:
+                yield "event: unavailable\ndata: {}\n\n"
+            else:
+                yield f"data: {json.dumps(window)}\n\n"
+            if time.monotonic() + settings.LIVE_TRAFFIC_INTERVAL > end:
+                break
+            time.sleep(settings.LIVE_TRAFFIC_INTERVAL)
+
+    def get(self, request, *args, **kwargs):
+        domain = get_object_or_404(Domain, pk=self.kwargs.get("pk"))
+        response = StreamingHttpResponse(
+            self.get_events(domain.pk), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # Let nginx pass the events on immediately
+        response["X-Accel-Buffering"] = "no"
+        return response
@@ -102,9 +102,35 @@ DATABASES = {
         "HOST": os.environ.get("POSTGRES_HOST"),
         "PORT": os.environ.get("POSTGRES_PORT"),
         "ATOMIC_REQUESTS": True,
+        # Every worker thread keeps its connection open for POSTGRES_CONN_MAX_AGE
+        # seconds (0 closes it after each request), it is checked before a new
+        # request reuses it
+        "CONN_MAX_AGE": env.int("POSTGRES_CONN_MAX_AGE", 60),
+        "CONN_HEALTH_CHECKS": env.bool("POSTGRES_CONN_HEALTH_CHECKS", True),
+        # Required behind a pooler in transaction mode like PgBouncer
+        "DISABLE_SERVER_SIDE_CURSORS": env.bool(
+            "POSTGRES_DISABLE_SERVER_SIDE_CURSORS", False
+        ),
     }
 }
 
+# Read-only replicas of the default database as "host" or "host:port", the
+# dashboard analytics read from them (see analytics.routers). The same host as
+# POSTGRES_HOST makes a second connection to the primary, e.g. for testing.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(env.list("POSTGRES_REPLICA_HOSTS", []), start=1):
+    host, _, port = replica.partition(":")
+    alias = f"replica{index}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "ATOMIC_REQUESTS": False,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["analytics.routers.ReplicaRouter"]
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -163,6 +189,121 @@ MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 GEOIP_PATH = os.path.join(BASE_DIR, "data")
-
-# Browsers and devices values that can be excluded from the charts
+# Every worker shares one GeoIP reader with an LRU cache of ip -> country
+GEOIP_CACHE_SIZE = env.int("GEOIP_CACHE_SIZE", 10000)
+GEOIP_MMAP = env.bool("GEOIP_MMAP", False)
+# Seconds between checks if the .mmdb file was replaced and has to be reloaded
+GEOIP_RELOAD_CHECK_INTERVAL = env.float("GEOIP_RELOAD_CHECK_INTERVAL", 60.0)
+
+# Every worker caches the browser/os/device families of the parsed user agents.
+# USER_AGENT_CACHE_SIZE=0 disables the cache, USER_AGENT_CACHE_TTL (seconds) is
+# optional.
+USER_AGENT_CACHE_SIZE = env.int("USER_AGENT_CACHE_SIZE", 5000)
+USER_AGENT_CACHE_TTL = env.float("USER_AGENT_CACHE_TTL", None)
+
+# Every worker caches the ids of the normalized page urls
+PAGE_URL_CACHE_SIZE = env.int("PAGE_URL_CACHE_SIZE", 10000)
+# Count visitors by ip and user agent families instead of only by ip
+VISITOR_SKETCH_USER_AGENT = env.bool("VISITOR_SKETCH_USER_AGENT", False)
+# Tracked visitors are merged into the sketches every
+# VISITOR_SKETCH_MERGE_INTERVAL seconds by merge_visitor_sketches, in batches of
+# VISITOR_SKETCH_MERGE_BATCH_SIZE visitors
+VISITOR_SKETCH_MERGE_INTERVAL = env.float("VISITOR_SKETCH_MERGE_INTERVAL", 60.0)
+VISITOR_SKETCH_MERGE_BATCH_SIZE = env.int("VISITOR_SKETCH_MERGE_BATCH_SIZE", 10000)
+# Tracked page views are only inserted as pending page views, which
+# merge_page_views adds to the rollups and url totals every
+# PAGE_VIEW_MERGE_INTERVAL seconds in batches of PAGE_VIEW_MERGE_BATCH_SIZE
+# (False adds them while tracking)
+PAGE_VIEW_MERGE_ENABLED = env.bool("PAGE_VIEW_MERGE_ENABLED", True)
+PAGE_VIEW_MERGE_INTERVAL = env.float("PAGE_VIEW_MERGE_INTERVAL", 2.0)
+PAGE_VIEW_MERGE_BATCH_SIZE = env.int("PAGE_VIEW_MERGE_BATCH_SIZE", 10000)
+
+# Amount of page view rows fetched per round trip by the raw data exports
+EXPORT_CHUNK_SIZE = env.int("EXPORT_CHUNK_SIZE", 2000)
+
+# Maximum amount of urls per page of the page views by url listing
+PAGE_VIEWS_BY_URL_PAGE_SIZE = env.int("PAGE_VIEWS_BY_URL_PAGE_SIZE", 100)
+
+# Every worker caches the tracked domains for DOMAIN_REGISTRY_TTL seconds and
+# unknown domain ids for DOMAIN_REGISTRY_NEGATIVE_TTL seconds.
+DOMAIN_REGISTRY_SIZE = env.int("DOMAIN_REGISTRY_SIZE", 1000)
+DOMAIN_REGISTRY_TTL = env.float("DOMAIN_REGISTRY_TTL", 300.0)
+DOMAIN_REGISTRY_NEGATIVE_TTL = env.float("DOMAIN_REGISTRY_NEGATIVE_TTL", 30.0)
+
+# Browsers and devices values that can be excluded from the charts. Page views
+# are classified as robots when they are tracked, run the management command
+# classify_robots after changing these rules.
 EXCLUDED_DEVICES = ["Spider"]
+# Case insensitive keywords of robot browser names
+EXCLUDED_BROWSER_KEYWORDS = ["bot"]
+
+# Buffered ingestion: when enabled the tracking endpoint only validates the page
+# view and queues it, a background thread writes the queue with bulk_create.
+PAGE_VIEW_BUFFER_ENABLED = env.bool("PAGE_VIEW_BUFFER_ENABLED", False)
+PAGE_VIEW_BUFFER_MAX_SIZE = env.int("PAGE_VIEW_BUFFER_MAX_SIZE", 10000)
+PAGE_VIEW_BUFFER_BATCH_SIZE = env.int("PAGE_VIEW_BUFFER_BATCH_SIZE", 500)
+PAGE_VIEW_BUFFER_FLUSH_INTERVAL = env.float("PAGE_VIEW_BUFFER_FLUSH_INTERVAL", 2.0)
+
+# Maximum amount of page views accepted by one request to /api/track/batch/
+TRACK_BATCH_MAX_SIZE = env.int("TRACK_BATCH_MAX_SIZE", 1000)
+
+# The page view table is partitioned by month. manage_page_view_partitions
+# creates the partitions of the next PAGE_VIEW_PARTITIONS_AHEAD months and drops
+# the partitions older than PAGE_VIEW_RETENTION_MONTHS (0 keeps all of them).
+PAGE_VIEW_PARTITIONS_AHEAD = env.int("PAGE_VIEW_PARTITIONS_AHEAD", 3)
+PAGE_VIEW_RETENTION_MONTHS = env.int("PAGE_VIEW_RETENTION_MONTHS", 0)
+
+# downsample_page_views deletes the page views older than
+# PAGE_VIEW_DOWNSAMPLE_AFTER_DAYS days (0 keeps all of them) and keeps their
+# rollups, in batches of PAGE_VIEW_DOWNSAMPLE_BATCH_SIZE page views with a pause
+# of PAGE_VIEW_DOWNSAMPLE_PAUSE seconds in between.
+PAGE_VIEW_DOWNSAMPLE_AFTER_DAYS = env.int("PAGE_VIEW_DOWNSAMPLE_AFTER_DAYS", 0)
+PAGE_VIEW_DOWNSAMPLE_BATCH_SIZE = env.int("PAGE_VIEW_DOWNSAMPLE_BATCH_SIZE", 1000)
+PAGE_VIEW_DOWNSAMPLE_PAUSE = env.float("PAGE_VIEW_DOWNSAMPLE_PAUSE", 0.1)
+
+# archive_page_views moves the page views of months that ended more than
+# PAGE_VIEW_ARCHIVE_AFTER_MONTHS months ago to columnar files in
+# PAGE_VIEW_ARCHIVE_PATH, the analytics combine them with the rollups.
+PAGE_VIEW_ARCHIVE_PATH = env.str(
+    "PAGE_VIEW_ARCHIVE_PATH", os.path.join(BASE_DIR, "archive")
+)
+PAGE_VIEW_ARCHIVE_AFTER_MONTHS = env.int("PAGE_VIEW_ARCHIVE_AFTER_MONTHS", 12)
+
+# Live traffic: tracked page views are sent to the run_live_aggregator process
+# through the Unix socket LIVE_TRAFFIC_SOCKET, which counts them per second for
+# the last LIVE_TRAFFIC_WINDOW_SECONDS seconds. The live page is updated every
+# LIVE_TRAFFIC_INTERVAL seconds by a stream that ends after
+# LIVE_TRAFFIC_STREAM_SECONDS seconds, browsers then reconnect.
+LIVE_TRAFFIC_ENABLED = env.bool("LIVE_TRAFFIC_ENABLED", False)
+LIVE_TRAFFIC_SOCKET = env.str(
+    "LIVE_TRAFFIC_SOCKET", "/tmp/basic-analytics-live.sock"
+)
+LIVE_TRAFFIC_WINDOW_SECONDS = env.int("LIVE_TRAFFIC_WINDOW_SECONDS", 300)
+LIVE_TRAFFIC_TOP_URLS = env.int("LIVE_TRAFFIC_TOP_URLS", 10)
+LIVE_TRAFFIC_TIMEOUT = env.float("LIVE_TRAFFIC_TIMEOUT", 0.5)
+LIVE_TRAFFIC_INTERVAL = env.float("LIVE_TRAFFIC_INTERVAL", 2.0)
+LIVE_TRAFFIC_STREAM_SECONDS = env.float("LIVE_TRAFFIC_STREAM_SECONDS", 300.0)
+
+# Results of the Domain analytics methods are cached in the DASHBOARD_CACHE
+# until new page views of the domain are tracked. The data generation of a
+# domain is bumped at most every DASHBOARD_CACHE_BUMP_INTERVAL seconds per
+# process, skipped bumps are made once the interval is over (0 bumps it with
+# every tracked page view, after its commit). Cached results expire after
+# DASHBOARD_CACHE_TIMEOUT seconds in any case.
+DASHBOARD_CACHE_ENABLED = env.bool("DASHBOARD_CACHE_ENABLED", True)
+DASHBOARD_CACHE = "dashboard"
+DASHBOARD_CACHE_BUMP_INTERVAL = env.float("DASHBOARD_CACHE_BUMP_INTERVAL", 2.0)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    DASHBOARD_CACHE: {
+        "BACKEND": env.str(
+            "DASHBOARD_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": env.str("DASHBOARD_CACHE_LOCATION", "dashboard"),
+        "TIMEOUT": env.int("DASHBOARD_CACHE_TIMEOUT", 300),
+        "OPTIONS": {"MAX_ENTRIES": env.int("DASHBOARD_CACHE_MAX_ENTRIES", 1000)},
+    },
+}
@@ -14,15 +14,22 @@ Including another URLconf
     2. Add a URL to urlpatterns:  url(r'^blog/', include('blog.urls'))
 """
 from analytics.views import (
+    BatchTrackView,
+    DomainAnalyticsApi,
     DomainBrowserAnalytics,
     DomainCountryAnalytics,
     DomainDeviceAnalytics,
+    DomainLiveTraffic,
+    DomainLiveTrafficStream,
     DomainOSAnalytics,
+    DomainOverview,
     DomainPageViews,
     DomainPageViewsByUrl,
     DomainPageViewsByUrlElement,
+    DomainPageViewsExport,
     HomeView,
     LogoutView,
+    TrackStatsView,
     TrackView,
 )
 from django.conf import settings
@@ -35,11 +42,26 @@ urlpatterns = [
     path(f"{settings.ADMIN_URL}/", admin.site.urls),
     path("", HomeView.as_view(), name="home_view"),
     path("logout/", LogoutView.as_view(), name="logout_view"),
+    path(
+        "domain/<pk>/overview",
+        DomainOverview.as_view(),
+        name="domain_overview",
+    ),
     path(
         "domain/<pk>/page-views",
         DomainPageViews.as_view(),
         name="domain_page_views",
     ),
+    path(
+        "domain/<uuid:pk>/live",
+        DomainLiveTraffic.as_view(),
+        name="domain_live_traffic",
+    ),
+    path(
+        "domain/<uuid:pk>/live/stream",
+        DomainLiveTrafficStream.as_view(),
+        name="domain_live_traffic_stream",
+    ),
     path(
         "domain/<pk>/page-views-by-url",
         DomainPageViewsByUrl.as_view(),
@@ -50,6 +72,11 @@ urlpatterns = [
         DomainPageViewsByUrlElement.as_view(),
         name="domain_page_views_by_url_element",
     ),
+    path(
+        "domain/<uuid:pk>/export",
+        DomainPageViewsExport.as_view(),
+        name="domain_page_views_export",
+    ),
     path(
         "domain/<pk>/browser-analytics",
         DomainBrowserAnalytics.as_view(),
@@ -70,7 +97,18 @@ urlpatterns = [
         DomainOSAnalytics.as_view(),
         name="domain_os_analytics",
     ),
+    path(
+        "api/domains/<uuid:pk>/<slug:analytics>/",
+        DomainAnalyticsApi.as_view(),
+        name="domain_analytics_api",
+    ),
     path("api/track/", TrackView.as_view(), name="track_view"),
+    path("api/track/batch/", BatchTrackView.as_view(), name="batch_track_view"),
+    path(
+        "api/track/stats/",
+        TrackStatsView.as_view(),
+        name="track_stats_view",
+    ),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
 